@@ -18,10 +18,20 @@
 ##
 ##      gnuplot DLPlot                      # Plot the results
 ##
+##      The binary output of CoilScanDL (--format=npy, npz or parquet) plots without any text parsing,
+##        once converted with ScanExport:
+##
+##      CoilScanDL ... --format=npy --output=Data.npy
+##      ScanExport --gnuplot Data.npy >Data.bin
+##      gnuplot -e "Data=\"'Data.bin' binary format='%10float64'\"" DLPlot.gp
+##
 ##  NOTE
 ##
 ##      Dia, the first column, is the coil diameter, which is the form diameter plus the conductor diameter
 ##
+##      The output of CoilScanDL --adaptive is a scattered set of points, which plots the same way. For a
+##        surface instead of points, add "set dgrid3d 60,60 splines" before the splot.
+##
 ########################################################################################################################
 ########################################################################################################################
 ##
@@ -47,10 +57,17 @@
 ########################################################################################################################
 ########################################################################################################################
 
+#
+# Data file and how to read it: the CSV output, or the binary data from ScanExport --gnuplot (the same
+#   columns, as 10 doubles per coil)
+#
+if (!exists("Data")) Data = "'Data.csv'"
+#Data = "'Data.bin' binary format='%10float64'"
+
 set xlabel "Dia"
 set ylabel "len"
-set zlabel "Q"; splot 'Data.csv' using 1:2:3
+set zlabel "Q"; splot @Data using 1:2:3
 pause -1
 
-#set zlabel "Ft" ; splot 'Data.csv' using 1:2:7
-#set zlabel "Res"; splot 'Data.csv' using 1:2:8
+#set zlabel "Ft" ; splot @Data using 1:2:7
+#set zlabel "Res"; splot @Data using 1:2:8
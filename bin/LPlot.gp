@@ -18,6 +18,16 @@
 ##
 ##      gnuplot DLPlot                      # Plot the results
 ##
+##      With several target inductances (--LTarget=<L1>,<L2>,...), Data.csv holds one block per target:
+##        select one with "index", as in plot 'Data.csv' index 0 using 2:3
+##
+##      The binary output of CoilScanL (--format=npy, npz or parquet) plots without any text parsing,
+##        once converted with ScanExport:
+##
+##      CoilScanL ... --format=npy --output=Data.npy
+##      ScanExport --gnuplot Data.npy >Data.bin
+##      gnuplot -e "Data=\"'Data.bin' binary format='%10float64'\"" LPlot.gp
+##
 ##  NOTE
 ##
 ##      Dia, the first column, is the coil diameter, which is the form diameter plus the conductor diameter
@@ -47,9 +57,16 @@
 ########################################################################################################################
 ########################################################################################################################
 
+#
+# Data file and how to read it: the CSV output, or the binary data from ScanExport --gnuplot (the same
+#   columns, as 10 doubles per coil)
+#
+if (!exists("Data")) Data = "'Data.csv'"
+#Data = "'Data.bin' binary format='%10float64'"
+
 set xlabel "l"
-set ylabel "Q"; plot 'Data.csv' using 2:3
+set ylabel "Q"; plot @Data using 2:3
 pause -1
 
-#set ylabel "Ft" ; splot 'Data.csv' using 1:7
-#set ylabel "Res"; splot 'Data.csv' using 1:8
+#set ylabel "Ft" ; splot @Data using 1:7
+#set ylabel "Res"; splot @Data using 1:8
@@ -44,10 +44,7 @@
 #        + http://people.sc.fsu.edu/~jburkardt/py_src/brent/brent.html
 #        + http://people.sc.fsu.edu/~jburkardt/py_src/brent/zero.py
 #        + http://www.netlib.org/go/zeroin.f
-#    - Z_c inf (400, 200, 420, 1, 1)
 #    - f_res (400, 200, 420, 1, .1) improve seeded guesses?
-#    - Try fzero for finding f_res.
-#    - more precise self-resonant frequency
 #
 # CHANGES BY PWalsh
 #
@@ -59,11 +56,23 @@
 
 VERSION = 20181217
 
-from math import atan, log, pi, sqrt, tan
-from mathextra import cot, I0, I1, K0, K1
-from fzero import fzero
+from math import atan, log, pi, sin, sqrt, tan
+from mathextra import cot, I0K0, I1K1_I0K0, I0K0v, I1K1_I0K0v, I0e, I1e, K0e, K1e
+from fzero import fzero, fzero_many
+from neldermead import neldermead
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import os
+import pickle
+import threading
 import time
 
+try:
+    import numpy as np
+except ImportError:
+    np = None    # CoilBatch (vectorized calculations) needs numpy; the scalar Coil does not
+
 class Conductor:
 
     def __init__(self, description, rho, mu_r):
@@ -89,8 +98,220 @@ class HeaderIndices:
         self.index1 = index1
 
 
-class Phi_p_d:
-    pass    # Used to store interpolation results
+class DispersionCache:
+
+    def __init__(self, size, digits):
+        '''A bounded (least recently used) memo of dispersion roots, keyed on the quantized inputs.'''
+        self.size   = size      # Maximum number of roots kept, 0 to disable
+        self.digits = digits    # Significant digits of k_0, psi and a in the key
+
+        self.hits   = 0
+        self.misses = 0
+
+        self._roots = OrderedDict()
+        self._lock  = threading.Lock()
+
+    def key(self, k_0, psi, a):
+        return ('%.*e' % (self.digits-1, k_0), '%.*e' % (self.digits-1, psi), '%.*e' % (self.digits-1, a))
+
+    def get(self, key):
+        with self._lock:
+            tau = self._roots.get(key)
+            if tau is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._roots.move_to_end(key)
+            return tau
+
+    def put(self, key, tau):
+        with self._lock:
+            self._roots[key] = tau
+            self._roots.move_to_end(key)
+            while len(self._roots) > self.size:
+                self._roots.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._roots.clear()
+            self.hits = self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            return {'size': len(self._roots), 'hits': self.hits, 'misses': self.misses}
+
+
+class DiskCache:
+
+    def __init__(self, path=None, size=256*2**20, digits=12):
+        '''A directory of pickled coil states, bounded in bytes (least recently used files are removed first).'''
+        self.path   = path      # Directory of the cache, None to disable
+        self.size   = size      # Maximum total size of the files, in bytes
+        self.digits = digits    # Significant digits of the numeric inputs in the key
+
+        self.hits      = 0
+        self.misses    = 0
+        self.writes    = 0
+        self.evictions = 0
+
+        self._bytes = None      # Total size of the files, once counted
+        self._lock  = threading.Lock()
+
+    def key(self, *values):
+        Values = tuple('%.*e' % (self.digits-1, Value) if isinstance(Value, (int, float)) and not isinstance(Value, bool) else Value
+                       for Value in values)
+        return hashlib.sha1(repr((VERSION,) + Values).encode()).hexdigest()
+
+    def file(self, key):
+        return os.path.join(self.path, key[:2], key)
+
+    def get(self, key):
+        File = self.file(key)
+        try:
+            with open(File, 'rb') as Input:
+                Value = pickle.load(Input)
+            os.utime(File)                  # Most recently used
+        except Exception:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        return Value
+
+    def put(self, key, value):
+        File = self.file(key)
+        Data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        try:
+            os.makedirs(os.path.dirname(File), exist_ok=True)
+            Temp = '%s.%d.%d' % (File, os.getpid(), threading.get_ident())
+            with open(Temp, 'wb') as Output:
+                Output.write(Data)
+            os.replace(Temp, File)          # Readers (in other processes too) see all of the file or none
+        except OSError:
+            return
+
+        with self._lock:
+            self.writes += 1
+            try:                            # The value is stored, bookkeeping failures must not fail the calculation
+                if self._bytes is None:
+                    self._bytes = sum(Size for Time, Size, Path in self.files())
+                else:
+                    self._bytes += len(Data)
+                if self._bytes > self.size:
+                    self.evict()
+            except OSError:
+                self._bytes = None
+
+    def entries(self):
+        if not os.path.isdir(self.path):
+            return
+        for Directory in os.scandir(self.path):
+            try:
+                if Directory.is_dir():
+                    yield from [Entry for Entry in os.scandir(Directory.path) if Entry.is_file()]
+            except OSError:                 # Removed by another process
+                continue
+
+    def files(self):
+        '''Yield (mtime, size, path) of the entries, skipping files that vanish while scanning.'''
+        for Entry in self.entries():
+            try:
+                Stat = Entry.stat()
+            except OSError:
+                continue
+            yield Stat.st_mtime, Stat.st_size, Entry.path
+
+    def evict(self):
+        '''Remove the least recently used files, down to 90% of size. Called with the lock held.'''
+        Files = sorted(self.files())
+        self._bytes = sum(Size for Time, Size, Path in Files)
+
+        for Time, Size, Path in Files:
+            if self._bytes <= 0.9 * self.size:
+                break
+            try:
+                os.remove(Path)
+            except OSError:
+                continue
+            self._bytes -= Size
+            self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            for Entry in list(self.entries()):
+                try:
+                    os.remove(Entry.path)
+                except OSError:
+                    continue
+            self._bytes = 0
+            self.hits = self.misses = self.writes = self.evictions = 0
+
+    def stats(self):
+        with self._lock:
+            return {'path': self.path, 'bytes': self._bytes, 'hits': self.hits, 'misses': self.misses,
+                    'writes': self.writes, 'evictions': self.evictions}
+
+
+# Coil calculation stages, in order, and the Coil members set by each (see Coil.Calculate)
+STAGES = ('geometry', 'rf', 'lumped', 'f_res', 'summary')
+
+STAGE_MEMBERS = {
+    'geometry': ('rho', 'mu_r_w', 'p', 'Phi', 'D_eff', 'k_L', 'k_s', 'k_m', 'l_w_phys', 'l_w_eff', 'delta_i', 'R_eff_s', 'L_s', 'psi'),
+    'rf'      : ('beta', 'Z_c', 'L_eff_s', 'X_eff_s', 'Q_eff'),
+    'lumped'  : ('R_s', 'C_p'),
+    'f_res'   : ('f_res', 'error_code', 'error_msg'),
+    'summary' : ('summary',),
+    }
+
+STAGE_OF = {Name: Stage for Stage, Members in STAGE_MEMBERS.items() for Name in Members}
+
+# Coil members saved to the disk cache (see Coil.CacheState): the members set by the stages, and the state of the calculation
+CACHE_STATE = set(STAGE_OF) | {'_si', '_valid', '_members', '_recomputed', '_inputs', '_errors', '_pending'}
+
+#
+# Coil calculation nodes, in order: (node, stage, values, depends). Each node calculates some intermediate
+#   values (and the Coil members of the same name) from the inputs and the values of other nodes. When an
+#   input changes, only the nodes downstream of it are calculated again (see Coil.Calculate).
+#
+INPUTS = ('D', 'N', 'l', 'd', 'f', 'plating')
+
+NODES = (
+    ('rho'     , 'geometry', ('rho', 'mu_r_w')      , ('plating',)),
+    ('p'       , 'geometry', ('p',)                 , ('N', 'l')),
+    ('Phi'     , 'geometry', ('Phi',)               , ('l', 'D', 'd', 'p')),
+    ('D_eff'   , 'geometry', ('D_eff', 'a')         , ('D', 'd', 'Phi')),
+    ('k_L'     , 'geometry', ('k_L',)               , ('l', 'D_eff')),
+    ('k_s'     , 'geometry', ('k_s',)               , ('d', 'p')),
+    ('k_m'     , 'geometry', ('k_m',)               , ('N',)),
+    ('l_w_phys', 'geometry', ('l_w_phys',)          , ('N', 'l', 'D')),
+    ('l_w_eff' , 'geometry', ('l_w_eff',)           , ('N', 'l', 'D_eff')),
+    ('delta_i' , 'geometry', ('delta_i',)           , ('f', 'rho', 'mu_r_w')),
+    ('R_eff_s' , 'geometry', ('R_eff_s',)           , ('N', 'd', 'rho', 'Phi', 'l_w_eff', 'delta_i')),
+    ('L_s'     , 'geometry', ('L_s',)               , ('N', 'l', 'D_eff', 'k_L', 'k_s', 'k_m')),
+    ('psi'     , 'geometry', ('psi',)               , ('p', 'D_eff')),
+    ('tau'     , 'rf'      , ('tau', 'omega', 'k_0'), ('f', 'psi', 'a')),
+    ('beta'    , 'rf'      , ('beta',)              , ('k_0', 'tau')),
+    ('Z_c'     , 'rf'      , ('Z_c',)               , ('k_0', 'tau', 'a', 'beta')),
+    ('L_eff_s' , 'rf'      , ('L_eff_s',)           , ('N', 'l', 'D_eff', 'k_L', 'k_s', 'k_m', 'omega', 'beta', 'Z_c')),
+    ('X_eff_s' , 'rf'      , ('X_eff_s',)           , ('omega', 'L_eff_s')),
+    ('Q_eff'   , 'rf'      , ('Q_eff',)             , ('R_eff_s', 'X_eff_s')),
+    ('R_s'     , 'lumped'  , ('R_s', 'C_p')         , ('R_eff_s', 'L_s', 'omega', 'X_eff_s', 'Q_eff')),
+    ('f_res'   , 'f_res'   , ('f_res',)             , ('l', 'l_w_eff', 'psi', 'a')),
+    )
+
+NODE_VALUES  = {Node: Values for Node, Stage, Values, Depends in NODES}
+NODE_MEMBERS = {Node: tuple(Value for Value in Values if Value in STAGE_MEMBERS[Stage]) for Node, Stage, Values, Depends in NODES}
+STAGE_NODES  = {Stage: tuple(Node for Node, NodeStage, Values, Depends in NODES if NodeStage == Stage) for Stage in STAGES}
+
+# The nodes downstream of each input and node, directly or through other nodes
+DOWNSTREAM = {Name: set() for Name in INPUTS + tuple(NODE_VALUES)}
+for Node, Stage, Values, Depends in reversed(NODES):
+    for Name in Depends:
+        Name = next((Source for Source, Values in NODE_VALUES.items() if Name in Values), Name)
+        DOWNSTREAM[Name] |= {Node} | DOWNSTREAM[Node]
+del Node, Stage, Values, Depends, Name
 
 
 ### GLOBALS ###
@@ -101,6 +322,43 @@ mu_0 = pi * 4E-7
 Z_0  = mu_0 * c_0
 
 
+# Self-resonant frequency solver (see solve_f_res)
+f_res_rel_tol         = 1E-10   # Relative tolerance of f_res
+f_res_max_evaluations = 60      # Maximum number of dispersion solves per f_res
+f_res_tau_bracket     = 0.05    # Relative half-width of the warm-started tau bracket
+f_res_gap_step        = 1.05    # Frequency step across a range without a dispersion root
+
+# Memo of dispersion roots (see solve_dispersion). Set dispersion_cache.size = 0 to disable.
+#
+# Inputs that agree to 14 significant digits share a root, which changes tau by about 1E-14 relative.
+dispersion_cache = DispersionCache(size=4096, digits=14)
+
+# Cache of coil calculations on disk, shared by processes and kept from one run to the next (see use_disk_cache).
+#   Off unless the COIL_CACHE_DIR environment variable names its directory, or use_disk_cache() is called.
+disk_cache = DiskCache(path=os.environ.get('COIL_CACHE_DIR') or None)
+
+disk_cache_path = os.path.join(os.path.expanduser('~'), '.cache', 'coil')     # Default directory of use_disk_cache
+
+# Precomputed roots of the dispersion function (see use_dispersion_table). None until loaded.
+dispersion_table      = None
+dispersion_table_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'dispersion_table.npy')
+
+# Bracket widths tried by InterpolateTurns with a guess, in multiples of NWidth (see InterpolateNear)
+InterpolateWiden      = (1, 4, 16)
+
+# Newton steps tried by InterpolateTurns(Newton=True) before it falls back to fzero (see InterpolateNewton)
+NewtonMaxSteps        = 12
+
+# Turns tabulated per coil by InvertTurns and InvertLengths (see TabulateTurns)
+InvertPoints          = 200
+
+# Bounds used by PreScreen. They hold, with a margin, for all coils InterpolateTurns accepts in tests
+#   over d = 0.1..15 mm, D = 2d..1000 mm, l = 10d..2500 mm, f = 0.03..500 MHz and L = 0.01..3000 uH.
+ScreenKMax            = 1.25    # f_res is below ScreenKMax * c_0 / l_w_eff
+ScreenFresGate        = 0.2     # Coils with f below ScreenFresGate * c_0 / l_w_eff (at the most turns) ...
+ScreenLRatio          = 4.0     #   have L_eff_s below ScreenLRatio * L_s
+
+
 # plating conductivity and permeability
 plating = []
 plating.append(Conductor('annealed copper'  , 17.241, 0.99999044))
@@ -137,6 +395,465 @@ medhurst.append([3.41, 3.11, 2.815, 2.51, 2.22, 1.93, 1.65, 1.395, 1.19, 1.05, 1
 
 ### FUNCTIONS ###
 
+########################################################################################################################
+#
+# solve_dispersion - Solve the sheath helix dispersion function for tau
+#
+# Inputs:   k_0,          Free space wave number (rad/m)
+#           psi,          Effective pitch angle (rad)
+#           a,            Effective radius of the coil (m)
+#
+# Output:   tau (1/m), NaN if no root was bracketed
+#
+# Roots are remembered in dispersion_cache, so solving for the same coil again (as the scans and
+#   InterpolateTurns often do) costs a lookup. Roots are only cached after a successful solve.
+#
+def solve_dispersion(k_0, psi, a):
+
+    Cache = dispersion_cache
+    Key   = None
+
+    if Cache.size > 0:
+        Key = Cache.key(k_0, psi, a)
+        tau = Cache.get(Key)
+        if tau is not None:
+            return tau
+
+    tau_1 = k_0                  # smallest tau estimate
+    tau_2 = k_0 * cot(psi)**2    # largest tau estimate
+
+    if dispersion_table is not None:
+        tau = table_dispersion(k_0, psi, a, tau_1, tau_2)
+        if tau is not None:
+            if Key is not None:
+                Cache.put(Key, tau)
+            return tau
+
+    # Sheath helix dispersion function
+    F = lambda tau: I1K1_I0K0(tau*a) - (tau / k_0 * tan(psi))**2
+
+    zero = fzero(F, tau_1, tau_2)
+
+    if Key is not None and zero['error_code'] in (0, 1):
+        Cache.put(Key, zero['zero'])
+
+    return zero['zero']
+
+
+########################################################################################################################
+#
+# solve_dispersion_many - Vectorized solve_dispersion
+#
+# Inputs:   k_0, psi, a   1-D arrays, as for solve_dispersion
+#
+# Output:   Array of tau (1/m), NaN where no root was bracketed. Requires numpy.
+#
+# The roots are found with fzero_many, all at once. Roots are not cached.
+#
+def solve_dispersion_many(k_0, psi, a):
+    tan_psi = np.tan(psi)
+
+    F = lambda tau, i: I1K1_I0K0v(tau*a[i]) - (tau / k_0[i] * tan_psi[i])**2
+
+    tau_1 = k_0                  # smallest tau estimate
+    tau_2 = k_0 / tan_psi**2     # largest tau estimate
+    tau, error_code, f_evaluations = fzero_many(F, tau_1, tau_2)
+    return tau
+
+
+########################################################################################################################
+#
+# The dispersion function only depends on x = tau*a and u = k_0*a*cot(psi):
+#
+#   I1(x)K1(x) / (I0(x)K0(x)) = (tau/k_0 * tan(psi))² = (x/u)²
+#
+# so its root x(u) can be tabulated once for all coils. The table has one row per u (evenly spaced in
+#   ln u): ln u, x, and dx/d(ln u). Roots are interpolated from it (cubic Hermite) and then polished with
+#   a Newton step against the exact function, which makes them as accurate as fzero.
+#
+dispersion_table_rows  = 4096
+dispersion_table_range = (-21.0, 14.0)    # ln u, about 1E-9 to 1E6
+
+def dispersion_root(u):
+    x = fzero(lambda x: I1K1_I0K0(x) - (x/u)**2, u*0.01, u*1.01)
+    return x['zero'] if x['error_code'] in (0, 1) else float('nan')
+
+def dispersion_slope(x, u):
+    # d/dx of the dispersion function, from I0' = I1, K0' = -K1, I1' = I0 - I1/x, K1' = -K0 - K1/x
+    r = I1K1_I0K0(x)
+    I0_I1 = I0e(x) / I1e(x)
+    K0_K1 = K0e(x) / K1e(x)
+    return r * (I0_I1 - K0_K1 - 2/x - 1/I0_I1 + 1/K0_K1) - 2*x/u**2
+
+
+########################################################################################################################
+#
+# build_dispersion_table - Tabulate the roots of the dispersion function
+#
+# Inputs:   path,   (OPTIONAL) File to save the table in (default: dispersion_table_path)
+#
+# Output:   The table is saved as a .npy file. Requires numpy.
+#
+def build_dispersion_table(path=None):
+    if path is None:
+        path = dispersion_table_path
+
+    Table = np.empty((dispersion_table_rows, 3))
+    Table[:,0] = np.linspace(dispersion_table_range[0], dispersion_table_range[1], dispersion_table_rows)
+
+    for i, ln_u in enumerate(Table[:,0]):
+        u = float(np.exp(ln_u))
+        x = dispersion_root(u)
+        Table[i,1] = x
+        Table[i,2] = -2*x**2/u**2 / dispersion_slope(x, u)    # dx/d(ln u) = -u * dF/du / dF/dx
+
+    Temp = '%s.%d.%d' % (path, os.getpid(), threading.get_ident())
+    try:
+        with open(Temp, 'wb') as Output:
+            np.save(Output, Table)
+        os.replace(Temp, path)              # Other programs loading the table see all of it or none
+    finally:
+        if os.path.exists(Temp):
+            os.remove(Temp)
+
+
+########################################################################################################################
+#
+# use_dispersion_table - Solve the dispersion function from the precomputed table
+#
+# Inputs:   path,   (OPTIONAL) Table file (default: dispersion_table_path). Built if it doesn't exist.
+#           enable, (OPTIONAL) False to go back to solving with fzero
+#
+# The table is memory-mapped, so processes that load it share it. The roots agree with the ones found by
+#   fzero to within a few units in the last place. Requires numpy.
+#
+def use_dispersion_table(path=None, enable=True):
+    global dispersion_table
+
+    if not enable:
+        dispersion_table = None
+        return
+
+    if path is None:
+        path = dispersion_table_path
+
+    if not os.path.exists(path):
+        build_dispersion_table(path)
+
+    dispersion_table = np.load(path, mmap_mode='r')
+
+
+########################################################################################################################
+#
+# use_disk_cache - Keep the coil calculations in a cache on disk, from one run to the next
+#
+# Inputs:   path,   (OPTIONAL) Cache directory (default: the current one, else disk_cache_path)
+#           size,   (OPTIONAL) Maximum size of the cache, in bytes (default: 256 MB)
+#           enable, (OPTIONAL) False to stop using the cache
+#
+# Coils (see Coil.RunStages) and searches for the turns (see Coil.InterpolateTurns) are looked up by their
+#   inputs, rounded to disk_cache.digits significant digits, and VERSION, so a new version of the
+#   calculation starts over. The least recently used files are removed when the cache is full.
+#   The environment variable COIL_CACHE_DIR does the same as use_disk_cache(COIL_CACHE_DIR).
+#
+def use_disk_cache(path=None, size=None, enable=True):
+    if not enable:
+        disk_cache.path = None
+        return
+
+    disk_cache.path   = path or disk_cache.path or disk_cache_path
+    disk_cache._bytes = None
+
+    if size is not None:
+        disk_cache.size = size
+
+    os.makedirs(disk_cache.path, exist_ok=True)
+
+
+########################################################################################################################
+#
+# table_dispersion - Look up the root of the dispersion function in the table
+#
+# Inputs:   k_0, psi, a     As for solve_dispersion
+#           tau_1, tau_2    Bracket the root must be in
+#
+# Output:   tau (1/m), or None if the table can't be used: u outside the table, or a polished root that is
+#             not accurate or not within the bracket. The caller should then solve with fzero.
+#
+def table_dispersion(k_0, psi, a, tau_1, tau_2):
+    Table = dispersion_table
+
+    try:
+        u = k_0 * a * cot(psi)
+        ln_u = log(u)
+    except (ValueError, ZeroDivisionError):
+        return None
+
+    Step = (Table[-1,0] - Table[0,0]) / (len(Table) - 1)
+    t = (ln_u - Table[0,0]) / Step
+    i = int(t)
+
+    if not 0 <= i < len(Table) - 1:
+        return None
+
+    # Cubic Hermite interpolation in ln u
+    t -= i
+    x_1, m_1 = float(Table[i,1])  , float(Table[i,2])   * Step
+    x_2, m_2 = float(Table[i+1,1]), float(Table[i+1,2]) * Step
+
+    x  = (2*t**3 - 3*t**2 + 1)*x_1 + (t**3 - 2*t**2 + t)*m_1 + (-2*t**3 + 3*t**2)*x_2 + (t**3 - t**2)*m_2
+
+    # Newton steps against the exact dispersion function. One is usually enough; a second one is taken
+    #   when the first was large, since the slope of the Bessel function approximations is only accurate
+    #   to about 1E-7.
+    for Step in range(2):
+        try:
+            dx = (I1K1_I0K0(x) - (x/u)**2) / dispersion_slope(x, u)
+        except (ValueError, ZeroDivisionError, OverflowError):
+            return None
+
+        if not abs(dx) <= x * 1E-6:
+            return None
+
+        x -= dx
+
+        if abs(dx) <= x * 1E-10:
+            break
+
+    tau = x / a
+
+    if not min(tau_1, tau_2) <= tau <= max(tau_1, tau_2):
+        return None
+
+    return tau
+
+
+########################################################################################################################
+#
+# solve_f_res - Find the self-resonant frequency of a coil
+#
+# Inputs:   l,                Length of coil (m)
+#           l_w_eff,          Effective conductor length (m)
+#           psi,              Effective pitch angle (rad)
+#           a,                Effective radius of the coil (m)
+#           rel_tol,          (OPTIONAL) Relative tolerance of the result     (default: f_res_rel_tol)
+#           max_evaluations,  (OPTIONAL) Maximum number of dispersion solves  (default: f_res_max_evaluations)
+#
+# Output:   Self-resonant frequency (Hz)
+#
+# Raises ArithmeticError when the dispersion function cannot be solved at one of the test frequencies, when
+#   the self-resonant frequency does not converge, or when it is in a range of frequencies where the
+#   dispersion function has no root.
+#
+# The self-resonant frequency is where βℓ = π/2. It is searched for between c_0/l_w_eff/40 and 100 times that,
+#   using fzero (which stops as soon as the tolerance is reached). Each step solves the dispersion function
+#   for tau at the test frequency, starting from a narrow bracket around the previous step's tau, scaled to the
+#   new frequency. Only if that bracket does not hold the root is the full range of tau searched, and only if
+#   that does not either is it widened upwards.
+#
+def solve_f_res(l, l_w_eff, psi, a, rel_tol=None, max_evaluations=None):
+
+    if rel_tol is None:
+        rel_tol = f_res_rel_tol
+    if max_evaluations is None:
+        max_evaluations = f_res_max_evaluations
+
+    x_1 = c_0 / l_w_eff / 40.0
+    x_2 = x_1 * 100.0
+
+    Previous = []    # (x, tau) of the previous dispersion solve
+    Gaps     = []    # Test frequencies without a dispersion root
+
+    def F_res(x):
+
+        # First, solve the sheath helix dispersion function for tau at frequency x.
+        omega = 2.0 * pi * x
+        k_0 = omega / c_0
+
+        F = lambda tau: I1K1_I0K0(tau*a) - (tau / k_0 * tan(psi))**2
+
+        tau_1 = k_0 * cot(psi)**2 - k_0**2    # an estimate
+        tau_2 = k_0                           # another estimate
+
+        if dispersion_table is not None:
+            tau = table_dispersion(k_0, psi, a, tau_1, tau_2)
+            if tau is not None:
+                Previous[:] = [x, tau]
+                return sqrt(k_0**2 + tau**2) * l - pi/2.0
+
+        zero = None
+        if Previous and tau_1 > 0:
+            tau = Previous[1] * x / Previous[0]
+            tau_lo = max(min(tau_1, tau_2), tau * (1 - f_res_tau_bracket))
+            tau_hi = min(max(tau_1, tau_2), tau * (1 + f_res_tau_bracket))
+            if tau_lo < tau_hi:
+                zero = fzero(F, tau_lo, tau_hi)
+                if zero['error_code'] == 4:
+                    zero = None
+
+        if zero is None:
+            zero = fzero(F, tau_1, tau_2)
+
+        #
+        # Both estimates below the root: widen the bracket upwards (the tan(psi) term grows as tau**2, so F
+        #   ends up negative)
+        #
+        if zero['error_code'] == 4 and max(tau_1, tau_2) > 0 and F(max(tau_1, tau_2)) > 0:
+            tau_lo = max(tau_1, tau_2)
+            for Doubling in range(60):
+                if F(2*tau_lo) < 0:
+                    zero = fzero(F, tau_lo, 2*tau_lo)
+                    break
+                tau_lo *= 2
+
+        if zero['error_code'] == 2:
+            raise ArithmeticError('An error occurred when solving for the resonant frequency. ' + zero['error_msg'])
+        tau = zero['zero']
+
+        if tau != tau:
+            Gaps.append(x)
+            return float('inf')    # No solution: treat as above resonance, as the original bisection did
+        Previous[:] = [x, tau]
+
+        # Then, check for resonance.
+        # β² = k_0² + τ²
+        # βℓ → π/2
+        return sqrt(k_0**2 + tau**2) * l - pi/2.0
+
+    zero = fzero(F_res, x_1, x_2, rel_tol=rel_tol, abs_tol=0, max_evaluations=max_evaluations)
+
+    if zero['error_code'] == 2:
+        raise ArithmeticError('The self-resonant frequency did not converge. ' + zero['error_msg'])
+
+    if zero['error_code'] == 4:
+        # No resonance within the range: return the end the search would have converged to
+        return x_2 if F_res(x_1) < 0 else x_1
+
+    x = zero['zero']
+
+    #
+    # Next to a range of frequencies without a dispersion root, the zero can be the edge of that range rather
+    #   than a resonance. Then search on from the first frequency past the range that has a root.
+    #
+    while Gaps:
+        if all(F_res(x * Side) != float('inf') for Side in (1 - 4*rel_tol, 1 + 4*rel_tol)):
+            break
+
+        x_1 = x * (1 + 4*rel_tol)
+        while x_1 < x_2 and F_res(x_1) == float('inf'):
+            x_1 *= f_res_gap_step
+
+        if x_1 >= x_2 or F_res(x_1) >= 0:
+            raise ArithmeticError('The self-resonant frequency is in a range without a dispersion root.')
+
+        del Gaps[:]
+        zero = fzero(F_res, x_1, x_2, rel_tol=rel_tol, abs_tol=0, max_evaluations=max_evaluations)
+
+        if zero['error_code'] == 2:
+            raise ArithmeticError('The self-resonant frequency did not converge. ' + zero['error_msg'])
+
+        if zero['error_code'] == 4:
+            return x_2
+
+        x = zero['zero']
+
+    return x
+
+
+########################################################################################################################
+#
+# solve_f_res_many - Vectorized solve_f_res
+#
+# Inputs:   l, l_w_eff, psi, a    1-D arrays, as for solve_f_res
+#           rel_tol,              (OPTIONAL) As for solve_f_res
+#           max_evaluations,      (OPTIONAL) As for solve_f_res
+#
+# Output:   Array of self-resonant frequencies (Hz), and a mask of the elements for which solve_f_res
+#             would raise ArithmeticError. Requires numpy.
+#
+# Same search as solve_f_res, with both the frequencies and the dispersion roots found by fzero_many.
+#
+def solve_f_res_many(l, l_w_eff, psi, a, rel_tol=None, max_evaluations=None):
+
+    if rel_tol is None:
+        rel_tol = f_res_rel_tol
+    if max_evaluations is None:
+        max_evaluations = f_res_max_evaluations
+
+    x_1 = c_0 / l_w_eff / 40.0
+    x_2 = x_1 * 100.0
+
+    tan_psi = np.tan(psi)
+    Failed  = np.zeros(l.shape, dtype=bool)
+    Gaps    = np.zeros(l.shape, dtype=bool)    # Elements with a test frequency without a dispersion root
+
+    Previous_x   = np.full(l.shape, np.nan)    # x and tau of the previous dispersion solve of each element
+    Previous_tau = np.full(l.shape, np.nan)
+
+    def F_res(x, i):
+
+        # First, solve the sheath helix dispersion function for tau at frequency x.
+        omega = 2.0 * pi * x
+        k_0 = omega / c_0
+
+        a_i, tan_psi_i = a[i], tan_psi[i]
+        F = lambda tau, j: I1K1_I0K0v(tau*a_i[j]) - (tau / k_0[j] * tan_psi_i[j])**2
+
+        tau_1 = k_0 / tan_psi_i**2 - k_0**2    # an estimate
+        tau_2 = k_0                            # another estimate
+
+        tau = np.full(x.shape, np.nan)
+        error_code = np.full(x.shape, 4)
+
+        Warm = ~np.isnan(Previous_tau[i]) & (tau_1 > 0)
+        Guess = Previous_tau[i] * x / Previous_x[i]
+        tau_lo = np.maximum(np.minimum(tau_1, tau_2), Guess * (1 - f_res_tau_bracket))
+        tau_hi = np.minimum(np.maximum(tau_1, tau_2), Guess * (1 + f_res_tau_bracket))
+        Warm &= tau_lo < tau_hi
+
+        j = np.flatnonzero(Warm)
+        if j.size:
+            tau[j], error_code[j], _ = fzero_many(lambda tau, k: F(tau, j[k]), tau_lo[j], tau_hi[j])
+
+        j = np.flatnonzero(error_code == 4)
+        if j.size:
+            tau[j], error_code[j], _ = fzero_many(lambda tau, k: F(tau, j[k]), tau_1[j], tau_2[j])
+
+        Result = np.sqrt(k_0**2 + tau**2) * l[i] - pi/2.0
+
+        # No solution: treat as above resonance, as the original bisection did
+        NoRoot = np.isnan(tau)
+        Result[NoRoot] = np.inf
+        Gaps[i[NoRoot]] = True
+
+        Previous_x[i[~NoRoot]] = x[~NoRoot]
+        Previous_tau[i[~NoRoot]] = tau[~NoRoot]
+
+        # solve_f_res raises here; a zero ends the search for the element
+        Failed[i[error_code == 2]] = True
+        Result[error_code == 2] = 0.0
+        return Result
+
+    f_res, error_code, f_evaluations = fzero_many(F_res, x_1, x_2, rel_tol=rel_tol, abs_tol=0,
+                                                  max_evaluations=max_evaluations)
+    Failed |= error_code == 2
+
+    # No resonance within the range: return the end the search would have converged to
+    i = np.flatnonzero(error_code == 4)
+    if i.size:
+        f_res[i] = np.where(F_res(x_1[i], i) < 0, x_2[i], x_1[i])
+
+    # Where the dispersion function had no root in the estimated bracket, solve_f_res widens it: these few go
+    #   through solve_f_res
+    for i in np.flatnonzero(Gaps & ~Failed):
+        try:
+            f_res[i] = solve_f_res(float(l[i]), float(l_w_eff[i]), float(psi[i]), float(a[i]), rel_tol, max_evaluations)
+        except (ArithmeticError, ValueError):
+            Failed[i] = True
+
+    return f_res, Failed
+
+
 ########################################################################################################################
 #
 # Coil - Generate a new "CoilInfo" struct containing the initial parameters
@@ -191,7 +908,20 @@ class Coil():
      # __repr__ allows user to use pprint on this object
      #
     def __repr__(self):
-        return "{}:".format(self.__class__.__name__) + " {\n" + ''.join("    %s: %s,\n" % item for item in vars(self).items()) + "    }\n"
+        self.RunStages(STAGES[-1])
+        return "{}:".format(self.__class__.__name__) + " {\n" + ''.join("    %s: %s,\n" % item for item in vars(self).items() if item[0][0] != '_') + "    }\n"
+
+     #
+     # __getattr__ is only called for members that are not set: the results of stages that have not been run yet.
+     #   Run the stages up to the one that sets the member, then return it.
+     #
+    def __getattr__(self, name):
+        Pending = self.__dict__.get('_pending')
+        if not Pending or STAGE_OF.get(name) not in Pending:
+            raise AttributeError("'{}' object has no attribute '{}'".format(self.__class__.__name__, name))
+
+        self.RunStages(STAGE_OF[name])
+        return self.__dict__[name]
 
     def lookup_Phi(self, l, D, p, d):
         l_D = HeaderIndices(l_D_header, l/D)
@@ -200,76 +930,26 @@ class Coil():
         # triple linear interpolation
         # h-h1 = (h2-h1) / (x2-x1) * (x-x1)
         # Phi_p_d_index1 = (Phi2 - Phi1) / (l_D.index2 - l_D.index1) * (l/D - l_D.index1) + Phi1
-        Phi_p_d.index1  = medhurst[l_D.index2][p_d.index1] - medhurst[l_D.index1][p_d.index1]
-        Phi_p_d.index1 /= l_D_header[l_D.index2] - l_D_header[l_D.index1]
-        Phi_p_d.index1 *= l/D - l_D_header[l_D.index1]
-        Phi_p_d.index1 += medhurst[l_D.index1][p_d.index1]
+        Phi_p_d_index1  = medhurst[l_D.index2][p_d.index1] - medhurst[l_D.index1][p_d.index1]
+        Phi_p_d_index1 /= l_D_header[l_D.index2] - l_D_header[l_D.index1]
+        Phi_p_d_index1 *= l/D - l_D_header[l_D.index1]
+        Phi_p_d_index1 += medhurst[l_D.index1][p_d.index1]
 
-        Phi_p_d.index2  = medhurst[l_D.index2][p_d.index2] - medhurst[l_D.index1][p_d.index2]
-        Phi_p_d.index2 /= l_D_header[l_D.index2] - l_D_header[l_D.index1]
-        Phi_p_d.index2 *= l/D - l_D_header[l_D.index1]
-        Phi_p_d.index2 += medhurst[l_D.index1][p_d.index2]
+        Phi_p_d_index2  = medhurst[l_D.index2][p_d.index2] - medhurst[l_D.index1][p_d.index2]
+        Phi_p_d_index2 /= l_D_header[l_D.index2] - l_D_header[l_D.index1]
+        Phi_p_d_index2 *= l/D - l_D_header[l_D.index1]
+        Phi_p_d_index2 += medhurst[l_D.index1][p_d.index2]
 
-        Phi  = Phi_p_d.index2 - Phi_p_d.index1
+        Phi  = Phi_p_d_index2 - Phi_p_d_index1
         Phi /= p_d_header[p_d.index2] - p_d_header[p_d.index1]
         Phi *= p/d - p_d_header[p_d.index1]
-        Phi += Phi_p_d.index1
+        Phi += Phi_p_d_index1
         return Phi
 
 
     def find_f_res(self):
-        # Secant method root finding algorithm
-        # Loosely based upon http://www.see.ed.ac.uk/~jwp/JavaScript/programming/chop2.html
-
-        x_1 = c_0 / l_w_eff / 40.0
-        x_2 = x_1 * 100.0
-        max_tries = 40
-
-        for tries in range(-1, max_tries+1):    # <= max
-
-            if tries == -1:
-                x = x_1
-            if tries == 0:
-                x = x_2
-            if tries > 0:
-                x = (x_1 + x_2) / 2.0
-
-            # First, solve the sheath helix dispersion function for tau at frequency x.
-            omega = 2.0 * pi * x
-            k_0 = omega / c_0
-
-            F = lambda tau: K1(tau*a) * I1(tau*a) / K0(tau*a) / I0(tau*a) - (tau / k_0 * tan(psi))**2
-
-            tau_1 = k_0 * cot(psi)**2 - k_0**2    # an estimate
-            tau_2 = k_0                           # another estimate
-            zero = fzero(F, tau_1, tau_2)
-            if zero['error_code'] == 2:
-                alert('****An error occurred when solving for the resonant frequency.\n'
-                    + 'However, all shown results are useable.\n\n'
-                    + zero['error_msg'])
-                document['f_res'] = ''
-            tau = zero['zero']
-
-            # Then, check for resonance.
-            # β² = k_0² + τ²
-            # βℓ → π/2
-            fx = sqrt(k_0**2 + tau**2) * l - pi/2.0
-
-            if tries == -1:
-                fx_1 = fx
-            if tries == 0:
-                fx_2 = fx
-            if tries <= 0:
-                continue
-
-            if fx * fx_1 > 0:
-                fx_1 = fx
-                x_1 = x
-            else:
-                fx_2 = fx
-                x_2 = x
-
-        return x
+        si = self._si
+        return solve_f_res(si['l'], si['l_w_eff'], si['psi'], si['a'])
 
 
     ########################################################################################################################
@@ -283,182 +963,354 @@ class Coil():
     #           f,            Frequency of interest
     #           plating,      Index into wire plating table
     #
+    #           stages,       (OPTIONAL) Stages to calculate now, such as ("rf",). Default is none.
+    #
     # Output:   Generate all the rest of the struct parameters
     #
-    def Calculate(self):
+    # The calculation is split into stages (see STAGES), each of which sets some of the members (see STAGE_MEMBERS):
+    #
+    #   "geometry"      p, Phi, D_eff, correction factors, R_eff_s, L_s, psi, et al
+    #   "rf"            the sheath helix dispersion function: beta, Z_c, L_eff_s, X_eff_s, Q_eff
+    #   "lumped"        the lumped circuit equivalent: R_s, C_p
+    #   "f_res"         the self-resonant frequency, and the final error_code and error_msg
+    #   "summary"       the summary text
+    #
+    # Stages that are not requested run on the first access of one of their members, so code that only
+    #   needs (for example) L_eff_s never pays for the self-resonant frequency or the summary text. A stage
+    #   always runs the stages before it first. The stages calculate the coil as it was when Calculate()
+    #   was called, even if D, N, l, d, f or plating have been changed since.
+    #
+    # Within the stages, the values are calculated by nodes (see NODES), which are remembered from one
+    #   Calculate() to the next. Only the nodes downstream of the inputs changed since the last Calculate()
+    #   are calculated again: changing f leaves Phi, k_L, k_s, k_m and L_s alone, changing N leaves delta_i
+    #   alone, and so on. The results are the same as for a new Coil. self.recomputed counts the nodes
+    #   calculated so far.
+    #
+    def Calculate(self, stages=()):
 
-        self.summary    = ""
-        self.error_code = 0
-        self.error_msg  = ""
+        Inputs = (self.D, self.N, self.l, self.d, self.f, self.plating)
 
-        try:
-            plating_nr = int(self.plating)
-            rho = plating[plating_nr].rho * 1E-9
-            mu_r_w = plating[plating_nr].mu_r
-            self.rho = rho * 1E9
-            self.mu_r_w = mu_r_w
-
-            N = float(self.N)
-            global l
-            l = float(self.l) * 1E-3
-            p = l / N
-            self.p = round(p * 1E3, 2)
+        if '_inputs' not in self.__dict__:
+            self._si         = {}       # Intermediate values, in SI units
+            self._valid      = set()    # Nodes whose values (and members) are up to date
+            self._members    = {}       # Members of the valid nodes, set again when their stage runs
+            self._recomputed = 0
+        else:
+            self.Invalidate([Name for Name, Old, New in zip(INPUTS, self._inputs, Inputs) if Old != New])
 
-            D = float(self.D) * 1E-3
-            d = float(self.d) * 1E-3
-            Phi = self.lookup_Phi(l, D, p, d)
-            self.Phi = round(Phi, 2)
+            if Inputs != self._inputs:
+                self.__dict__.pop('_cachekey', None)    # No longer the coil looked up in the disk cache
 
-            D_eff = D - d * (1.0 - 1.0/sqrt(Phi))
-            self.D_eff = round(D_eff * 1E3, 2)
+        self._inputs  = Inputs
+        self._errors  = []      # (stage, error_code, error_msg) for each failed stage
+        self._pending = list(STAGES)
 
+        self._members = {Name: self.__dict__.get(Name, self._members.get(Name)) for Node in self._valid for Name in NODE_MEMBERS[Node]}
 
-            # Correction factors
+        for Members in STAGE_MEMBERS.values():
+            for Name in Members:
+                self.__dict__.pop(Name, None)
 
-            if l <= D_eff:    # The short coil expression gives a value that agrees better with the AGM result.
-                k_L  = 1.0 + 0.383901 * (l/D_eff)**2 + 0.017108 * (l/D_eff)**4
-                k_L /= 1.0 + 0.258952 * (l/D_eff)**2
-                k_L *= log(4.0 * D_eff/l) - 0.5
-                k_L += 0.093842 * (l/D_eff)**2 + 0.002029 * (l/D_eff)**4 - 0.000801 * (l/D_eff)**6
-                k_L *= 2.0/pi * l/D_eff
-            else:
-                k_L  = 1.0 + 0.383901 * (D_eff/l)**2 + 0.017108 * (D_eff/l)**4
-                k_L /= 1.0 + 0.258952 * (D_eff/l)**2
-                k_L -= 4.0/3.0/pi * D_eff/l
-            self.k_L = round(k_L, 6)
+        for Stage in stages:
+            self.RunStages(Stage)
 
-            k_s = 5.0/4.0 - log(2 * p/d)
-            self.k_s = round(k_s, 6)
 
-            c_9 = -log(2.0*pi) +3.0/2.0 +0.33084236 +1.0/120.0 -1.0/504.0 +0.0011925
-            k_m  = log(2.0*pi) -3.0/2.0 -log(N)/6.0/N -0.33084236/N -1.0/(120.0*N**3) +1.0/(504.0*N**5) -0.0011925/N**7 + c_9/N**9
-            self.k_m = round(k_m, 8)
+    ####################################################################################################################
+    #
+    # Invalidate - Mark nodes for calculation by the next Calculate()
+    #
+    # Inputs:   names,  (OPTIONAL) Inputs (such as "f") or nodes (such as "Phi") whose downstream nodes are
+    #                     calculated again. Default is all nodes, as after changing a module setting such
+    #                     as f_res_rel_tol.
+    #
+    def Invalidate(self, names=None):
+        if names is None:
+            names = list(NODE_VALUES)
 
+        for Name in names:
+            for Node in DOWNSTREAM[Name] | ({Name} & set(NODE_VALUES)):
+                self._valid.discard(Node)
+                for Value in NODE_VALUES[Node]:
+                    self._si.pop(Value, None)
 
-            # Effective series AC resistance
 
-            l_w_phys = sqrt((N * pi * D)**2 + l**2)
-            self.l_w_phys = round(l_w_phys * 1E3, 1)
+    @property
+    def recomputed(self):
+        return self._recomputed
 
-            global l_w_eff
-            l_w_eff = sqrt((N * pi * D_eff)**2 + l**2)
-            self.l_w_eff = round(l_w_eff * 1E3, 1)
+     #
+     # Stale is true (and counts the node as calculated) if the node has to be calculated again. Otherwise
+     #   it sets the members of the node as they were calculated before.
+     #   FailStage marks the nodes of a failed stage, and the ones downstream of them, for calculation again.
+     #
+    def Stale(self, node):
+        if node in self._valid:
+            for Name in NODE_MEMBERS[node]:
+                setattr(self, Name, self._members[Name])
+            return False
 
-            f = float(self.f) * 1E6
-            delta_i = sqrt(rho /pi /f /mu_0 /mu_r_w)
-            self.delta_i = round(delta_i * 1E6, 2)
+        self._valid.add(node)
+        self._recomputed += 1
+        return True
 
-            R_eff_s  = rho * l_w_eff
-            R_eff_s /= pi * (d * delta_i - delta_i**2)
-            R_eff_s *= Phi
-            if(N > 1):
-                R_eff_s *= (N-1.0) / N
-            self.R_eff_s = round(R_eff_s, 3)
+    def FailStage(self, stage):
+        for Node in STAGE_NODES[stage]:
+            self._valid -= {Node} | DOWNSTREAM[Node]
 
 
-            # Corrected current-sheet geometrical formula
+    ####################################################################################################################
+    #
+    # RunStages - Run all pending calculation stages up to (and including) the specified one
+    #
+    def RunStages(self, stage):
+        Pending = self.__dict__.get('_pending', [])
 
-            mu_r_core = 1
-            L_s  = pi * (D_eff * N)**2 /4.0 /l * k_L
-            L_s -= D_eff * N * (k_s + k_m) / 2.0
-            L_s *= mu_r_core * mu_0
-            self.L_s = round(L_s * 1E6, 3)
+        #
+        # With the disk cache, a coil calculated before (from rf on) is restored rather than calculated
+        #   again, and the stages calculated here are saved for next time. Not for the coils of a search
+        #   for the turns (see InterpolateTurns), whose intermediate coils are not asked for again.
+        #
+        Caching = disk_cache.path is not None and stage in Pending and stage != 'geometry' and not self.__dict__.get('_solving')
 
-            global psi
-            psi = atan(p /pi /D_eff)
-            self.psi = round(psi / pi * 180, 2)
+        if Caching and not self._valid:
+            self._cachekey = self.CacheKey('Coil', *self._inputs)
 
+            if self.Restore(disk_cache.get(self._cachekey), Keep=('error_code', 'error_msg')):
+                Pending = self._pending
 
-            # Copy & paste text field
-            t = time.time()
-            self.summary += '# QOIL™ — https://hamwaves.com/qoil/ — v{}\n'.format(VERSION)
-            self.summary += time.strftime('#   Coil design %Y-%m-%d %H:%M\n', time.localtime(t))
+        Ran = False
 
-            offset = 28
-            self.summary += '# \nINPUT\n'
-            self.summary += '#   {:{offset}} D = {} mm\n'        .format('mean diameter of the coil', self.D, offset=offset)
-            self.summary += '#   {:{offset}} N = {}\n'           .format('number of turns'          , self.N, offset=offset)
-            self.summary += '#   {:{offset}} ℓ = {} mm\n'        .format('length of the coil'       , self.l, offset=offset)
-            self.summary += '#   {:{offset}} d = {} mm\n'        .format('wire or tubing diameter'  , self.d, offset=offset)
-            self.summary += '#   {:{offset}} f = {} MHz\n'       .format('design frequency'         , self.f, offset=offset)
-            self.summary += '#   The (plating) material is {}.\n'.format(plating[plating_nr].description)
+        while stage in Pending:
+            Ran   = True
+            Stage = Pending.pop(0)
 
-            self.summary += '# \nINTERMEDIATE RESULTS\n'
-            self.summary += '#   {:{offset}} p = {} mm\n'        .format('winding pitch'            , self.p, offset=offset)
-            self.summary += '#   {:{offset}} ℓ_w_phys = {} mm\n' .format('physical conductor length', self.l_w_phys, offset=offset)
-            self.summary += '#   {:{offset}} ψ = {}°\n'          .format('effective pitch angle'    , self.psi, offset=offset)
+            if any(Error[0] == 'geometry' for Error in self._errors):
+                self.SkipStage(Stage)
+            else:
+                getattr(self, 'Calculate_' + Stage)()
 
+            #
+            # The error code is final once the last calculating stage has run. A code already set by
+            #   the caller (for example by InterpolateTurns, or a user filter) is left alone.
+            #
+            if Stage == 'f_res' and 'error_code' not in self.__dict__:
+                self.error_code = self._errors[-1][1] if self._errors else 0
+                self.error_msg  = self._errors[-1][2] if self._errors else ""
 
-            # Characteristic impedance of the sheath helix waveguide mode
+        if Caching and Ran and '_cachekey' in self.__dict__:
+            disk_cache.put(self._cachekey, self.CacheState())
 
-            offset = 55
-            try:
-                omega = 2.0 * pi * f
-                k_0 = omega / c_0
-                global a
-                a = D_eff / 2.0
-
-                # Sheath helix dispersion function
-                F = lambda tau: K1(tau*a) * I1(tau*a) / (K0(tau*a) * I0(tau*a)) - (tau / k_0 * tan(psi))**2
-
-                tau_1 = k_0                  # smallest tau estimate
-                tau_2 = k_0 * cot(psi)**2    # largest tau estimate
-                zero = fzero(F, tau_1, tau_2)
-                tau = zero['zero']
-                beta = sqrt(k_0**2 + tau**2)
+
+    ####################################################################################################################
+    #
+    # CacheKey, CacheState, Restore - Keys and values of the disk cache (see use_disk_cache)
+    #
+    # CacheKey adds the module settings the results depend on to the values given. CacheState is the state
+    #   of the calculation (see CACHE_STATE) and the extra members given. Restore sets the members from a
+    #   saved state, except those in Keep that are set now (such as an error code set by a user filter),
+    #   and returns False for no state.
+    #
+    def CacheKey(self, *values):
+        return disk_cache.key(*values, dispersion_table is not None, f_res_rel_tol, f_res_max_evaluations, f_res_tau_bracket, f_res_gap_step)
+
+    def CacheState(self, extra=()):
+        return {Name: Value for Name, Value in self.__dict__.items() if Name in CACHE_STATE or Name in extra}
+
+    def Restore(self, state, Keep=()):
+        if state is None:
+            return False
+
+        Kept = {Name: self.__dict__[Name] for Name in Keep if Name in self.__dict__}
+
+        self.__dict__.update(state)
+        self.__dict__.update(Kept)
+        return True
+
+
+    ####################################################################################################################
+    #
+    # SkipStage - Zero the members of a stage that cannot be calculated
+    #
+    def SkipStage(self, stage):
+        for Name in STAGE_MEMBERS[stage]:
+            if Name not in ('error_code', 'error_msg', 'summary'):
+                setattr(self, Name, 0)
+
+        if stage == 'summary':
+            self.Calculate_summary()
+
+
+    def Calculate_geometry(self):
+        si = self._si
+        D, N, l, d, f, plating_nr = self._inputs
+
+        try:
+            if self.Stale('rho'):
+                plating_nr = int(plating_nr)
+                rho = si['rho'] = plating[plating_nr].rho * 1E-9
+                mu_r_w = si['mu_r_w'] = plating[plating_nr].mu_r
+                self.rho = rho * 1E9
+                self.mu_r_w = mu_r_w
+
+            N = si['N'] = float(N)
+            l = si['l'] = float(l) * 1E-3
+            D = si['D'] = float(D) * 1E-3
+            d = si['d'] = float(d) * 1E-3
+            f = si['f'] = float(f) * 1E6
+
+            if self.Stale('p'):
+                p = si['p'] = l / N
+                self.p = round(p * 1E3, 2)
+
+            if self.Stale('Phi'):
+                Phi = si['Phi'] = self.lookup_Phi(l, D, si['p'], d)
+                self.Phi = round(Phi, 2)
+
+            if self.Stale('D_eff'):
+                D_eff = si['D_eff'] = D - d * (1.0 - 1.0/sqrt(si['Phi']))
+                si['a'] = D_eff / 2.0
+                self.D_eff = round(D_eff * 1E3, 2)
+
+            D_eff = si['D_eff']
+
+
+            # Correction factors
+
+            if self.Stale('k_L'):
+                if l <= D_eff:    # The short coil expression gives a value that agrees better with the AGM result.
+                    k_L  = 1.0 + 0.383901 * (l/D_eff)**2 + 0.017108 * (l/D_eff)**4
+                    k_L /= 1.0 + 0.258952 * (l/D_eff)**2
+                    k_L *= log(4.0 * D_eff/l) - 0.5
+                    k_L += 0.093842 * (l/D_eff)**2 + 0.002029 * (l/D_eff)**4 - 0.000801 * (l/D_eff)**6
+                    k_L *= 2.0/pi * l/D_eff
+                else:
+                    k_L  = 1.0 + 0.383901 * (D_eff/l)**2 + 0.017108 * (D_eff/l)**4
+                    k_L /= 1.0 + 0.258952 * (D_eff/l)**2
+                    k_L -= 4.0/3.0/pi * D_eff/l
+                si['k_L'] = k_L
+                self.k_L = round(k_L, 6)
+
+            if self.Stale('k_s'):
+                k_s = si['k_s'] = 5.0/4.0 - log(2 * si['p']/d)
+                self.k_s = round(k_s, 6)
+
+            if self.Stale('k_m'):
+                c_9 = -log(2.0*pi) +3.0/2.0 +0.33084236 +1.0/120.0 -1.0/504.0 +0.0011925
+                k_m  = log(2.0*pi) -3.0/2.0 -log(N)/6.0/N -0.33084236/N -1.0/(120.0*N**3) +1.0/(504.0*N**5) -0.0011925/N**7 + c_9/N**9
+                si['k_m'] = k_m
+                self.k_m = round(k_m, 8)
+
+
+            # Effective series AC resistance
+
+            if self.Stale('l_w_phys'):
+                l_w_phys = si['l_w_phys'] = sqrt((N * pi * D)**2 + l**2)
+                self.l_w_phys = round(l_w_phys * 1E3, 1)
+
+            if self.Stale('l_w_eff'):
+                l_w_eff = si['l_w_eff'] = sqrt((N * pi * D_eff)**2 + l**2)
+                self.l_w_eff = round(l_w_eff * 1E3, 1)
+
+            if self.Stale('delta_i'):
+                delta_i = si['delta_i'] = sqrt(si['rho'] /pi /f /mu_0 /si['mu_r_w'])
+                self.delta_i = round(delta_i * 1E6, 2)
+
+            if self.Stale('R_eff_s'):
+                delta_i = si['delta_i']
+                R_eff_s  = si['rho'] * si['l_w_eff']
+                R_eff_s /= pi * (d * delta_i - delta_i**2)
+                R_eff_s *= si['Phi']
+                if(N > 1):
+                    R_eff_s *= (N-1.0) / N
+                self.R_eff_s = round(R_eff_s, 3)
+                si['R_eff_s'] = R_eff_s
+
+
+            # Corrected current-sheet geometrical formula
+
+            if self.Stale('L_s'):
+                mu_r_core = 1
+                L_s  = pi * (D_eff * N)**2 /4.0 /l * si['k_L']
+                L_s -= D_eff * N * (si['k_s'] + si['k_m']) / 2.0
+                L_s *= mu_r_core * mu_0
+                si['L_s'] = L_s
+                self.L_s = round(L_s * 1E6, 3)
+
+            if self.Stale('psi'):
+                psi = si['psi'] = atan(si['p'] /pi /D_eff)
+                self.psi = round(psi / pi * 180, 2)
+
+        except:
+            self.FailStage('geometry')
+
+            for Name in STAGE_MEMBERS['geometry']:
+                if Name not in ('rho', 'mu_r_w') or Name not in self.__dict__:
+                    setattr(self, Name, 0)
+
+            self._errors.append(('geometry', 3, 'An error occurred when solving for the self-resonant frequency.'))
+
+
+    def Calculate_rf(self):
+        si = self._si
+
+        # Characteristic impedance of the sheath helix waveguide mode
+
+        try:
+            if self.Stale('tau'):
+                omega = si['omega'] = 2.0 * pi * si['f']
+                k_0 = si['k_0'] = omega / c_0
+                si['tau'] = solve_dispersion(k_0, si['psi'], si['a'])
+
+            omega, k_0, tau = si['omega'], si['k_0'], si['tau']
+
+            if self.Stale('beta'):
+                beta = si['beta'] = sqrt(k_0**2 + tau**2)
                 self.beta = round(beta, 4)
 
-                Z_c = 60.0 * beta / k_0 * I0(tau*a) * K0(tau*a)
+            if self.Stale('Z_c'):
+                Z_c = si['Z_c'] = 60.0 * si['beta'] / k_0 * I0K0(tau*si['a'])
                 self.Z_c = round(Z_c, 1)
 
 
-                # Effective equivalent circuit
+            # Effective equivalent circuit
 
-                # Corrected sheath helix waveguide formula
-                L_eff_s  = Z_c / omega * tan(beta * l) * k_L
-                L_eff_s -= mu_0 * D_eff * N * (k_s + k_m) / 2.0
+            # Corrected sheath helix waveguide formula
+            if self.Stale('L_eff_s'):
+                L_eff_s  = si['Z_c'] / omega * tan(si['beta'] * si['l']) * si['k_L']
+                L_eff_s -= mu_0 * si['D_eff'] * si['N'] * (si['k_s'] + si['k_m']) / 2.0
+                si['L_eff_s'] = L_eff_s
                 self.L_eff_s = round(L_eff_s * 1E6, 3)
 
-                X_eff_s = omega * L_eff_s
+            if self.Stale('X_eff_s'):
+                X_eff_s = si['X_eff_s'] = omega * si['L_eff_s']
                 self.X_eff_s = round(X_eff_s, 1)
 
-                Q_eff = X_eff_s / R_eff_s
+            if self.Stale('Q_eff'):
+                Q_eff = si['Q_eff'] = si['X_eff_s'] / si['R_eff_s']
                 self.Q_eff = int(Q_eff)
 
+        except:
+            self.FailStage('rf')
 
-                # Effective circuit results in copy & paste text field
-                self.summary += '# \nRESULTS\n'
-                self.summary += '#   Effective equivalent circuit\n'
-                self.summary += '#     {:{offset}} L_eff_s = {} μH\n'.format('effective series inductance @ design frequency'      , self.L_eff_s, offset=offset)
-                self.summary += '#     {:{offset}} X_eff_s = {} Ω\n' .format('effective series reactance @ design frequency'       , self.X_eff_s, offset=offset)
-                self.summary += '#     {:{offset}} R_eff_s = {} Ω\n' .format('effective series AC resistance @ design frequency'   , self.R_eff_s, offset=offset)
-                self.summary += '#     {:{offset}} Q_eff   = {}\n'   .format('effective unloaded quality factor @ design frequency', self.Q_eff  , offset=offset)
+            for Name in STAGE_MEMBERS['rf']:
+                setattr(self, Name, 0)
 
-            except:
-                self.summary += '#   Lumped circuit equivalent\n'
-                self.summary += '#     {:{offset}} L_s = {} μH\n'    .format('f-independent series inductance; geometrical formula', self.L_s    , offset=offset)
-                self.summary += '# \n'
-                self.summary += '# ****An error occurred when solving the dispersion function!\n'
-                self.summary += '#     However, all shown results are useable.\n'
+            self._errors.append(('rf', 1, 'An error occurred when solving the dispersion function.'))
 
-                self.beta    = 0
-                self.Z_c     = 0
-                self.L_eff_s = 0
-                self.X_eff_s = 0
-                self.Q_eff   = 0
-                self.R_s     = 0
-                self.C_p     = 0
-                self.f_res   = 0
 
-                self.error_code = 1
-                self.error_msg  = 'An error occurred when solving the dispersion function.'
+    def Calculate_lumped(self):
+        si = self._si
 
+        try:
+            # Lumped equivalent circuit
 
-            try:
-                # Lumped equivalent circuit
+            if self.Stale('R_s'):
+                Q_eff = si['Q_eff']
+                X_eff_s = si['X_eff_s']
+                omega = si['omega']
 
-                R_p = (Q_eff**2 + 1) * R_eff_s
-                X_L_s = omega * L_s
+                R_p = (Q_eff**2 + 1) * si['R_eff_s']
+                X_L_s = omega * si['L_s']
 
                 # https://en.wikipedia.org/wiki/Quadratic_equation#Reduced_quadratic_equation
                 P = R_p / (2.0 * X_L_s)
@@ -474,86 +1326,223 @@ class Coil():
                 C_p = -1.0 /omega /X_C_p
                 self.C_p = round(C_p * 1E12, 1)
 
+        except:
+            self.FailStage('lumped')
 
-                # Lumped circuit results in copy & paste text field
-                self.summary += '#   Lumped circuit equivalent\n'
-                self.summary += '#     {:{offset}} L_s     = {} μH\n'.format('f-independent series inductance; geometrical formula', self.L_s, offset=offset)
-                self.summary += '#     {:{offset}} R_s     = {} Ω\n' .format('series AC resistance @ design frequency'             , self.R_s, offset=offset)
-                self.summary += '#     {:{offset}} C_p     = {} pF\n'.format('parallel stray capacitance @ design frequency'       , self.C_p, offset=offset)
-
-
-            except:
-                self.summary += '#   Lumped circuit equivalent\n'
-                self.summary += '#     {:{offset}} L_s     = {} μH\n'.format('f-independent series inductance; geometrical formula', self.L_s, offset=offset)
-                self.summary += '# \n'
-                self.summary += '#     No lumped circuit equivalent is available!\n'
-                self.summary += '#     However, all shown results are useable.\n'
-
-                self.R_s   = 0
-                self.C_p   = 0
-                self.f_res = 0
+            self.R_s   = 0
+            self.C_p   = 0
 
-                self.error_code = 2
-                self.error_msg  = 'No lumped circuit equivalent is available.'
+            self._errors.append(('lumped', 2, 'No lumped circuit equivalent is available.'))
 
 
-            offset = 57
-            try:
-                # Self‑resonant frequency
+    def Calculate_f_res(self):
+        try:
+            # Self‑resonant frequency
 
+            if self.Stale('f_res'):
                 f_res = self.find_f_res()
                 self.f_res = round(f_res * 1E-6, 3)
 
+        except:
+            self.FailStage('f_res')
 
-                # Resonant frequency in copy & paste text field
-                self.summary += '#   {:{offset}} f_res   = {} MHz\n'.format('Self-resonant frequency', self.f_res, offset=offset)
-
+            self.f_res = 0
 
-            except:
-                self.summary += '\n'
-                self.summary += '# **** An error occurred when solving for the self-resonant frequency!\n'
-                self.summary += '#      However, all shown results are useable.\n'
-                self.f_res   = 0
-                self.error_code = 3
-                self.error_msg  = 'An error occurred when solving for the self-resonant frequency.'
+            self._errors.append(('f_res', 3, 'An error occurred when solving for the self-resonant frequency.'))
 
 
-            self.summary += '# \nDONATE\n'
-            self.summary += '#   If this calculator proved any useful to you,\n'
-            self.summary += '#   please, consider making a one-off donation\n'
-            self.summary += '#   towards keeping me and the server up and running.\n'
-            self.summary += '#   Thank you!'
+    def Calculate_summary(self):
+        Failed = [Error[0] for Error in self._errors]
 
+        self.summary = ""
 
-        except:
+        if 'geometry' in Failed:
 #            self.summary = ""    # COMMENT THIS LINE FOR TESTING PROGRESS
             self.summary += '# \n'
             self.summary += '# ****An error occurred when solving for the self-resonant frequency!\n'
             self.summary += '#     No results are available.\n'
+            return
+
+        D, N, l, d, f, plating_nr = self._inputs
+
+        # Copy & paste text field
+        t = time.time()
+        self.summary += '# QOIL™ — https://hamwaves.com/qoil/ — v{}\n'.format(VERSION)
+        self.summary += time.strftime('#   Coil design %Y-%m-%d %H:%M\n', time.localtime(t))
+
+        offset = 28
+        self.summary += '# \nINPUT\n'
+        self.summary += '#   {:{offset}} D = {} mm\n'        .format('mean diameter of the coil', D, offset=offset)
+        self.summary += '#   {:{offset}} N = {}\n'           .format('number of turns'          , N, offset=offset)
+        self.summary += '#   {:{offset}} ℓ = {} mm\n'        .format('length of the coil'       , l, offset=offset)
+        self.summary += '#   {:{offset}} d = {} mm\n'        .format('wire or tubing diameter'  , d, offset=offset)
+        self.summary += '#   {:{offset}} f = {} MHz\n'       .format('design frequency'         , f, offset=offset)
+        self.summary += '#   The (plating) material is {}.\n'.format(plating[int(plating_nr)].description)
+
+        self.summary += '# \nINTERMEDIATE RESULTS\n'
+        self.summary += '#   {:{offset}} p = {} mm\n'        .format('winding pitch'            , self.p, offset=offset)
+        self.summary += '#   {:{offset}} ℓ_w_phys = {} mm\n' .format('physical conductor length', self.l_w_phys, offset=offset)
+        self.summary += '#   {:{offset}} ψ = {}°\n'          .format('effective pitch angle'    , self.psi, offset=offset)
+
+        offset = 55
+        if 'rf' not in Failed:
+            # Effective circuit results in copy & paste text field
+            self.summary += '# \nRESULTS\n'
+            self.summary += '#   Effective equivalent circuit\n'
+            self.summary += '#     {:{offset}} L_eff_s = {} μH\n'.format('effective series inductance @ design frequency'      , self.L_eff_s, offset=offset)
+            self.summary += '#     {:{offset}} X_eff_s = {} Ω\n' .format('effective series reactance @ design frequency'       , self.X_eff_s, offset=offset)
+            self.summary += '#     {:{offset}} R_eff_s = {} Ω\n' .format('effective series AC resistance @ design frequency'   , self.R_eff_s, offset=offset)
+            self.summary += '#     {:{offset}} Q_eff   = {}\n'   .format('effective unloaded quality factor @ design frequency', self.Q_eff  , offset=offset)
+        else:
+            self.summary += '#   Lumped circuit equivalent\n'
+            self.summary += '#     {:{offset}} L_s = {} μH\n'    .format('f-independent series inductance; geometrical formula', self.L_s    , offset=offset)
+            self.summary += '# \n'
+            self.summary += '# ****An error occurred when solving the dispersion function!\n'
+            self.summary += '#     However, all shown results are useable.\n'
+
+        if 'lumped' not in Failed:
+            # Lumped circuit results in copy & paste text field
+            self.summary += '#   Lumped circuit equivalent\n'
+            self.summary += '#     {:{offset}} L_s     = {} μH\n'.format('f-independent series inductance; geometrical formula', self.L_s, offset=offset)
+            self.summary += '#     {:{offset}} R_s     = {} Ω\n' .format('series AC resistance @ design frequency'             , self.R_s, offset=offset)
+            self.summary += '#     {:{offset}} C_p     = {} pF\n'.format('parallel stray capacitance @ design frequency'       , self.C_p, offset=offset)
+        else:
+            self.summary += '#   Lumped circuit equivalent\n'
+            self.summary += '#     {:{offset}} L_s     = {} μH\n'.format('f-independent series inductance; geometrical formula', self.L_s, offset=offset)
+            self.summary += '# \n'
+            self.summary += '#     No lumped circuit equivalent is available!\n'
+            self.summary += '#     However, all shown results are useable.\n'
+
+        offset = 57
+        if 'f_res' not in Failed:
+            # Resonant frequency in copy & paste text field
+            self.summary += '#   {:{offset}} f_res   = {} MHz\n'.format('Self-resonant frequency', self.f_res, offset=offset)
+        else:
+            self.summary += '\n'
+            self.summary += '# **** An error occurred when solving for the self-resonant frequency!\n'
+            self.summary += '#      However, all shown results are useable.\n'
+
+        self.summary += '# \nDONATE\n'
+        self.summary += '#   If this calculator proved any useful to you,\n'
+        self.summary += '#   please, consider making a one-off donation\n'
+        self.summary += '#   towards keeping me and the server up and running.\n'
+        self.summary += '#   Thank you!'
+
+
+    ####################################################################################################################
+    #
+    # sweep - Calculate the frequency dependent parameters over a range of frequencies
+    #
+    # Inputs:   frequencies,    Array (or list) of frequencies (MHz)
+    #
+    # Output:   numpy structured array, one record per frequency, with fields
+    #
+    #               f, delta_i, R_eff_s, beta, Z_c, L_eff_s, X_eff_s, Q_eff, R_s, C_p, error_code
+    #
+    #           in the same units as the Coil members (f in MHz), but not rounded.
+    #
+    # The geometry (Phi, D_eff, k_L, k_s, k_m, l_w_eff, L_s, psi) is calculated once, for the coil as of the last
+    #   Calculate(), and only the rest is calculated for each frequency, vectorized. The error code of each
+    #   frequency is as for Calculate(): 1 if the dispersion function could not be solved, 2 if there is no
+    #   lumped equivalent circuit, and 3 (for all frequencies) if the geometry could not be calculated.
+    #   The self-resonant frequency does not depend on f, see self.f_res.
+    #
+    # Requires numpy.
+    #
+    SWEEP_FIELDS = ('f', 'delta_i', 'R_eff_s', 'beta', 'Z_c', 'L_eff_s', 'X_eff_s', 'Q_eff', 'R_s', 'C_p', 'error_code')
+
+    def sweep(self, frequencies):
+        if np is None:
+            raise ImportError('Coil.sweep requires numpy')
+
+        self.RunStages('geometry')
+        si = self._si
+
+        f = np.asarray(frequencies, dtype=float).ravel()
+        Results = np.zeros(f.shape, dtype=[(Name, int if Name == 'error_code' else float) for Name in self.SWEEP_FIELDS])
+        Results['f'] = f
+
+        if any(Error[0] == 'geometry' for Error in self._errors):
+            Results['error_code'] = 3
+            return Results
+
+        with np.errstate(all='ignore'):
+            f = f * 1E6
+            N, d, Phi, rho, mu_r_w = si['N'], si['d'], si['Phi'], si['rho'], si['mu_r_w']
+
+            # Effective series AC resistance
+
+            delta_i = np.sqrt(rho /pi /f /mu_0 /mu_r_w)
+
+            R_eff_s  = rho * si['l_w_eff']
+            R_eff_s /= pi * (d * delta_i - delta_i**2)
+            R_eff_s *= Phi
+            if(N > 1):
+                R_eff_s *= (N-1.0) / N
+
+
+            # Characteristic impedance of the sheath helix waveguide mode
+
+            omega = 2.0 * pi * f
+            k_0 = omega / c_0
+            a = si['a']
+            psi = np.full(f.shape, si['psi'])
+
+            if dispersion_table is not None:
+                tau = np.array([solve_dispersion(float(k), si['psi'], a) for k in k_0])
+            else:
+                tau = solve_dispersion_many(k_0, psi, np.full(f.shape, a))
+
+            beta = np.sqrt(k_0**2 + tau**2)
+            Z_c  = 60.0 * beta / k_0 * I0K0v(tau*a)
+
+
+            # Effective equivalent circuit
+
+            # Corrected sheath helix waveguide formula
+            L_eff_s  = Z_c / omega * np.tan(beta * si['l']) * si['k_L']
+            L_eff_s -= mu_0 * si['D_eff'] * N * (si['k_s'] + si['k_m']) / 2.0
+
+            X_eff_s = omega * L_eff_s
+            Q_eff   = X_eff_s / R_eff_s
 
-            self.p        = 0
-            self.Phi      = 0
-            self.D_eff    = 0
-            self.k_L      = 0
-            self.k_s      = 0
-            self.k_m      = 0
-            self.l_w_phys = 0
-            self.l_w_eff  = 0
-            self.delta_i  = 0
-            self.R_eff_s  = 0
-            self.L_s      = 0
-            self.psi      = 0
-            self.beta     = 0
-            self.Z_c      = 0
-            self.L_eff_s  = 0
-            self.X_eff_s  = 0
-            self.Q_eff    = 0
-            self.R_s      = 0
-            self.C_p      = 0
-            self.f_res    = 0
-
-            self.error_code = 3
-            self.error_msg  = 'An error occurred when solving for the self-resonant frequency.'
+            RF = np.isfinite(Q_eff) & np.isfinite(R_eff_s) & (f > 0)
+
+
+            # Lumped equivalent circuit
+
+            R_p = (Q_eff**2 + 1) * R_eff_s
+            X_L_s = omega * si['L_s']
+
+            # https://en.wikipedia.org/wiki/Quadratic_equation#Reduced_quadratic_equation
+            P = R_p / (2.0 * X_L_s)
+            Q_L = P + np.sqrt(P**2 - 1)
+
+            R_s = X_L_s / Q_L
+
+            X_eff_p = (Q_eff**2 + 1.0) / Q_eff**2 * X_eff_s
+            X_L_p = (Q_L**2 + 1.0) / Q_L**2 * X_L_s
+
+            X_C_p = X_eff_p * X_L_p / (X_L_p - X_eff_p)
+            C_p = -1.0 /omega /X_C_p
+
+            Lumped = RF & (Q_eff != 0) & (X_L_p != X_eff_p) & np.isfinite(R_s) & np.isfinite(C_p)
+
+        Zero = lambda Value, Mask: np.where(Mask, Value, 0.0)
+
+        Results['delta_i'] = Zero(delta_i * 1E6, RF)
+        Results['R_eff_s'] = Zero(R_eff_s      , RF)
+        Results['beta']    = Zero(beta         , RF)
+        Results['Z_c']     = Zero(Z_c          , RF)
+        Results['L_eff_s'] = Zero(L_eff_s * 1E6, RF)
+        Results['X_eff_s'] = Zero(X_eff_s      , RF)
+        Results['Q_eff']   = Zero(Q_eff        , RF)
+        Results['R_s']     = Zero(R_s          , Lumped)
+        Results['C_p']     = Zero(C_p * 1E12   , Lumped)
+
+        Results['error_code'][~Lumped] = 2
+        Results['error_code'][~RF] = 1
+        return Results
 
 
     ####################################################################################################################
@@ -567,9 +1556,12 @@ class Coil():
     # Used by fzero() when interpolating the coil turns ("N") so that the proposed test
     #   coil matches the target impedance.
     #
+    # Only the stages up to L_eff_s are calculated. The rest (self resonance, summary, ...) run later, if
+    #   needed, for the final number of turns only.
+    #
     def IDiff(self,Turns):
         self.N = Turns
-        self.Calculate()
+        self.Calculate(stages=('rf',))
 
 #        print("==============")
 #        print("Turns: ",Turns)
@@ -579,11 +1571,67 @@ class Coil():
         return self.LTarget - self.L_eff_s
 
 
+    ####################################################################################################################
+    #
+    # dL_eff_s_dN - Derivative of the effective series inductance with respect to the number of turns
+    #
+    # Output:   dL_eff_s/dN (μH per turn), for the coil as of the last Calculate(), not rounded
+    #
+    # Raises ArithmeticError if the rf stage could not be calculated.
+    #
+    # The geometry (D_eff, k_L, k_s, k_m, psi) is closed-form in N apart from the Medhurst table, and is
+    #   differentiated with central differences, which only cost two geometry stages. The derivative of
+    #   tau follows from the dispersion function F(x, u) = I1K1/I0K0(x) - (x/u)² = 0, with x = tau*a and
+    #   u = k_0*a*cot(psi): dx/du = -(∂F/∂u) / (∂F/∂x), with ∂F/∂x from dispersion_slope.
+    #
+    def dL_eff_s_dN(self):
+        self.RunStages('rf')
+        if any(Error[0] in ('geometry', 'rf') for Error in self._errors):
+            raise ArithmeticError('L_eff_s could not be calculated')
+
+        si = self._si
+        D, N, l, d, f, plating_nr = self._inputs
+
+        N = si['N']
+        h = N * 1E-6
+        Geometry = []
+        for Turns in (N + h, N - h):
+            Test = Coil(D, Turns, l, d, f, plating_nr)
+            Test.RunStages('geometry')
+            if Test._errors:
+                raise ArithmeticError('The geometry could not be calculated')
+            Geometry.append(Test._si)
+
+        dg = {Name: (Geometry[0][Name] - Geometry[1][Name]) / (2.0*h) for Name in ('a', 'D_eff', 'k_L', 'k_s', 'k_m', 'psi')}
+
+        # Implicit derivative of the dispersion root
+        omega, k_0, tau, a, psi, beta = si['omega'], si['k_0'], si['tau'], si['a'], si['psi'], si['beta']
+        x = tau * a
+        u = k_0 * a / tan(psi)
+        du = k_0 * (dg['a'] / tan(psi) - a / sin(psi)**2 * dg['psi'])
+        dx = -2.0 * x**2 / u**3 / dispersion_slope(x, u) * du
+        dtau = (dx - tau * dg['a']) / a
+
+        dbeta = tau / beta * dtau
+        dI0K0 = I1e(x) * K0e(x) - I0e(x) * K1e(x)
+        dZ_c  = 60.0 / k_0 * (dbeta * I0K0(x) + beta * dI0K0 * dx)
+
+        T  = tan(beta * si['l'])
+        dT = si['l'] * (1.0 + T**2) * dbeta
+
+        dL_eff_s  = (dZ_c * T * si['k_L'] + si['Z_c'] * dT * si['k_L'] + si['Z_c'] * T * dg['k_L']) / omega
+        dL_eff_s -= mu_0 / 2.0 * (dg['D_eff'] * N + si['D_eff']) * (si['k_s'] + si['k_m'])
+        dL_eff_s -= mu_0 / 2.0 * si['D_eff'] * N * (dg['k_s'] + dg['k_m'])
+        return dL_eff_s * 1E6
+
+
     ####################################################################################################################
     #
     # InterpolateTurns - Interpolate the number of turns needed to attain a specified inductance
     #
     # Inputs:   Inductance to attain
+    #           NGuess  (OPTIONAL) Expected number of turns, such as the result for a neighboring coil in a scan
+    #           NWidth  (OPTIONAL) Expected distance of the result from NGuess (default: 1% of NGuess)
     #
     # Output:   self.N          is set to the number of turns needed to attain the inductance
     #           self.error_code is non-zero on calculation error
@@ -593,7 +1641,42 @@ class Coil():
     #         realized. For example, when the number of turns times the wire diameter exceeds the
     #         coil length.
     #
-    def InterpolateTurns(self,LTarget):
+    # With NGuess, the turns are first searched for in a narrow bracket around NGuess, which is widened
+    #   a few times if it doesn't hold the target inductance. The bracket never extends past the range
+    #   of turns searched without NGuess, and the error checks are the same.
+    #
+    # With Newton, the turns are searched for with Newton steps on dL_eff_s_dN, starting at NGuess (if
+    #   given), which usually needs 4 or 5 rf calculations instead of 10 to 30. The result is a zero of
+    #   IDiff like the one found by fzero, but not necessarily the same N within the inductance resolution.
+    #
+    # With the disk cache (see use_disk_cache), the coil found for the same inputs and options before is
+    #   restored rather than searched for again.
+    #
+    def InterpolateTurns(self,LTarget,NGuess=None,NWidth=None,Newton=False):
+        if disk_cache.path is None:
+            return self.SolveTurns(LTarget,NGuess,NWidth,Newton)
+
+        Key = self.CacheKey('InterpolateTurns', self.D, self.l, self.d, self.f, self.plating, LTarget, NGuess, NWidth,
+                            Newton, InterpolateWiden, NewtonMaxSteps)
+
+        State = disk_cache.get(Key)
+
+        if State is not None:
+            for Name in list(STAGE_OF) + ['_cachekey']:
+                self.__dict__.pop(Name, None)
+
+            self.Restore(State)
+            return
+
+        self._solving = True
+        try:
+            self.SolveTurns(LTarget,NGuess,NWidth,Newton)
+        finally:
+            del self._solving
+
+        disk_cache.put(Key, self.CacheState(('N', 'LTarget')))
+
+    def SolveTurns(self,LTarget,NGuess=None,NWidth=None,Newton=False):
         self.LTarget = LTarget
 
         #
@@ -621,7 +1704,7 @@ class Coil():
             return
 
         self.N = NStart
-        self.Calculate()
+        self.Calculate(stages=('rf',))
 
         LStart = self.L_eff_s
 
@@ -645,7 +1728,21 @@ class Coil():
 #        LEnd = self.L_eff_s
 #        #  END_DEBUG
 
-        Results = fzero(lambda Turns: self.IDiff(Turns), NStart, NEnd)
+        Results = None
+
+        if Newton:
+            Results = self.InterpolateNewton(NGuess,NStart,NEnd,LTarget - LStart)
+        elif NGuess is not None:
+            Results = self.InterpolateNear(NGuess,NWidth,NStart,NEnd,LTarget - LStart)
+
+        if Results is None:
+            Results = fzero(lambda Turns: self.IDiff(Turns), NStart, NEnd)
+
+        #
+        # fzero doesn't always evaluate the zero last: make sure the coil is calculated for it
+        #
+        if Results['error_code'] in (0, 1) and self.N != Results['zero']:
+            self.IDiff(Results['zero'])
 
 #        #  DEBUG
 #        print("NStart=%g" % NStart + ", LStart=%g" % LStart)
@@ -677,6 +1774,259 @@ class Coil():
             self.error_msg  = 'Resonant frequency less than frequency of interest.'
             return
 
+    ####################################################################################################################
+    #
+    # PreScreen - Check whether InterpolateTurns can find a valid coil, from the geometry alone
+    #
+    # Inputs:   LTarget,     Inductance to attain
+    #           SelfResMin,  (OPTIONAL) Minimum f_res the coil is filtered with (MHz), 0 for none
+    #
+    # Output:   True if no coil InterpolateTurns can find would be valid and pass the SelfResMin filter.
+    #             Then self.error_code and self.error_msg are set, with the error InterpolateTurns (7, 6, 4)
+    #             or CoilScanDL's UserFilter (11) would give for the same reason, although for coils that
+    #             fail in more than one way it may not be the one the full calculation reports.
+    #
+    # Only the geometry stage is calculated, for 5 turns and for the most turns InterpolateTurns tries, so
+    #   this costs no dispersion solve. InterpolateTurns searches 5 <= N <= l/(1.05*d), over which L_s,
+    #   and l_w_eff grow with N. The checks are:
+    #
+    #   7   l < 10*d, as in InterpolateTurns
+    #   6   f_res <= c_0/(4*l) (where beta*l = pi/2 with beta >= k_0), and f_res <= ScreenKMax*c_0/l_w_eff,
+    #         so for all turns f_res is below the 5 turn bound. Below f (or SelfResMin: 11), reject.
+    #
+    #   4   LTarget above ScreenLRatio * L_s at the most turns: out of reach. Only checked when f is far
+    #         below the self-resonance for all turns (see ScreenFresGate): near it L_eff_s can take any
+    #         value, and InterpolateTurns can even converge on the pole of L_eff_s.
+    #
+    # There is no check for a minimum Q: the coils InterpolateTurns accepts can have L_eff_s (and so Q_eff)
+    #   well away from LTarget, so Q_eff has no bound from the geometry alone.
+    #
+    def PreScreen(self, LTarget, SelfResMin=0):
+        self.LTarget = LTarget
+
+        if self.l / (self.d*2) < 5:
+            self.error_code = 7
+            self.error_msg  = 'Length insufficient for at least 5 turns'
+            return True
+
+        #
+        # The self-resonance, from the length and the conductor length of 5 turns (D_eff >= D - d)
+        #
+        D = self.D * 1E-3
+        d = self.d * 1E-3
+        l = self.l * 1E-3
+
+        l_w_eff = sqrt((5 * pi * max(D - d, 0))**2 + l**2)
+        f_res   = min(c_0 / (4 * l), ScreenKMax * c_0 / l_w_eff) * 1E-6
+
+        if f_res < self.f:
+            self.error_code = 6
+            self.error_msg  = 'Resonant frequency less than frequency of interest.'
+            return True
+
+        if SelfResMin > 0 and f_res < SelfResMin:
+            self.error_code = 11
+            self.error_msg  = 'F_res lower than allowed minimum'
+            return True
+
+        #
+        # The inductance, from the geometry of the most turns
+        #
+        self.N = self.l / (self.d*1.05)
+        self.Calculate(stages=('geometry',))
+
+        if self._errors:
+            return False
+
+        si = self._si
+
+        if si['f'] <= ScreenFresGate * c_0 / si['l_w_eff'] and LTarget > ScreenLRatio * si['L_s'] * 1E6:
+            self.error_code = 4
+            self.error_msg  = 'Range of turns insufficient to get to specified inductance.'
+            return True
+
+        return False
+
+    ####################################################################################################################
+    #
+    # InterpolateNear - Search for the turns in widening brackets around a guess
+    #
+    # Inputs:   NGuess, NWidth  As for InterpolateTurns
+    #           NStart, NEnd    Full range of turns to search
+    #           DiffStart       IDiff(NStart)
+    #
+    # Output:   fzero() results, or None if none of the brackets holds the target inductance (or the full
+    #             range does not)
+    #
+    def InterpolateNear(self,NGuess,NWidth,NStart,NEnd,DiffStart):
+        NLow  = min(NStart,NEnd)
+        NHigh = max(NStart,NEnd)
+
+        #
+        # Only search near the guess if the full range holds the target inductance. Otherwise the
+        #   narrow brackets could find a solution where InterpolateTurns without a guess finds none.
+        #
+        DiffEnd = self.IDiff(NEnd)
+
+        if (DiffStart > 0) == (DiffEnd > 0):
+            return None
+
+        if NWidth is None:
+            NWidth = NGuess * 0.01
+
+        NWidth = max(NWidth, NGuess * 1E-4)
+
+        for Widen in InterpolateWiden:
+            N1 = max(NLow , NGuess - NWidth*Widen)
+            N2 = min(NHigh, NGuess + NWidth*Widen)
+
+            if N1 >= N2:
+                return None
+
+            Results = fzero(lambda Turns: self.IDiff(Turns), N1, N2)
+
+            if Results['error_code'] != 4:
+                return Results
+
+            if N1 == NLow and N2 == NHigh:
+                return None
+
+        return None
+
+    ####################################################################################################################
+    #
+    # InterpolateNewton - Search for the turns with safeguarded Newton steps
+    #
+    # Inputs:   NGuess          As for InterpolateTurns (None to start from the secant of the range)
+    #           NStart, NEnd    Full range of turns to search
+    #           DiffStart       IDiff(NStart)
+    #
+    # Output:   Results in the form of fzero(), or None to have fzero() search the full range instead:
+    #             when the range does not hold the target inductance (so the error checks stay those of
+    #             fzero), when the rf stage fails, or when there is no zero after NewtonMaxSteps steps.
+    #
+    # The steps use the unrounded L_eff_s. Each step shrinks the bracket of the zero, and a step that would
+    #   leave the bracket bisects it instead. The search stops when IDiff (the rounded L_eff_s) is zero.
+    #
+    def InterpolateNewton(self,NGuess,NStart,NEnd,DiffStart):
+        DiffEnd = self.IDiff(NEnd)
+
+        if DiffStart == 0 or DiffEnd == 0 or (DiffStart > 0) == (DiffEnd > 0):
+            return None
+
+        Bracket = [(NStart, DiffStart), (NEnd, DiffEnd)]
+
+        N = NGuess
+        if N is None or not min(NStart,NEnd) < N < max(NStart,NEnd):
+            N = NStart - DiffStart * (NEnd - NStart) / (DiffEnd - DiffStart)
+
+        for Step in range(NewtonMaxSteps):
+            if self.IDiff(N) == 0:
+                return {'zero':N, 'f_evaluations':Step + 2, 'error_code':1, 'error_msg':'A zero has been found.'}
+
+            try:
+                Diff  = self.LTarget - self._si['L_eff_s'] * 1E6
+                Slope = self.dL_eff_s_dN()
+            except (ArithmeticError, KeyError):
+                return None
+
+            #
+            # Keep the bracket ends on opposite sides of the target
+            #
+            Bracket[(Diff > 0) != (Bracket[0][1] > 0)] = (N, Diff)
+
+            NLow  = min(Bracket[0][0], Bracket[1][0])
+            NHigh = max(Bracket[0][0], Bracket[1][0])
+
+            NNext = N + Diff / Slope if Slope != 0 else NLow - 1
+            if not NLow < NNext < NHigh:
+                NNext = (NLow + NHigh) / 2.0
+
+            if abs(NNext - N) <= 1E-12 * N:
+                return {'zero':N, 'f_evaluations':Step + 2, 'error_code':0, 'error_msg':'The bracket has collapsed.'}
+
+            N = NNext
+
+        return None
+
+    ####################################################################################################################
+    #
+    # InvertTurns - Find the turns needed to attain a specified inductance from a table of L_eff_s over N
+    #
+    # Inputs:   Inductance to attain
+    #           Turns, L    (OPTIONAL) Table of L_eff_s (uH) over the turns, as made by TabulateTurns for this
+    #                         coil. Default is to tabulate it now.
+    #
+    # Output:   As for InterpolateTurns
+    #
+    # The inductance rises with the turns up to the self-resonance, where it jumps to minus infinity, and
+    #   rises again on the next branch. All the crossings of LTarget with rising inductance are found in the
+    #   table, and the first one (fewest turns) for which the coil is valid is used: the calculation has no
+    #   error and f_res >= f. The table holds at least 5 turns and N*d < l (see TabulateTurns). The turns
+    #   are then polished within the crossing with InterpolateNewton.
+    #
+    # Unlike InterpolateTurns, which searches one bracket, this never picks a bracket that spans an
+    #   oscillation of the inductance or a negative inductance.
+    #
+    # Error codes are as for InterpolateTurns: 7 if the length doesn't allow 5 turns, 4 if no crossing
+    #   was found, and otherwise the error of the last crossing tried (6 if f_res < f).
+    #
+    def InvertTurns(self,LTarget,Turns=None,L=None):
+        self.LTarget = LTarget
+
+        if Turns is None:
+            Turns, L = TabulateTurns(self.D,self.d,self.f,self.plating,[self.l])
+            Turns, L = Turns[0], L[0]
+
+        if Turns.size == 0:
+            self.error_code = 7
+            self.error_msg  = 'Length insufficient for at least 5 turns'
+            return
+
+        Diff = L - LTarget
+        Crossings = np.flatnonzero((Diff[:-1] < 0) & (Diff[1:] >= 0))
+
+        if Crossings.size == 0:
+            self.error_code = 4
+            self.error_msg  = 'Range of turns insufficient to get to specified inductance.'
+            return
+
+        for i in Crossings:
+            N1, N2 = float(Turns[i]), float(Turns[i+1])
+
+            #
+            # IDiff rounds L_eff_s, so near the target its sign can differ from the table's: widen by a step
+            #
+            DiffLow = self.IDiff(N1)
+            if DiffLow < 0 and i > 0:
+                N1 = float(Turns[i-1])
+                DiffLow = self.IDiff(N1)
+
+            if self.IDiff(N2) > 0 and i+2 < Turns.size:
+                N2 = float(Turns[i+2])
+
+            Results = self.InterpolateNewton(None,N1,N2,DiffLow)
+            if Results is None:
+                Results = fzero(lambda Turns: self.IDiff(Turns), N1, N2)
+
+            if Results['error_code'] not in (0, 1):
+                self.error_code = 4
+                self.error_msg  = 'Range of turns insufficient to get to specified inductance.'
+                continue
+
+            if self.N != Results['zero']:
+                self.IDiff(Results['zero'])
+
+            if self.error_code != 0:
+                continue
+
+            if self.f_res < self.f:
+                self.error_code = 6
+                self.error_msg  = 'Resonant frequency less than frequency of interest.'
+                continue
+
+            return
+
     ####################################################################################################################
     #
     # PrintCVSHeader - Print CVS output header
@@ -691,31 +2041,7 @@ class Coil():
     # Output:   The CSV header information is printed
     #
     def PrintCSVHeader(self,Units="mm",ExtraLine1="",ExtraLine2=""):
-
-        LenHdr = "wLen(mm)"
-
-        if Units == "m":
-            LenHdr = "wLen(m)"
-
-        if Units == "in":
-            LenHdr = "wLen(in)"
-
-        if Units == "ft":
-            LenHdr = "wLen(ft)"
-
-        print(time.strftime("# CoilScan %Y-%m-%d %H:%M", time.localtime(time.time())))
-        print("#")
-        print("# LTarget = %g, " % self.LTarget + "d = %g, " % self.d + "p = %d, " % self.p + "f = %g" % self.f)
-        print("#")
-
-        if ExtraLine1 != "":
-            print(ExtraLine1)
-
-        if ExtraLine2 != "":
-            print(ExtraLine2)
-
-        if ExtraLine1 != "" or ExtraLine2 != "":
-            print("#")
+        print(CSVHeader(self.LTarget,self.d,self.p,self.f,ExtraLine1,ExtraLine2), end="")
 
     ####################################################################################################################
     #
@@ -729,18 +2055,7 @@ class Coil():
     # Output:   The single-line colum header is printed
     #
     def PrintCSVColumnHeader(self,Units="mm"):
-        LenHdr = "wLen(mm)"
-
-        if Units == "m":
-            LenHdr = "wLen(m)"
-
-        if Units == "in":
-            LenHdr = "wLen(in)"
-
-        if Units == "ft":
-            LenHdr = "wLen(ft)"
-
-        print("# D(mm),   l(mm), Q(plot),      Q,       N,    L(uH), " + LenHdr + ", Res(MHz), pitch(mm), Err, Cmd")
+        print(CSVColumnHeader(Units), end="")
 
     ####################################################################################################################
     #
@@ -754,42 +2069,625 @@ class Coil():
     # Output:   The coil is printed as 1 CVS line
     #
     def PrintCSV(self,Units="mm"):
+        print(CSVLine(self,Units), end="")
 
-        Length = self.l_w_phys
 
-        if Units == "m":
-            Length /= 1000
+########################################################################################################################
+#
+# CSVHeader - Text of the CSV output header
+#
+# Inputs:   LTarget, d, p, f  Values for the header line
+#           ExtraLine1        of header info to be printed
+#           ExtraLine2        of header info to be printed
+#
+# Output:   The header lines, each ending in a newline
+#
+def CSVHeader(LTarget, d, p, f, ExtraLine1="", ExtraLine2=""):
 
-        if Units == "in":
-            Length /= 25.4
+    Text  = time.strftime("# CoilScan %Y-%m-%d %H:%M\n", time.localtime(time.time()))
+    Text += "#\n"
+    Text += "# LTarget = %g, " % LTarget + "d = %g, " % d + "p = %d, " % p + "f = %g\n" % f
+    Text += "#\n"
 
-        if Units == "ft":
-            Length = (Length/25.4)/12
+    if ExtraLine1 != "":
+        Text += ExtraLine1 + "\n"
 
-        SummaryCMD  = "CoilCalc"
-        SummaryCMD += " --D=%.3f" % round(self.D,2)
-        SummaryCMD += " --l=%.3f" % round(self.l,2)
-        SummaryCMD += " --N=%.3f" % round(self.N,2)
-        SummaryCMD += " --d=%.3f" % round(self.d,2)
-        SummaryCMD += " --f=%.3f" % round(self.f,3)
+    if ExtraLine2 != "":
+        Text += ExtraLine2 + "\n"
 
-        #
-        # Gnuplot will silently ignore data points containing "NaN", so for points that
-        #   don't make sense we print NaN for Q. Actual Q is also the next column.
-        #
-        PlotQ = self.Q_eff
+    if ExtraLine1 != "" or ExtraLine2 != "":
+        Text += "#\n"
 
-        if self.error_code != 0:
-            PlotQ = float('nan')
-
-        print('%7.2f, ' % round(self.D       , 2) +
-              '%7.2f, ' % round(self.l       , 2) +
-              '%7.0f, ' % round(PlotQ        , 2) +
-              '%7.0f  ' % round(self.Q_eff   , 2) + 
-              '%6.2f, ' % round(self.N       , 2) +
-              '%8.2f, ' % round(self.L_eff_s , 2) + 
-              '%8.2f, ' % round(Length       , 2) +
-              '%8.2f, ' % round(self.f_res   , 2) + 
-              '%9.2f, ' % round(self.p       , 2) + 
-              '%3d, '   % self.error_code         +
-              '"' + SummaryCMD + '"')
+    return Text
+
+
+########################################################################################################################
+#
+# CSVColumnHeader - Text of the column headers for coil CSV lines
+#
+# Inputs:   Units, "mm" (default), "m", "in" or "ft" for the conductor length
+#
+# Output:   The single-line column header, ending in a newline
+#
+def CSVColumnHeader(Units="mm"):
+    LenHdr = "wLen(mm)"
+
+    if Units == "m":
+        LenHdr = "wLen(m)"
+
+    if Units == "in":
+        LenHdr = "wLen(in)"
+
+    if Units == "ft":
+        LenHdr = "wLen(ft)"
+
+    return "# D(mm),   l(mm), Q(plot),      Q,       N,    L(uH), " + LenHdr + ", Res(MHz), pitch(mm), Err, Cmd\n"
+
+
+########################################################################################################################
+#
+# CSVLine - Text of the CSV line of a coil
+#
+# Inputs:   Item,   a Coil, or anything with the same D, l, N, d, f, Q_eff, L_eff_s, l_w_phys, f_res, p
+#                     and error_code (such as the records of CoilScan)
+#           Units,  "mm" (default), "m", "in" or "ft" for the conductor length
+#
+# Output:   The CSV line, ending in a newline
+#
+CSVFormat = '%7.2f, %7.2f, %7.0f, %7.0f  %6.2f, %8.2f, %8.2f, %8.2f, %9.2f, %3d, "CoilCalc --D=%.3f --l=%.3f --N=%.3f --d=%.3f --f=%.3f"\n'
+
+def CSVLine(Item, Units="mm"):
+
+    Length = Item.l_w_phys
+
+    if Units == "m":
+        Length /= 1000
+
+    if Units == "in":
+        Length /= 25.4
+
+    if Units == "ft":
+        Length = (Length/25.4)/12
+
+    #
+    # Gnuplot will silently ignore data points containing "NaN", so for points that
+    #   don't make sense we print NaN for Q. Actual Q is also the next column.
+    #
+    PlotQ = Item.Q_eff
+
+    if Item.error_code != 0:
+        PlotQ = float('nan')
+
+    D = round(Item.D, 2)
+    l = round(Item.l, 2)
+    N = round(Item.N, 2)
+
+    return CSVFormat % (D, l, round(PlotQ, 2), round(Item.Q_eff, 2), N, round(Item.L_eff_s, 2), round(Length, 2),
+                        round(Item.f_res, 2), round(Item.p, 2), Item.error_code, D, l, N, round(Item.d, 2), round(Item.f, 3))
+
+
+########################################################################################################################
+#
+# InterpolateLengths - Interpolate the turns of a series of coils that differ only in length
+#
+# Inputs:   D, d, f, plating  As for Coil()
+#           Lengths,          Coil lengths to scan (mm)
+#           LTarget,          Inductance to attain (uH)
+#           Threads,          (OPTIONAL) Number of worker threads (default: 1, calculate in the calling thread)
+#           Continuation,     (OPTIONAL) Start each interpolation from the turns of the previous length
+#           Newton,           (OPTIONAL) Interpolate the turns with Newton steps (see InterpolateTurns)
+#
+# Output:   List of Coil objects, one per length and in the same order, as set by InterpolateTurns()
+#
+# With Continuation, each coil's turns are extrapolated from the previous two successful coils and
+#   passed to InterpolateTurns as a guess, which takes far fewer inductance calculations on a smooth
+#   scan. The turns found agree with the ones found without a guess to within the solver tolerance.
+#   The lengths are split into one run per thread, each starting without a guess.
+#
+# Each coil is a separate object and the calculations keep no state outside of it, so the coils can be
+#   calculated in parallel threads. This pays off on free-threaded builds of python, the standard
+#   build only switches threads between calculations. The results are the same for any number of threads.
+#
+# A single Coil object should not be used from more than one thread at a time.
+#
+def InterpolateLengths(D, d, f, plating, Lengths, LTarget, Threads=1, Continuation=False, Newton=False):
+
+    def Interpolate(l):
+        TestCoil = Coil(D,3,l,d,f,plating)
+        TestCoil.InterpolateTurns(LTarget,Newton=Newton)
+        return TestCoil
+
+    def InterpolateRun(Run):
+        Coils = []
+        Turns = []      # Turns of the previous successful coils
+
+        for l in Run:
+            NGuess = NWidth = None
+
+            if len(Turns) >= 2:
+                NGuess = 2*Turns[-1] - Turns[-2]
+                NWidth = abs(Turns[-1] - Turns[-2]) * 0.1
+            elif len(Turns) == 1:
+                NGuess = Turns[-1]
+
+            TestCoil = Coil(D,3,l,d,f,plating)
+            TestCoil.InterpolateTurns(LTarget,NGuess,NWidth,Newton)
+
+            if TestCoil.error_code == 0:
+                Turns.append(TestCoil.N)
+            else:
+                Turns = []
+
+            Coils.append(TestCoil)
+
+        return Coils
+
+    Lengths = list(Lengths)
+
+    if not Lengths:
+        return []
+
+    if Continuation:
+        Size = -(-len(Lengths) // max(Threads, 1))
+        Runs = [Lengths[i:i+Size] for i in range(0, len(Lengths), Size)]
+
+        if Threads <= 1:
+            return [TestCoil for Run in Runs for TestCoil in InterpolateRun(Run)]
+
+        with ThreadPoolExecutor(max_workers=Threads) as Executor:
+            return [TestCoil for Coils in Executor.map(InterpolateRun, Runs) for TestCoil in Coils]
+
+    if Threads <= 1:
+        return [Interpolate(l) for l in Lengths]
+
+    with ThreadPoolExecutor(max_workers=Threads) as Executor:
+        return list(Executor.map(Interpolate, Lengths))
+
+
+########################################################################################################################
+#
+# TabulateTurns - Tabulate L_eff_s over the turns, for a series of coils that differ only in length
+#
+# Inputs:   D, d, f, plating  As for Coil()
+#           Lengths,          Coil lengths (mm)
+#           Points,           (OPTIONAL) Number of turns per length (default: InvertPoints)
+#
+# Output:   Turns, L:   one array of turns and one of L_eff_s (uH) per length. The turns run geometrically
+#                         from 5 to l/(1.05*d), the range searched by InterpolateTurns, and are empty if
+#                         that range is empty. L is NaN where the rf stage fails.
+#
+# All the coils are calculated in one CoilBatch, without the self-resonant frequency. Requires numpy.
+#
+def TabulateTurns(D, d, f, plating, Lengths, Points=None):
+    if np is None:
+        raise ImportError('TabulateTurns requires numpy')
+
+    if Points is None:
+        Points = InvertPoints
+
+    Lengths = np.asarray(Lengths, dtype=float)
+    NEnd    = Lengths / (float(d)*1.05)
+    Grid    = 5.0 * (np.maximum(NEnd, 5.0)[:,None] / 5.0) ** np.linspace(0.0, 1.0, Points)[None,:]
+
+    Batch = CoilBatch(D, Grid, Lengths[:,None], d, f, plating, f_res=False)
+    L     = np.where(np.isin(Batch.error_code, (0, 2)), Batch.L_eff_s, np.nan)
+
+    Turns = [Grid[i] if NEnd[i] > 5.0 else Grid[i][:0] for i in range(len(Lengths))]
+    L     = [L[i]    if NEnd[i] > 5.0 else L[i][:0]    for i in range(len(Lengths))]
+    return Turns, L
+
+
+########################################################################################################################
+#
+# InvertLengths - Find the turns of a series of coils that differ only in length, from tables of L_eff_s
+#
+# Inputs:   D, d, f, plating  As for Coil()
+#           Lengths,          Coil lengths to scan (mm)
+#           LTarget,          Inductance to attain (uH)
+#           Points,           (OPTIONAL) Number of turns tabulated per length (default: InvertPoints)
+#
+# Output:   List of Coil objects, one per length and in the same order, as set by InvertTurns()
+#
+# The tables of all lengths are calculated at once (see TabulateTurns). Requires numpy.
+#
+def InvertLengths(D, d, f, plating, Lengths, LTarget, Points=None):
+    return InvertTargets(D, d, f, plating, Lengths, [LTarget], Points)[0]
+
+
+########################################################################################################################
+#
+# InvertTargets - As InvertLengths, for several inductances at once
+#
+# Inputs:   D, d, f, plating  As for Coil()
+#           Lengths,          Coil lengths to scan (mm)
+#           LTargets,         Inductances to attain (uH)
+#           Points,           (OPTIONAL) Number of turns tabulated per length (default: InvertPoints)
+#
+# Output:   List with one list of Coil objects per inductance, as returned by InvertLengths
+#
+# The tables are calculated once and shared by all inductances, so only the polishing of the turns is
+#   done per inductance. Requires numpy.
+#
+def InvertTargets(D, d, f, plating, Lengths, LTargets, Points=None):
+    Lengths = list(Lengths)
+    Turns, L = TabulateTurns(D, d, f, plating, Lengths, Points)
+
+    Scans = []
+    for LTarget in LTargets:
+        Coils = []
+        for i, l in enumerate(Lengths):
+            TestCoil = Coil(D,3,l,d,f,plating)
+            TestCoil.InvertTurns(LTarget,Turns[i],L[i])
+            Coils.append(TestCoil)
+
+        Scans.append(Coils)
+
+    return Scans
+
+
+########################################################################################################################
+#
+# OptimizeCoil - Find the coil with the best Q (or another objective) for a target inductance
+#
+# Inputs:   LTarget,          Inductance to attain (uH)
+#           DBounds, lBounds  (min, max) of the coil diameter and length (mm)
+#           d, f, plating     As for Coil()
+#           Objective,        (OPTIONAL) "Q" to maximize Q_eff (default), "wire" to minimize l_w_phys, or a
+#                               function of a CoilBatch that returns the value to minimize
+#           QMin,             (OPTIONAL) Minimum Q_eff of the coil, 0 for none
+#           SelfResMin,       (OPTIONAL) Minimum f_res of the coil (MHz), 0 for none
+#           Grid,             (OPTIONAL) Number of diameters and of lengths in the seeding pass (default: 8)
+#           Starts,           (OPTIONAL) Number of best seeds to optimize from (default: 2)
+#
+# Output:   The best Coil found (as set by InterpolateTurns), or None if no coil within the bounds is valid,
+#             and the results of neldermead() for it, with 'f_evaluations' counting all the coils for
+#             which the turns were interpolated and 'seeds' the number of coils in the seeding pass.
+#
+# A coil is valid if InterpolateTurns finds it without error (which includes f_res >= f), and it passes
+#   the same filters as CoilScanDL's UserFilter: QMin and SelfResMin.
+#
+# First, the turns of a coarse Grid x Grid scan are estimated from tables of L_eff_s over N (see
+#   TabulateTurns) and the coils are calculated at once, all vectorized. The best valid ones are then
+#   optimized over the continuous D and l with neldermead(), each step interpolating the turns. The
+#   objective is calculated with CoilBatch, so it is not rounded. Requires numpy.
+#
+def OptimizeCoil(LTarget, DBounds, lBounds, d, f, plating=0, Objective="Q", QMin=0, SelfResMin=0, Grid=8, Starts=2):
+
+    if Objective == "Q":
+        Objective = lambda Batch: -Batch.Q_eff
+    elif Objective == "wire":
+        Objective = lambda Batch: Batch.l_w_phys
+
+    #
+    # Seeding pass: the turns for LTarget, interpolated linearly in the tables, within the range of InterpolateTurns
+    #
+    Diameters = np.linspace(DBounds[0], DBounds[1], Grid)
+    Lengths   = np.linspace(lBounds[0], lBounds[1], Grid)
+    Seeds     = []
+
+    for D in Diameters:
+        Turns, L = TabulateTurns(D, d, f, plating, Lengths)
+
+        for i, l in enumerate(Lengths):
+            Rising    = (L[i][:-1] < LTarget) & (L[i][1:] >= LTarget) & (Turns[i][:-1] >= l / (2*d))
+            Crossings = np.flatnonzero(Rising)
+            if Crossings.size:
+                j = Crossings[0]
+                N = Turns[i][j] + (Turns[i][j+1] - Turns[i][j]) * (LTarget - L[i][j]) / (L[i][j+1] - L[i][j])
+                Seeds.append((D, N, l))
+
+    if not Seeds:
+        return None, {'x':None, 'value':float('inf'), 'f_evaluations':0, 'seeds':0, 'error_code':1,
+                      'error_msg':'No coil within the bounds attains the target inductance.'}
+
+    D, N, l = np.array(Seeds).T
+    Batch   = CoilBatch(D, N, l, d, f, plating)
+    Valid   = (Batch.error_code == 0) & (Batch.f_res >= f)
+    if QMin > 0:
+        Valid &= Batch.Q_eff >= QMin
+    if SelfResMin > 0:
+        Valid &= Batch.f_res >= SelfResMin
+
+    Values = np.where(Valid, Objective(Batch), np.inf)
+    Order  = [i for i in np.argsort(Values, kind='stable')[:Starts] if Valid[i]]
+
+    #
+    # Optimization from the best seeds
+    #
+    Best = {'coil': None, 'value': float('inf')}
+
+    def Evaluate(x):
+        TestCoil = Coil(x[0],3,x[1],d,f,plating)
+        TestCoil.InterpolateTurns(LTarget)
+
+        if TestCoil.error_code != 0:
+            return float('inf')
+        if QMin > 0 and TestCoil.Q_eff < QMin:
+            return float('inf')
+        if SelfResMin > 0 and TestCoil.f_res < SelfResMin:
+            return float('inf')
+
+        Value = float(Objective(CoilBatch(x[0], TestCoil.N, x[1], d, f, plating, f_res=False)))
+        if Value < Best['value']:
+            Best.update(coil=TestCoil, value=Value)
+        return Value
+
+    Step    = [(DBounds[1] - DBounds[0]) / Grid, (lBounds[1] - lBounds[0]) / Grid]
+    Results = {'x':None, 'value':float('inf'), 'f_evaluations':0, 'error_code':1,
+               'error_msg':'No coil within the bounds attains the target inductance.'}
+    Count   = 0
+
+    for i in Order:
+        Start = neldermead(Evaluate, [float(D[i]), float(l[i])], [DBounds[0], lBounds[0]], [DBounds[1], lBounds[1]], Step)
+        Count += Start['f_evaluations']
+        if Start['value'] < Results['value']:
+            Results = Start
+
+    Results.update(f_evaluations=Count, seeds=len(Seeds))
+    return Best['coil'], Results
+
+
+########################################################################################################################
+#
+# CoilBatch - Calculate the parameters of many coils at once
+#
+# __init__: D,            Diameter of coil          (scalar or array, mm)
+#           N,            Number of turns           (scalar or array)
+#           l,            Length of coil            (scalar or array, mm)
+#           d,            Diameter of wire          (scalar or array, mm)
+#           f,            Frequency of interest     (scalar or array, MHz)
+#           plating,      Index into plating table  (scalar or array)
+#           f_res,        (OPTIONAL) False to skip the self-resonant frequency, by far the slowest part of
+#                           the calculation (f_res is then 0, and error code 3 only marks geometry errors)
+#
+# The inputs are broadcast against each other (numpy rules), so a D×l plane can be calculated with
+#   D[:,None] and l[None,:]. Each result is an array of that shape, available both as an attribute
+#   (Batch.Q_eff, Batch.error_code, ...) and as a field of the structured array Batch.results.
+#
+# Results are in the same units as the matching Coil members, but are not rounded. The error codes
+#   are the same as for Coil.Calculate(): elements that fail a stage are masked out of the later
+#   stages instead of raising, and the failed results are set to zero.
+#
+# Requires numpy.
+#
+class CoilBatch():
+
+    FIELDS = ('p', 'Phi', 'D_eff', 'k_L', 'k_s', 'k_m', 'l_w_phys', 'l_w_eff', 'delta_i', 'R_eff_s', 'L_s', 'psi',
+              'beta', 'Z_c', 'L_eff_s', 'X_eff_s', 'Q_eff', 'R_s', 'C_p', 'f_res', 'error_code')
+
+    def __init__(self, D,N,l,d,f,plating=0,f_res=True):
+        if np is None:
+            raise ImportError('CoilBatch requires numpy')
+
+        self._with_f_res = f_res
+
+        self.D, self.N, self.l, self.d, self.f, self.plating = np.broadcast_arrays(
+            np.asarray(D, dtype=float), np.asarray(N, dtype=float), np.asarray(l, dtype=float),
+            np.asarray(d, dtype=float), np.asarray(f, dtype=float), np.asarray(plating, dtype=int))
+
+        self.Calculate()
+
+    def __len__(self):
+        return self.error_code.size
+
+    ####################################################################################################################
+    #
+    # results - All results as a single numpy structured array, one record per coil
+    #
+    @property
+    def results(self):
+        dtype = [(Name, int if Name == 'error_code' else float) for Name in self.FIELDS]
+        Results = np.empty(self.error_code.shape, dtype=dtype)
+        for Name in self.FIELDS:
+            Results[Name] = getattr(self, Name)
+        return Results
+
+    ####################################################################################################################
+    #
+    # lookup_Phi - Vectorized version of Coil.lookup_Phi()
+    #
+    # Output:   Phi, and a mask of the elements that could not be interpolated
+    #
+    @staticmethod
+    def lookup_Phi(l, D, p, d):
+        l_D_hdr = np.array(l_D_header)
+        p_d_hdr = np.array(p_d_header)
+        table   = np.array(medhurst)
+
+        # Same as HeaderIndices: index2 is the first header entry above the value
+        l_D_2 = np.minimum(np.searchsorted(l_D_hdr, l/D, side='right'), len(l_D_hdr)-1)
+        l_D_1 = np.maximum(l_D_2 - 1, 0)
+        p_d_2 = np.minimum(np.searchsorted(p_d_hdr, p/d, side='right'), len(p_d_hdr)-1)
+        p_d_1 = np.maximum(p_d_2 - 1, 0)
+
+        # Values below the first header entry have index1 == index2 (Coil raises ZeroDivisionError)
+        Failed = (l_D_1 == l_D_2) | (p_d_1 == p_d_2)
+
+        l_D_step = np.where(Failed, 1.0, l_D_hdr[l_D_2] - l_D_hdr[l_D_1])
+        p_d_step = np.where(Failed, 1.0, p_d_hdr[p_d_2] - p_d_hdr[p_d_1])
+
+        Phi_p_d_index1  = table[l_D_2, p_d_1] - table[l_D_1, p_d_1]
+        Phi_p_d_index1 /= l_D_step
+        Phi_p_d_index1 *= l/D - l_D_hdr[l_D_1]
+        Phi_p_d_index1 += table[l_D_1, p_d_1]
+
+        Phi_p_d_index2  = table[l_D_2, p_d_2] - table[l_D_1, p_d_2]
+        Phi_p_d_index2 /= l_D_step
+        Phi_p_d_index2 *= l/D - l_D_hdr[l_D_1]
+        Phi_p_d_index2 += table[l_D_1, p_d_2]
+
+        Phi  = Phi_p_d_index2 - Phi_p_d_index1
+        Phi /= p_d_step
+        Phi *= p/d - p_d_hdr[p_d_1]
+        Phi += Phi_p_d_index1
+        return Phi, Failed
+
+    ####################################################################################################################
+    #
+    # Calculate - Calculate all coil parameters, same formulas as Coil.Calculate()
+    #
+    def Calculate(self):
+        Shape = self.D.shape
+        error_code = np.zeros(Shape, dtype=int)
+
+        with np.errstate(all='ignore'):
+            Valid = (self.plating >= 0) & (self.plating < len(plating))
+            plating_nr = np.where(Valid, self.plating, 0)
+            rho    = np.array([Item.rho  for Item in plating])[plating_nr] * 1E-9
+            mu_r_w = np.array([Item.mu_r for Item in plating])[plating_nr]
+
+            N = self.N
+            l = self.l * 1E-3
+            p = l / N
+
+            D = self.D * 1E-3
+            d = self.d * 1E-3
+            Phi, Failed = self.lookup_Phi(l, D, p, d)
+            Valid &= ~Failed
+
+            D_eff = D - d * (1.0 - 1.0/np.sqrt(Phi))
+
+            # Correction factors
+
+            Short = l <= D_eff    # The short coil expression gives a value that agrees better with the AGM result.
+            x = np.where(Short, l/D_eff, D_eff/l)
+            k_L  = 1.0 + 0.383901 * x**2 + 0.017108 * x**4
+            k_L /= 1.0 + 0.258952 * x**2
+            k_L  = np.where(Short,
+                            (k_L * (np.log(4.0 * D_eff/l) - 0.5) + (0.093842 * x**2 + 0.002029 * x**4 - 0.000801 * x**6)) * (2.0/pi * l/D_eff),
+                            k_L - 4.0/3.0/pi * D_eff/l)
+
+            k_s = 5.0/4.0 - np.log(2 * p/d)
+
+            c_9 = -log(2.0*pi) +3.0/2.0 +0.33084236 +1.0/120.0 -1.0/504.0 +0.0011925
+            k_m  = log(2.0*pi) -3.0/2.0 -np.log(N)/6.0/N -0.33084236/N -1.0/(120.0*N**3) +1.0/(504.0*N**5) -0.0011925/N**7 + c_9/N**9
+
+            # Effective series AC resistance
+
+            l_w_phys = np.sqrt((N * pi * D)**2 + l**2)
+            l_w_eff  = np.sqrt((N * pi * D_eff)**2 + l**2)
+
+            f = self.f * 1E6
+            delta_i = np.sqrt(rho /pi /f /mu_0 /mu_r_w)
+
+            R_eff_s  = rho * l_w_eff
+            R_eff_s /= pi * (d * delta_i - delta_i**2)
+            R_eff_s *= Phi
+            R_eff_s  = np.where(N > 1, R_eff_s * (N-1.0) / N, R_eff_s)
+
+            # Corrected current-sheet geometrical formula
+
+            mu_r_core = 1
+            L_s  = pi * (D_eff * N)**2 /4.0 /l * k_L
+            L_s -= D_eff * N * (k_s + k_m) / 2.0
+            L_s *= mu_r_core * mu_0
+
+            psi = np.arctan(p /pi /D_eff)
+
+            for Value in (p, Phi, D_eff, k_L, k_s, k_m, l_w_phys, l_w_eff, delta_i, R_eff_s, L_s, psi):
+                Valid &= np.isfinite(Value)
+            Valid &= (N > 0) & (D_eff > 0) & (delta_i > 0)
+
+
+            # Characteristic impedance of the sheath helix waveguide mode
+
+            omega = 2.0 * pi * f
+            k_0 = omega / c_0
+            a = D_eff / 2.0
+
+            #
+            # The scalar solvers are used with the dispersion table (see use_dispersion_table), which
+            #   is not vectorized. They are cheap with it.
+            #
+            Table = dispersion_table is not None
+            Lanes = np.flatnonzero(Valid)
+
+            tau = np.full(Shape, np.nan)
+            if Table:
+                for i in map(tuple, np.argwhere(Valid)):
+                    try:
+                        tau[i] = solve_dispersion(float(k_0[i]), float(psi[i]), float(a[i]))
+                    except (ArithmeticError, ValueError):
+                        pass
+            elif Lanes.size:
+                tau.flat[Lanes] = solve_dispersion_many(k_0.flat[Lanes], psi.flat[Lanes], a.flat[Lanes])
+
+            beta = np.sqrt(k_0**2 + tau**2)
+            Z_c  = 60.0 * beta / k_0 * I0K0v(tau*a)
+
+            # Effective equivalent circuit
+
+            # Corrected sheath helix waveguide formula
+            L_eff_s  = Z_c / omega * np.tan(beta * l) * k_L
+            L_eff_s -= mu_0 * D_eff * N * (k_s + k_m) / 2.0
+
+            X_eff_s = omega * L_eff_s
+            Q_eff   = X_eff_s / R_eff_s
+
+            RF = Valid & np.isfinite(Q_eff)
+            error_code[Valid & ~RF] = 1
+
+
+            # Lumped equivalent circuit
+
+            R_p = (Q_eff**2 + 1) * R_eff_s
+            X_L_s = omega * L_s
+
+            # https://en.wikipedia.org/wiki/Quadratic_equation#Reduced_quadratic_equation
+            P = R_p / (2.0 * X_L_s)
+            Q_L = P + np.sqrt(P**2 - 1)
+
+            R_s = X_L_s / Q_L
+
+            X_eff_p = (Q_eff**2 + 1.0) / Q_eff**2 * X_eff_s
+            X_L_p = (Q_L**2 + 1.0) / Q_L**2 * X_L_s
+
+            X_C_p = X_eff_p * X_L_p / (X_L_p - X_eff_p)
+            C_p = -1.0 /omega /X_C_p
+
+            Lumped = RF & (Q_eff != 0) & (X_L_p != X_eff_p) & np.isfinite(R_s) & np.isfinite(C_p)
+            error_code[RF & ~Lumped] = 2
+
+
+            # Self-resonant frequency
+
+            f_res = np.zeros(Shape)
+            if not self._with_f_res:
+                pass
+            elif Table:
+                for i in map(tuple, np.argwhere(Valid)):
+                    try:
+                        f_res[i] = solve_f_res(float(l[i]), float(l_w_eff[i]), float(psi[i]), float(a[i]))
+                    except (ArithmeticError, ValueError):
+                        error_code[i] = 3
+            elif Lanes.size:
+                f_res.flat[Lanes], Failed = solve_f_res_many(l.flat[Lanes], l_w_eff.flat[Lanes], psi.flat[Lanes], a.flat[Lanes])
+                Failed |= ~np.isfinite(f_res.flat[Lanes])
+                error_code.flat[Lanes[Failed]] = 3
+
+            error_code[~Valid] = 3
+
+        Zero = lambda Value, Mask: np.where(Mask, Value, 0.0)
+
+        self.p        = Zero(p * 1E3       , Valid)
+        self.Phi      = Zero(Phi           , Valid)
+        self.D_eff    = Zero(D_eff * 1E3   , Valid)
+        self.k_L      = Zero(k_L           , Valid)
+        self.k_s      = Zero(k_s           , Valid)
+        self.k_m      = Zero(k_m           , Valid)
+        self.l_w_phys = Zero(l_w_phys * 1E3, Valid)
+        self.l_w_eff  = Zero(l_w_eff * 1E3 , Valid)
+        self.delta_i  = Zero(delta_i * 1E6 , Valid)
+        self.R_eff_s  = Zero(R_eff_s       , Valid)
+        self.L_s      = Zero(L_s * 1E6     , Valid)
+        self.psi      = Zero(psi / pi * 180, Valid)
+        self.beta     = Zero(beta          , RF)
+        self.Z_c      = Zero(Z_c           , RF)
+        self.L_eff_s  = Zero(L_eff_s * 1E6 , RF)
+        self.X_eff_s  = Zero(X_eff_s       , RF)
+        self.Q_eff    = Zero(Q_eff         , RF)
+        self.R_s      = Zero(R_s           , Lumped)
+        self.C_p      = Zero(C_p * 1E12    , Lumped)
+        self.f_res    = Zero(f_res * 1E-6  , error_code != 3)
+
+        self.error_code = error_code
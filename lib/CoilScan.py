@@ -0,0 +1,1100 @@
+########################################################################################################################
+########################################################################################################################
+##
+##      Copyright (C) 2020 Peter Walsh, Milford, NH 03055
+##      All Rights Reserved under the MIT license as outlined below.
+##
+##  FILE
+##      CoilScan.py
+##
+##  DESCRIPTION
+##      Scans of coils for a target inductance, as generators of compact result records, and sinks to
+##        write the records to.
+##
+##      scan_length() and scan_grid() calculate the coils of a scan (as CoilScanL and CoilScanDL do) and
+##        yield one CoilRecord per coil, in scan order. A record holds the values the output needs, so
+##        the coils themselves can be dropped as soon as they are calculated.
+##
+##      A sink takes the records of one or more scans: header() starts a scan, write() adds a record,
+##        comment() adds a line of text and close() finishes the output. CSVSink writes the CSV format
+##        of Coil.PrintCSV, buffered. NPYSink, NPZSink and ParquetSink write the records as typed columns
+##        (see RecordTypes), without the CoilCalc command, which command() makes from a record when needed.
+##        read_scan() reads them back, and gnuplot_export() writes them as binary data for gnuplot.
+##
+##      A ResultStore keeps the coils of scan_grid() in a database as they are calculated, so that an
+##        interrupted scan can be resumed without calculating them again.
+##
+##      read_coils() and calc_coils() calculate a batch of coils given by their inputs (as CoilCalc --batch
+##        does), such as the coils of a scan's CSV output. calc_batch() calculates them with one CoilBatch.
+##
+##          Sink = CSVSink(Units="m")
+##          Sink.header(LTarget, d, p, f)
+##          for Record in scan_grid(Diameters, Lengths, d, f, 0, LTarget):
+##              Sink.write(Record)
+##          Sink.close()
+##
+########################################################################################################################
+########################################################################################################################
+##
+##  MIT LICENSE
+##
+##  Permission is hereby granted, free of charge, to any person obtaining a copy of
+##    this software and associated documentation files (the "Software"), to deal in
+##    the Software without restriction, including without limitation the rights to
+##    use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies
+##    of the Software, and to permit persons to whom the Software is furnished to do
+##    so, subject to the following conditions:
+##
+##  The above copyright notice and this permission notice shall be included in
+##    all copies or substantial portions of the Software.
+##
+##  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+##    INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+##    PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+##    HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+##    OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+##    SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+##
+########################################################################################################################
+########################################################################################################################
+
+import hashlib
+import json
+import os
+import signal
+import sqlite3
+import sys
+
+from collections        import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from functools          import partial
+from itertools          import islice
+
+from Coil import Coil, CoilBatch, InterpolateLengths, InvertTargets, CSVHeader, CSVColumnHeader, CSVLine, use_dispersion_table, VERSION, \
+                 disk_cache, use_disk_cache
+
+try:
+    import numpy as np
+    from numpy.lib.format import open_memmap, write_array_header_1_0, dtype_to_descr
+except ImportError:
+    np = None    # The binary sinks and read_scan need numpy; the scans and CSVSink do not
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None    # Parquet files need pyarrow
+
+
+########################################################################################################################
+#
+# CoilRecord - The results of one coil of a scan
+#
+# The fields have the names and units of the Coil members, so a record can be used in place of a Coil
+#   for CSVLine().
+#
+CoilRecord = namedtuple('CoilRecord', ('LTarget', 'D', 'l', 'N', 'd', 'f', 'Q_eff', 'L_eff_s', 'l_w_phys',
+                                       'f_res', 'p', 'error_code'))
+
+def record(TestCoil):
+    return CoilRecord(TestCoil.LTarget, TestCoil.D, TestCoil.l, TestCoil.N, TestCoil.d, TestCoil.f, TestCoil.Q_eff,
+                      TestCoil.L_eff_s, TestCoil.l_w_phys, TestCoil.f_res, TestCoil.p, TestCoil.error_code)
+
+#
+# Column types of the binary formats, one column per field of CoilRecord
+#
+RecordTypes = [(Name, 'i4' if Name == 'error_code' else 'f8') for Name in CoilRecord._fields]
+
+
+########################################################################################################################
+#
+# command - The CoilCalc command line for a record (as printed in the CSV output)
+#
+def command(Record):
+    return "CoilCalc --D=%.3f --l=%.3f --N=%.3f --d=%.3f --f=%.3f" % (round(Record.D, 2), round(Record.l, 2),
+                                                                     round(Record.N, 2), round(Record.d, 2),
+                                                                     round(Record.f, 3))
+
+
+########################################################################################################################
+#
+# scan_length - Scan across coil lengths, for one coil diameter
+#
+# Inputs:   D, d, f, plating  As for Coil()
+#           Lengths,          Coil lengths to scan (mm)
+#           LTarget,          Inductance to attain (uH), or a list of them
+#           Threads,          (OPTIONAL) As for InterpolateLengths
+#           Continuation,     (OPTIONAL) As for InterpolateLengths
+#           Newton,           (OPTIONAL) As for InterpolateLengths
+#           Invert,           (OPTIONAL) True to find the turns with InvertTargets (always, for several targets)
+#           Errors,           (OPTIONAL) True to also yield the coils with a non-zero error_code
+#
+# Output:   Yields a CoilRecord per coil, for each target in turn, in order of increasing length
+#
+def scan_length(D, d, f, plating, Lengths, LTarget, Threads=1, Continuation=False, Newton=False, Invert=False,
+                Errors=False):
+
+    LTargets = list(LTarget) if isinstance(LTarget, (list, tuple)) else [LTarget]
+
+    if Invert or len(LTargets) > 1:
+        Scans = InvertTargets(D,d,f,plating,Lengths,LTargets)
+    else:
+        Scans = [InterpolateLengths(D,d,f,plating,Lengths,LTargets[0],Threads,Continuation,Newton)]
+
+    for Coils in Scans:
+        for TestCoil in Coils:
+            if TestCoil.error_code == 0 or Errors:
+                yield record(TestCoil)
+
+
+########################################################################################################################
+#
+# scan_grid - Scan across coil diameters and lengths
+#
+# Inputs:   Diameters, Lengths  Coil diameters and lengths to scan (mm)
+#           d, f, plating       As for Coil()
+#           LTarget,            Inductance to attain (uH)
+#           Filter,             (OPTIONAL) Function called with each calculated coil, which can set its
+#                                 error_code (see UserFilter in CoilScanDL)
+#           Errors,             (OPTIONAL) True to also yield the coils with a non-zero error_code
+#           Jobs,               (OPTIONAL) Number of processes to calculate in (default: 1). Each process
+#                                 calculates whole rows (one diameter), or points of an adaptive scan.
+#           Table,              (OPTIONAL) True to use the precomputed dispersion table in the processes
+#           Continuation,       (OPTIONAL) As for InterpolateLengths
+#           Newton,             (OPTIONAL) As for InterpolateLengths
+#           Screen,             (OPTIONAL) True to skip the coils Coil.PreScreen rejects
+#           SelfResMin,         (OPTIONAL) SelfResMin for Coil.PreScreen
+#           Adaptive,           (OPTIONAL) True for an adaptive scan (see scan_adaptive)
+#           AdaptiveStep,       (OPTIONAL) Coarse grid of the adaptive scan, in increments of the full scan
+#           AdaptiveQTol,       (OPTIONAL) Relative variation of Q that the adaptive scan refines
+#           Stats,              (OPTIONAL) Dictionary, set to the number of coils calculated ('calculated'),
+#                                 the number taken from the Store ('stored') and the number skipped by
+#                                 PreScreen for each error code ('skipped')
+#           Store,              (OPTIONAL) ResultStore to save each coil to, as its row (or pass of an
+#                                 adaptive scan) completes
+#           Resume,             (OPTIONAL) True to take the coils already in the Store from it, rather than
+#                                 calculate them again
+#
+# Output:   Yields a CoilRecord per coil, in order of increasing diameter and length. Rows are yielded as
+#             they complete (an adaptive scan all at once, when done).
+#
+# With more than one job, Filter runs in the worker processes, so it has to be a function at the top
+#   level of its module (and changes it makes to global variables are not seen by the caller).
+#
+def scan_grid(Diameters, Lengths, d, f, plating, LTarget, Filter=None, Errors=False, Jobs=1, Table=False,
+              Continuation=False, Newton=False, Screen=False, SelfResMin=0, Adaptive=False, AdaptiveStep=4,
+              AdaptiveQTol=0.05, Stats=None, Store=None, Resume=False):
+
+    if Stats is None:
+        Stats = {}
+
+    Stats['calculated'] = 0
+    Stats['stored']     = 0
+    Stats['skipped']    = {}
+
+    Lengths = list(Lengths)
+
+    #
+    # The options that change the coils calculated, for the keys of the Store
+    #
+    Options = (Errors, Continuation and not Adaptive, Newton, Table, Screen, SelfResMin if Screen else 0)
+
+    def Key(D, l):
+        return Store.key(D, l, d, f, plating, LTarget, Options)
+
+    if Jobs > 1:
+        Executor = ProcessPoolExecutor(max_workers=Jobs, initializer=scan_worker_init, initargs=(Table, disk_cache.path))
+        Map      = Executor.map
+    else:
+        Executor = None
+        Map      = map
+
+    try:
+        if Adaptive:
+            Point = partial(scan_point, d=d, f=f, plating=plating, LTarget=LTarget, Filter=Filter, Errors=Errors,
+                                        Newton=Newton, Screen=Screen, SelfResMin=SelfResMin)
+            Rows  = [scan_adaptive(Diameters, Lengths, Point, Map, Errors, AdaptiveStep, AdaptiveQTol, Stats,
+                                   Key if Store is not None else None, Store, Resume)]
+        else:
+            Row   = partial(scan_row, d=d, f=f, plating=plating, LTarget=LTarget, Filter=Filter, Errors=Errors,
+                                      Continuation=Continuation, Newton=Newton, Screen=Screen, SelfResMin=SelfResMin)
+            Rows  = scan_rows(Diameters, Lengths, Row, Map, Stats, Key if Store is not None else None, Store, Resume)
+
+        for Records in Rows:
+            yield from (Record for Record in Records if Record.error_code == 0 or Errors)
+
+    finally:
+        if Executor is not None:
+            Executor.shutdown(cancel_futures=True)
+
+
+########################################################################################################################
+#
+# scan_rows - Calculate the rows of a grid scan
+#
+# Inputs:   Diameters, Lengths, the D and l values of the scan
+#           Row, scan_row() with all but D and Lengths set
+#           Map, a map() function to calculate the rows with (for the processes, if any)
+#           Stats, Store, Resume, as for scan_grid
+#           Key, function of D and l that gives the key of a coil in the Store
+#
+# Output:   Yields a list of records for each row, of all coils (with errors or not)
+#
+# With Resume, only the coils not in the Store are calculated, and whole rows in the Store are not
+#   calculated at all.
+#
+def scan_rows(Diameters, Lengths, Row, Map, Stats, Key=None, Store=None, Resume=False):
+
+    if Resume:
+        Missing = []
+
+        for D in Diameters:
+            Known = Store.known([Key(D, l) for l in Lengths])
+            Missing.append([l for l in Lengths if Key(D, l) not in Known])
+    else:
+        Missing = [Lengths] * len(Diameters)
+
+    Results = Map(Row, [D for D, RowLengths in zip(Diameters, Missing) if RowLengths],
+                       [RowLengths for RowLengths in Missing if RowLengths])
+
+    for D, RowLengths in zip(Diameters, Missing):
+        Coils = {}
+
+        if RowLengths:
+            Records, Skipped = next(Results)
+
+            Stats['calculated'] += len(Records)
+
+            for Code, Number in Skipped.items():
+                Stats['skipped'][Code] = Stats['skipped'].get(Code, 0) + Number
+
+            Coils = dict(zip(RowLengths, Records))
+
+            if Store is not None:
+                Store.put([(Key(D, l), Coils[l]) for l in RowLengths])
+                Store.flush()
+
+        if len(RowLengths) < len(Lengths):
+            Stored = Store.get([Key(D, l) for l in Lengths if l not in Coils])
+
+            Stats['stored'] += len(Stored)
+
+            Coils.update((l, Stored[Key(D, l)]) for l in Lengths if l not in Coils)
+
+        yield [Coils[l] for l in Lengths]
+
+
+########################################################################################################################
+#
+# scan_row - Calculate one row of a grid scan: all coil lengths for one coil diameter
+#
+# Inputs:   D, the coil diameter, Lengths, the coil lengths, and the rest as for scan_grid
+#
+# Output:   List of records, in order of increasing length, and the number of coils skipped by PreScreen
+#             for each error code. Coils with an error have a full record only with Errors (see stub).
+#
+def scan_row(D, Lengths, d, f, plating, LTarget, Filter=None, Errors=False, Continuation=False, Newton=False,
+             Screen=False, SelfResMin=0):
+
+    Coils   = {}
+    Skipped = {}
+
+    for l in Lengths if Screen else []:
+        RowCoil = Coil(D,3,l,d,f,plating)
+
+        if RowCoil.PreScreen(LTarget,SelfResMin):
+            Coils[l] = RowCoil
+            Skipped[RowCoil.error_code] = Skipped.get(RowCoil.error_code, 0) + 1
+
+    Interpolate = [l for l in Lengths if l not in Coils]
+
+    if Interpolate:
+        Coils.update(zip(Interpolate, InterpolateLengths(D,d,f,plating,Interpolate,LTarget,Continuation=Continuation,Newton=Newton)))
+
+    if Filter is not None:
+        for l in Interpolate:
+            Filter(Coils[l])
+
+    return [record(Coils[l]) if Coils[l].error_code == 0 or Errors else stub(Coils[l]) for l in Lengths], Skipped
+
+
+########################################################################################################################
+#
+# scan_point - Calculate one coil of an adaptive scan
+#
+# Inputs:   D, l, the coil diameter and length, and the rest as for scan_grid
+#
+# Output:   The record of the coil (see stub, for coils with an error), and True if PreScreen rejected it
+#
+def scan_point(D, l, d, f, plating, LTarget, Filter=None, Errors=False, Newton=False, Screen=False, SelfResMin=0):
+
+    PointCoil = Coil(D,3,l,d,f,plating)
+
+    Screened = Screen and PointCoil.PreScreen(LTarget,SelfResMin)
+
+    if not Screened:
+        PointCoil.InterpolateTurns(LTarget,Newton=Newton)
+
+        if Filter is not None:
+            Filter(PointCoil)
+
+    return record(PointCoil) if PointCoil.error_code == 0 or Errors else stub(PointCoil), Screened
+
+
+########################################################################################################################
+#
+# stub - The record of a coil with an error, that will not be output
+#
+# Only the inputs and the error code are kept: reading the other results of a coil with an error can
+#   run calculation stages that were skipped.
+#
+def stub(TestCoil):
+    NaN = float('nan')
+
+    return CoilRecord(TestCoil.LTarget, TestCoil.D, TestCoil.l, TestCoil.N, TestCoil.d, TestCoil.f, NaN, NaN, NaN,
+                      NaN, NaN, TestCoil.error_code)
+
+
+########################################################################################################################
+#
+# scan_adaptive - Calculate the coils of an adaptive scan
+#
+# Inputs:   Diameters, Lengths, the D and l values of the full scan
+#           Point, scan_point() with all but D and l set
+#           Map, a map() function to calculate the points with (for the processes, if any)
+#           Errors, AdaptiveStep, AdaptiveQTol, Stats, Store, Resume, as for scan_grid
+#           Key, function of D and l that gives the key of a coil in the Store
+#
+# Output:   List of records of all coils calculated (with errors or not), in order of increasing diameter
+#             and length
+#
+# Starts from a coarse grid with AdaptiveStep times the increments of the full scan, and subdivides only
+#   the cells where Q varies by more than AdaptiveQTol (relative to the largest Q in the cell) or where
+#   the coils change between valid and not (including the filters). With Errors, cells where the error
+#   code changes are also subdivided. The coils are those of the full scan at the same D and l.
+#
+# The scan is kept as cells of the full grid, given by the indices of their corners. Each pass calculates
+#   the corners not yet known, then splits the cells that need it in half along each side that is more
+#   than one increment long.
+#
+def scan_adaptive(Diameters, Lengths, Point, Map, Errors=False, AdaptiveStep=4, AdaptiveQTol=0.05, Stats=None,
+                  Key=None, Store=None, Resume=False):
+
+    def Corners(Count):
+        Indices = list(range(0, Count, AdaptiveStep))
+        if Indices[-1] != Count - 1:
+            Indices.append(Count - 1)
+        return Indices
+
+    def Halves(First, Last):
+        if Last - First < 2:
+            return [(First, Last)]
+        Middle = (First + Last) // 2
+        return [(First, Middle), (Middle, Last)]
+
+    if Stats is None:
+        Stats = {'calculated': 0, 'stored': 0, 'skipped': {}}
+
+    DIndices = Corners(len(Diameters))
+    lIndices = Corners(len(Lengths))
+
+    Cells  = [(i0, i1, j0, j1) for i0, i1 in zip(DIndices, DIndices[1:] or DIndices)
+                               for j0, j1 in zip(lIndices, lIndices[1:] or lIndices)]
+    Points = {}
+
+    while Cells:
+
+        New = sorted({(i, j) for i0, i1, j0, j1 in Cells for i in (i0, i1) for j in (j0, j1)} - Points.keys())
+
+        if Resume:
+            Stored = Store.get([Key(Diameters[i], Lengths[j]) for i, j in New])
+
+            for i, j in New:
+                if Key(Diameters[i], Lengths[j]) in Stored:
+                    Points[(i, j)] = Stored[Key(Diameters[i], Lengths[j])]
+
+            Stats['stored'] += len(Stored)
+            New = [Index for Index in New if Index not in Points]
+
+        for (i, j), (Record, Screened) in zip(New, Map(Point, [Diameters[i] for i, j in New], [Lengths[j] for i, j in New])):
+            Points[(i, j)] = Record
+
+            if Store is not None:
+                Store.put([(Key(Diameters[i], Lengths[j]), Record)])
+
+            if Screened:
+                Stats['skipped'][Record.error_code] = Stats['skipped'].get(Record.error_code, 0) + 1
+
+        Stats['calculated'] += len(New)
+
+        if Store is not None:
+            Store.flush()
+
+        Split = []
+
+        for i0, i1, j0, j1 in Cells:
+            CellPoints = [Points[(i, j)] for i in (i0, i1) for j in (j0, j1)]
+            Codes      = {Record.error_code if Errors else Record.error_code != 0 for Record in CellPoints}
+
+            if i1 - i0 < 2 and j1 - j0 < 2:
+                Refine = False                      # Already at the increments of the full scan
+            elif len(Codes) > 1:
+                Refine = True
+            elif not any(Codes):
+                Q      = [Record.Q_eff for Record in CellPoints]
+                Refine = max(Q) - min(Q) > AdaptiveQTol * max(Q)
+            else:
+                Refine = False
+
+            if Refine:
+                Split += [(a0, a1, b0, b1) for a0, a1 in Halves(i0, i1) for b0, b1 in Halves(j0, j1)]
+
+        Cells = Split
+
+    return [Points[Index] for Index in sorted(Points)]
+
+
+########################################################################################################################
+#
+# scan_worker_init - Setup for worker processes
+#
+# Inputs:   Table, True to use the precomputed dispersion table
+#           Cache, (OPTIONAL) Directory of the disk cache of the main program, None if not used
+#
+# Ctrl-C is handled by the main program only.
+#
+def scan_worker_init(Table, Cache=None):
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    if Table:
+        use_dispersion_table()
+
+    if Cache is not None:
+        use_disk_cache(Cache)
+
+
+########################################################################################################################
+#
+# ResultStore - Coils of scans, saved in an SQLite database so that a scan can be resumed
+#
+# Inputs:   FileName, database file (created if needed)
+#           Settings, (OPTIONAL) Anything else the coils depend on, such as the settings of a filter; coils
+#                       saved with other Settings are not found
+#
+# Each coil is saved under a key: a hash of D, l, d, f, plating and LTarget, the options of the scan that
+#   change the coils, the Settings and Coil.VERSION. key() makes the key, put() saves records (replacing
+#   any with the same key), get() and known() find them, flush() commits what was put and close() flushes
+#   and closes the database. put() commits by itself every Batch records.
+#
+class ResultStore():
+
+    Batch = 1000
+
+    def __init__(self, FileName, Settings=()):
+        self.FileName   = FileName
+        self.Settings   = Settings
+        self.Pending    = 0             # Records put but not committed
+        self.Connection = sqlite3.connect(FileName)
+        self.Connection.execute("CREATE TABLE IF NOT EXISTS coils (key TEXT PRIMARY KEY, " +
+                                ", ".join("%s %s" % ("d_wire" if Name == 'd' else Name, "INTEGER" if Type == 'i4' else "REAL")
+                                          for Name, Type in RecordTypes) + ")")     # SQL names ignore case: D and d
+        self.Connection.commit()
+
+    def key(self, D, l, d, f, plating, LTarget, Options=()):
+        Text = repr((VERSION, float(D), float(l), float(d), float(f), int(plating), float(LTarget), tuple(Options),
+                     self.Settings))
+        return hashlib.sha1(Text.encode()).hexdigest()
+
+    def put(self, Items):
+        self.Connection.executemany("INSERT OR REPLACE INTO coils VALUES (?" + ", ?" * len(CoilRecord._fields) + ")",
+                                    [(Key,) + tuple(Record) for Key, Record in Items])
+        self.Pending += len(Items)
+
+        if self.Pending >= self.Batch:
+            self.flush()
+
+    def get(self, Keys):
+        Found = {}
+
+        for Row in self.select("*", Keys):
+            Found[Row[0]] = CoilRecord(*(float('nan') if Value is None else Value for Value in Row[1:]))     # NaN is saved as NULL
+
+        return Found
+
+    def known(self, Keys):
+        return {Row[0] for Row in self.select("key", Keys)}
+
+    def select(self, Columns, Keys):
+        Keys = list(Keys)
+
+        for First in range(0, len(Keys), 500):
+            Part = Keys[First:First + 500]
+            yield from self.Connection.execute("SELECT " + Columns + " FROM coils WHERE key IN (" +
+                                               ", ".join("?" * len(Part)) + ")", Part)
+
+    def flush(self):
+        self.Connection.commit()
+        self.Pending = 0
+
+    def close(self):
+        if self.Connection is not None:
+            self.flush()
+            self.Connection.close()
+            self.Connection = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *Exception):
+        self.close()
+
+
+########################################################################################################################
+#
+# CSVSink - Write records in the CSV format of Coil.PrintCSV, buffered
+#
+# Inputs:   File,     (OPTIONAL) File to write to, or the name of one (default: sys.stdout)
+#           Units,    (OPTIONAL) "mm" (default), "m", "in" or "ft" for the conductor length
+#           Repeat,   (OPTIONAL) Rows between column headers (default: 30), 0 for one column header per scan
+#           Buffer,   (OPTIONAL) Lines collected before they are written (default: 1000)
+#
+# header() starts a scan with the CSV header, write() adds a record, comment() adds a line of text (such
+#   as "" for a blank line), flush() writes what is collected and close() flushes (and closes the file, if
+#   given by name). Lines only reach the file on flush() or close(), or when Buffer lines are collected.
+#
+class CSVSink():
+
+    def __init__(self, File=None, Units="mm", Repeat=30, Buffer=1000):
+        self.Owned  = isinstance(File, str)
+        self.File   = sys.stdout if File is None else open(File, "w") if self.Owned else File
+        self.Units  = Units
+        self.Repeat = Repeat
+        self.Buffer = Buffer
+        self.Lines  = []
+        self.Rows   = 0         # Records written since the last header
+
+    def header(self, LTarget, d, p, f, ExtraLine1="", ExtraLine2=""):
+        self.Lines.append(CSVHeader(LTarget, d, p, f, ExtraLine1, ExtraLine2))
+        self.Rows = 0
+
+    def write(self, Record):
+
+        #
+        # Print an occasional column header, so a human editing the output can
+        #   easily see the columns when the full header is offscreen.
+        #
+        if self.Rows == 0 or self.Repeat > 0 and self.Rows % self.Repeat == 0:
+            self.Lines.append(CSVColumnHeader(self.Units))
+
+        self.Lines.append(CSVLine(Record, self.Units))
+        self.Rows += 1
+
+        if len(self.Lines) >= self.Buffer:
+            self.flush()
+
+    def comment(self, Text):
+        self.Lines.append(Text + "\n")
+
+    def flush(self):
+        if self.File.closed:
+            return
+
+        self.File.write("".join(self.Lines))
+        self.File.flush()
+        self.Lines = []
+
+    def close(self):
+        self.flush()
+
+        if self.Owned and not self.File.closed:
+            self.File.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *Exception):
+        self.close()
+
+
+########################################################################################################################
+#
+# NPYSink - Write records to a memory-mapped .npy file
+#
+# Inputs:   FileName, file to write (the records cannot go to stdout)
+#           Rows,     (OPTIONAL) Number of records to preallocate (default: 1024); the file grows as needed
+#
+# The file holds a one-dimensional array with one field per field of CoilRecord (see RecordTypes), in the
+#   units of Coil. Records go straight to the mapped file, and close() cuts the file to the records written.
+#   The header and comment lines are kept in Text, for the sinks based on this one. Needs numpy.
+#
+class NPYSink():
+
+    def __init__(self, FileName, Rows=0):
+        if np is None:
+            raise ImportError("The binary formats need numpy")
+
+        self.FileName = FileName
+        self.Count    = 0           # Records written
+        self.Text     = []          # Header and comment lines
+        self.Array    = open_memmap(FileName, mode="w+", dtype=RecordTypes, shape=(max(Rows, 1024),))
+        self.Offset   = self.Array.offset
+
+    def header(self, LTarget, d, p, f, ExtraLine1="", ExtraLine2=""):
+        self.Text.append(CSVHeader(LTarget, d, p, f, ExtraLine1, ExtraLine2))
+
+    def write(self, Record):
+        if self.Count == len(self.Array):
+            self.resize(2 * self.Count)
+
+        self.Array[self.Count] = tuple(Record)
+        self.Count += 1
+
+    def comment(self, Text):
+        self.Text.append(Text + "\n")
+
+    def flush(self):
+        self.Array.flush()
+
+    def close(self):
+        if self.Array is not None:
+            self.resize(self.Count)
+            self.Array = None
+
+    #
+    # Change the number of records in the file. The .npy header leaves room for the number to grow, so
+    #   it is rewritten in place and the records stay where they are.
+    #
+    def resize(self, Rows):
+        self.Array.flush()
+        self.Array = None
+
+        with open(self.FileName, "r+b") as File:
+            write_array_header_1_0(File, {'descr': dtype_to_descr(np.dtype(RecordTypes)), 'fortran_order': False,
+                                          'shape': (Rows,)})
+            if File.tell() != self.Offset:
+                raise ValueError("Header of " + self.FileName + " changed length")
+
+            File.truncate(self.Offset + Rows * np.dtype(RecordTypes).itemsize)
+
+        if Rows > 0:
+            self.Array = np.memmap(self.FileName, dtype=RecordTypes, mode="r+", offset=self.Offset, shape=(Rows,))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *Exception):
+        self.close()
+
+
+########################################################################################################################
+#
+# NPZSink, ParquetSink - Write records to a .npz file (numpy) or a Parquet file (pyarrow)
+#
+# Inputs:   FileName, file to write
+#           Rows,     (OPTIONAL) Number of records to preallocate, as for NPYSink
+#
+# The records are collected in a memory-mapped file next to FileName, as for NPYSink, and written as one
+#   column per field on close(). The header and comment lines are kept with them: as the "text" array of
+#   the .npz file, or as the "text" metadata of the Parquet file.
+#
+class NPZSink(NPYSink):
+
+    def __init__(self, FileName, Rows=0):
+        NPYSink.__init__(self, FileName + ".tmp.npy", Rows)
+        self.Output = FileName
+
+    def close(self):
+        if self.Array is None:
+            return
+
+        NPYSink.close(self)
+        self.save(np.load(self.FileName, mmap_mode="r") if self.Count else np.zeros(0, RecordTypes))
+        os.remove(self.FileName)
+
+    def save(self, Array):
+        with open(self.Output, "wb") as File:
+            np.savez_compressed(File, text="".join(self.Text), **{Name: Array[Name] for Name in Array.dtype.names})
+
+
+class ParquetSink(NPZSink):
+
+    def __init__(self, FileName, Rows=0):
+        if pyarrow is None:
+            raise ImportError("The parquet format needs pyarrow")
+
+        NPZSink.__init__(self, FileName, Rows)
+
+    def save(self, Array):
+        Table = pyarrow.table({Name: Array[Name] for Name in Array.dtype.names})
+        Table = Table.replace_schema_metadata({"text": "".join(self.Text)})
+        pyarrow.parquet.write_table(Table, self.Output)
+
+
+########################################################################################################################
+#
+# open_sink - Open a sink for an output format
+#
+# Inputs:   Format,   "csv" (default), "npy", "npz" or "parquet"
+#           FileName, (OPTIONAL) File to write; needed for the binary formats (default: stdout for csv)
+#           Units,    (OPTIONAL) Conductor length units of the csv format
+#           Repeat,   (OPTIONAL) Rows between column headers of the csv format
+#           Rows,     (OPTIONAL) Number of records to preallocate for the binary formats
+#
+# Output:   The sink
+#
+Formats = ("csv", "npy", "npz", "parquet")
+
+def open_sink(Format="csv", FileName=None, Units="mm", Repeat=30, Rows=0):
+
+    if Format == "csv":
+        return CSVSink(FileName, Units, Repeat)
+
+    if FileName is None:
+        raise ValueError("The " + Format + " format needs an output file")
+
+    if Format == "npy":
+        return NPYSink(FileName, Rows)
+
+    if Format == "npz":
+        return NPZSink(FileName, Rows)
+
+    if Format == "parquet":
+        return ParquetSink(FileName, Rows)
+
+    raise ValueError("Unknown format: " + Format)
+
+
+########################################################################################################################
+#
+# read_scan - Read the records of a scan written by one of the binary sinks
+#
+# Inputs:   FileName, a .npy, .npz or .parquet file
+#
+# Output:   Array of records with the fields of CoilRecord (see RecordTypes), and the header and comment
+#             text ("" for .npy). A .npy file is memory-mapped, not read.
+#
+# Use records() to get CoilRecords (for CSVLine or command) from the array.
+#
+def read_scan(FileName):
+
+    if np is None:
+        raise ImportError("Reading scans needs numpy")
+
+    if FileName.endswith(".npy"):
+        return np.load(FileName, mmap_mode="r"), ""
+
+    if FileName.endswith(".npz"):
+        with np.load(FileName) as Data:
+            Columns = {Name: Data[Name] for Name, Type in RecordTypes}
+            Text    = str(Data["text"])
+
+    elif FileName.endswith(".parquet"):
+        if pyarrow is None:
+            raise ImportError("The parquet format needs pyarrow")
+
+        Table   = pyarrow.parquet.read_table(FileName)
+        Columns = {Name: Table.column(Name).to_numpy() for Name, Type in RecordTypes}
+        Text    = (Table.schema.metadata or {}).get(b"text", b"").decode()
+
+    else:
+        raise ValueError("Unknown scan file type: " + FileName)
+
+    Array = np.zeros(len(Columns['D']), RecordTypes)
+
+    for Name, Type in RecordTypes:
+        Array[Name] = Columns[Name]
+
+    return Array, Text
+
+
+def records(Array):
+    for Row in Array:
+        yield CoilRecord(*Row.tolist())
+
+
+########################################################################################################################
+#
+# gnuplot_export - Write records as a binary file for gnuplot
+#
+# Inputs:   Array, records (as from read_scan)
+#           File,  binary file to write to
+#           Units, (OPTIONAL) "mm" (default), "m", "in" or "ft" for the conductor length
+#
+# The file holds the numeric columns of the CSV output, in the same order, as 64 bit floats: D, l, Q(plot)
+#   (NaN for coils with an error), Q, N, L, wLen, Res, pitch and Err. The plots of the CSV output work
+#   unchanged on it, with
+#
+#       plot 'Data.bin' binary format="%10float64" using 2:3
+#
+GnuplotColumns = 10
+
+def gnuplot_export(Array, File, Units="mm"):
+
+    Scale = {"mm": 1, "m": 1/1000, "in": 1/25.4, "ft": 1/(25.4*12)}[Units]
+
+    Columns = np.empty((len(Array), GnuplotColumns))
+
+    Columns[:,0] = Array['D']
+    Columns[:,1] = Array['l']
+    Columns[:,2] = np.where(Array['error_code'] == 0, Array['Q_eff'], np.nan)
+    Columns[:,3] = Array['Q_eff']
+    Columns[:,4] = Array['N']
+    Columns[:,5] = Array['L_eff_s']
+    Columns[:,6] = Array['l_w_phys'] * Scale
+    Columns[:,7] = Array['f_res']
+    Columns[:,8] = Array['p']
+    Columns[:,9] = Array['error_code']
+
+    File.write(Columns.astype('<f8').tobytes())
+
+
+########################################################################################################################
+#
+# read_coils - Read the coils of a batch
+#
+# Inputs:   File,    text file (or stdin) to read from
+#           plating, (OPTIONAL) Plating of the coils that don't give one (default: 0, annealed copper)
+#
+# Output:   Yields one dict per coil, with D, N, l, d, f and plating, in file order. A line that can't be
+#             read yields a dict with only its line number and error_msg, so there's still one result per coil.
+#
+# Each line is one of:
+#
+#       {"D": 50, "N": 10, "l": 100, "d": 2, "f": 13.56, "p": 0}        JSON, one coil per line
+#       50, 10, 100, 2, 13.56, 0                                        CSV, in the order of Coil()
+#       ... "CoilCalc --D=50.000 --l=100.000 --N=10.000 --d=2.000 --f=13.560"  CSV lines of the scan programs
+#
+# A CSV header names the columns of the CSV lines after it (in any order, and p or plating is optional), so the
+#   CSV output of CoilCalc --batch can be read again. The first line may be any header with D, N, l, d and f;
+#   later headers must have only known column names. Blank lines and lines that start with # are skipped.
+#
+BatchColumns = ('D', 'N', 'l', 'd', 'f', 'p')
+
+def read_coils(File, plating=0):
+
+    Names = BatchColumns
+    First = True
+
+    for Number, Line in enumerate(File, 1):
+        Line = Line.strip()
+
+        if Line == "" or Line[0] == "#":
+            continue
+
+        Header = First
+        First  = False
+
+        try:
+            if Line[0] == "{":
+                Values = json.loads(Line)
+
+            elif "CoilCalc " in Line:
+                Args   = Line[Line.index("CoilCalc ") + len("CoilCalc "):].replace('"', ' ').split()
+                Values = dict(Arg[2:].split("=", 1) for Arg in Args if Arg.startswith("--") and "=" in Arg)
+
+            else:
+                Fields = [Field.strip().strip('"') for Field in Line.split(",")]
+
+                if is_header(Fields, Header):
+                    Names = Fields
+                    continue
+
+                Values = dict(zip(Names, Fields))
+
+            yield coil_inputs(Values, plating)
+
+        except (ValueError, KeyError, TypeError, AttributeError) as Error:
+            Reason = "missing %s" % Error.args[0] if isinstance(Error, KeyError) else str(Error)
+            yield {'line': Number, 'error_msg': "Line %d: %s" % (Number, Reason)}
+
+#
+# Whether CSV Fields are a header: all known column names (as CoilCalc --batch writes), or, on the First line, names
+#   including all the inputs. Any other line is a coil, so a mistyped number is reported rather than taken for a header.
+#
+def is_header(Fields, First=False):
+
+    try:
+        float(Fields[0])
+        return False
+    except ValueError:
+        pass
+
+    return set(Fields) <= set(BatchColumns + BatchFields + ('summary',)) or First and set(BatchColumns[:5]) <= set(Fields)
+
+#
+# The inputs of a coil, from a dict of (text or numeric) values: Names, and the plating from 'plating' or 'p'.
+#   Raises KeyError for a missing value, and ValueError or TypeError for one that isn't a number.
+#
+def coil_inputs(Values, plating=0, Names=('D', 'N', 'l', 'd', 'f')):
+
+    Item    = {Name: float(Values[Name]) for Name in Names}
+    Plating = Values.get('plating', Values.get('p', ""))
+
+    Item['plating'] = plating if Plating in ("", None) else int(Plating)
+    return Item
+
+
+########################################################################################################################
+#
+# calc_coil - Calculate one coil of a batch
+#
+# Inputs:   Item,    a coil as from read_coils
+#           Summary, (OPTIONAL) True to add the summary text of the coil
+#
+# Output:   Dict of BatchFields (and summary): the inputs and the results of the coil. pitch is the Coil
+#             member p, which would be confused with the plating. Coils that CoilCalc would reject (such as
+#             more turns than fit in the length) and lines that couldn't be read have error_code -1, the
+#             reason in error_msg and NaN results.
+#
+BatchResults = (('L_eff_s', 'L_eff_s'), ('X_eff_s', 'X_eff_s'), ('R_eff_s', 'R_eff_s'), ('Q_eff', 'Q_eff'),
+                ('L_s', 'L_s'), ('R_s', 'R_s'), ('C_p', 'C_p'), ('f_res', 'f_res'), ('pitch', 'p'),
+                ('l_w_phys', 'l_w_phys'))
+
+BatchFields = ('D', 'N', 'l', 'd', 'f', 'plating') + tuple(Name for Name, Member in BatchResults) + ('error_code', 'error_msg')
+
+def calc_coil(Item, Summary=False):
+
+    Result = dict.fromkeys(BatchFields, float('nan'))
+    Result.update({Name: Item[Name] for Name in BatchFields[:6] if Name in Item})
+    Result['error_code'] = -1
+    Result['error_msg']  = Item.get('error_msg', "")
+
+    if Summary:
+        Result['summary'] = ""
+
+    if Result['error_msg'] == "":
+        Result['error_msg'] = check_coil(Item)
+
+    if Result['error_msg'] != "":
+        return Result
+
+    try:
+        Result.update(coil_result(Coil(Item['D'], Item['N'], Item['l'], Item['d'], Item['f'], Item['plating']), Summary))
+    except:
+        Result['error_msg'] = "Calculation failed"
+
+    return Result
+
+#
+# The BatchFields (and summary) of a calculated coil
+#
+def coil_result(TestCoil, Summary=False):
+
+    Result = {'D': TestCoil.D, 'N': TestCoil.N, 'l': TestCoil.l, 'd': TestCoil.d, 'f': TestCoil.f, 'plating': TestCoil.plating}
+    Result.update({Name: getattr(TestCoil, Member) for Name, Member in BatchResults})
+
+    Result['error_code'] = TestCoil.error_code
+    Result['error_msg']  = TestCoil.error_msg
+
+    if Summary:
+        Result['summary'] = TestCoil.summary
+
+    return Result
+
+#
+# The reason CoilCalc would reject a coil, or ""
+#
+def check_coil(Item):
+    for Name, What in (('D', "Coil diameter"), ('N', "Number of turns"), ('l', "Coil length"), ('d', "Wire diameter"),
+                       ('f', "Frequency")):
+        if not Item[Name] > 0:
+            return What + " must be positive."
+
+    if not 0 <= Item['plating'] <= 3:
+        return "Plating must be in range 0..3"
+
+    if Item['N']*Item['d'] >= Item['l']:
+        return "More turns (of that wire) than can fit in specified length."
+
+    return ""
+
+
+########################################################################################################################
+#
+# calc_coils - Calculate the coils of a batch
+#
+# Inputs:   Items,   coils as from read_coils (any iterable, read as needed)
+#           Jobs,    (OPTIONAL) Number of processes to calculate in (default: 1, calculate in this one)
+#           Summary, (OPTIONAL) True to add the summary text of each coil
+#           Table,   (OPTIONAL) True to use the precomputed dispersion table in the processes
+#
+# Output:   Yields the result of each coil (see calc_coil), in the order of Items.
+#
+# With Jobs, the coils are handed to the processes BatchChunk at a time, and the next chunk is started before
+#   the results of the last one are yielded, so the processes are kept busy while the results are written.
+#
+BatchChunk = 1000
+
+def calc_coils(Items, Jobs=1, Summary=False, Table=False):
+
+    Calc = partial(calc_coil, Summary=Summary)
+
+    if Jobs == 1:
+        yield from map(Calc, Items)
+        return
+
+    Items = iter(Items)
+
+    with ProcessPoolExecutor(max_workers=Jobs, initializer=scan_worker_init, initargs=(Table, disk_cache.path)) as Executor:
+        Results = iter(())
+
+        while True:
+            Chunk = list(islice(Items, BatchChunk))
+            Next  = Executor.map(Calc, Chunk, chunksize=max(1, len(Chunk) // (4*Jobs)))
+
+            yield from Results
+
+            if not Chunk:
+                break
+
+            Results = Next
+
+
+########################################################################################################################
+#
+# calc_batch - Calculate the coils of a batch together, with one CoilBatch
+#
+# Inputs:   Items, list of coils as from read_coils
+#
+# Output:   List of the result of each coil, the same as from calc_coil (without the summary)
+#
+# The results of CoilBatch are rounded as Coil rounds them (see BatchDigits; Q_eff is truncated), which
+#   gives the same values as Coil. Coils with an error, for which CoilBatch has no message, are calculated
+#   again with calc_coil, and so are all of them without numpy.
+#
+# A CoilBatch takes a tenth of a second or so even for a few coils, and pays off from a few hundred, so
+#   fewer than BatchVector coils are calculated one by one.
+#
+BatchVector = 300
+
+BatchDigits = {'L_eff_s': 3, 'X_eff_s': 1, 'R_eff_s': 3, 'L_s': 3, 'R_s': 3, 'C_p': 1, 'f_res': 3, 'pitch': 2,
+               'l_w_phys': 1}
+
+def calc_batch(Items):
+
+    Results = [None] * len(Items)
+    Valid   = [Index for Index, Item in enumerate(Items) if 'error_msg' not in Item and check_coil(Item) == ""]
+
+    if np is not None and len(Valid) >= BatchVector:
+        Column = lambda Name: np.array([Items[Index][Name] for Index in Valid])
+
+        try:
+            Batch = CoilBatch(Column('D'), Column('N'), Column('l'), Column('d'), Column('f'), Column('plating'))
+        except:
+            Batch = None    # Calculated one by one below
+
+        for Row, Index in enumerate(Valid if Batch is not None else []):
+            if Batch.error_code[Row] != 0:
+                continue
+
+            Result = {Name: Items[Index][Name] for Name in BatchFields[:6]}
+
+            for Name, Member in BatchResults:
+                Value = float(getattr(Batch, Member)[Row])
+                Result[Name] = int(Value) if Name == 'Q_eff' else round(Value, BatchDigits[Name])
+
+            Result['error_code'] = 0
+            Result['error_msg']  = ""
+            Results[Index] = Result
+
+    return [Result if Result is not None else calc_coil(Items[Index]) for Index, Result in enumerate(Results)]
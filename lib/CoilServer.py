@@ -0,0 +1,441 @@
+########################################################################################################################
+########################################################################################################################
+##
+##      Copyright (C) 2020 Peter Walsh, Milford, NH 03055
+##      All Rights Reserved under the MIT license as outlined below.
+##
+##  FILE
+##      CoilServer.py
+##
+##  DESCRIPTION
+##      A coil calculation server for other programs on the same machine, and a client for it (as CoilServe
+##        and CoilClient run them).
+##
+##      The server listens on a Unix socket or a local TCP port. A client sends requests as JSON objects,
+##        one per line, and gets one JSON object per line back for each, as soon as it is done (so not
+##        necessarily in order; the "id" of the request is returned with its response). A client can send
+##        many requests without waiting for the responses.
+##
+##          {"id": 1, "op": "coil", "D": 50, "N": 10, "l": 100, "d": 2, "f": 13.56, "p": 0}
+##          {"id": 1, "result": {"D": 50.0, "N": 10.0, ..., "Q_eff": 804, ..., "error_code": 0, "error_msg": ""}}
+##
+##      Requests ("op", and the values it needs; p, the plating, is optional):
+##
+##          coil    D, N, l, d, f, p        One coil, as CoilCalc --batch prints it (see calc_coil in
+##                                            CoilScan.py). With "summary": true, also its summary text.
+##          turns   LTarget, D, l, d, f, p  The coil of LTarget uH (see Coil.InterpolateTurns); "newton": true
+##                                            to find the turns with Newton steps
+##          scan    LTarget, D, lMin, lMax, lInc, d, f, p
+##                                          The coils of a length scan (see scan_length in CoilScan.py), as
+##                                            "records"; "errors": true to include the coils with errors
+##          stats                           Latency percentiles of each op (in ms), the batches and the caches
+##
+##      A request that can't be done gets {"id": ..., "error": "<reason>"}. NaN results are null.
+##
+##      The coil requests that come in while the calculations are busy (or within BatchWait of each other)
+##        are calculated together, with one CoilBatch when there are enough of them (see calc_batch in
+##        CoilScan.py), which gives the same results as Coil. All the requests share the caches of the
+##        process: the dispersion roots, and the dispersion table and disk cache when used.
+##
+########################################################################################################################
+########################################################################################################################
+##
+##  MIT LICENSE
+##
+##  Permission is hereby granted, free of charge, to any person obtaining a copy of
+##    this software and associated documentation files (the "Software"), to deal in
+##    the Software without restriction, including without limitation the rights to
+##    use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies
+##    of the Software, and to permit persons to whom the Software is furnished to do
+##    so, subject to the following conditions:
+##
+##  The above copyright notice and this permission notice shall be included in
+##    all copies or substantial portions of the Software.
+##
+##  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+##    INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+##    PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+##    HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+##    OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+##    SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+##
+########################################################################################################################
+########################################################################################################################
+
+import asyncio
+import json
+import time
+
+from collections        import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools          import partial
+
+from Coil     import Coil, dispersion_cache, disk_cache
+from CoilScan import coil_inputs, coil_result, calc_coil, calc_batch, scan_length
+
+
+########################################################################################################################
+#
+# Latency - Times taken by requests, for percentiles
+#
+# Inputs:   Size, (OPTIONAL) Number of the latest times kept for each kind of request
+#
+# add() adds a time (in seconds) and stats() gives the count, the 50th, 90th and 99th percentiles and the
+#   maximum of the times kept, in milliseconds, for each kind.
+#
+class Latency():
+
+    def __init__(self, Size=10000):
+        self.Size  = Size
+        self.Times = {}
+        self.Count = {}
+
+    def add(self, Kind, Seconds):
+        self.Times.setdefault(Kind, deque(maxlen=self.Size)).append(Seconds)
+        self.Count[Kind] = self.Count.get(Kind, 0) + 1
+
+    def stats(self):
+        Stats = {}
+
+        for Kind, Times in self.Times.items():
+            Times = sorted(Times)
+            Rank  = lambda Percent: Times[min(len(Times) - 1, int(Percent / 100 * len(Times)))]
+
+            Stats[Kind] = {'count': self.Count[Kind], 'p50': round(Rank(50) * 1E3, 3), 'p90': round(Rank(90) * 1E3, 3),
+                           'p99': round(Rank(99) * 1E3, 3), 'max': round(Times[-1] * 1E3, 3)}
+
+        return Stats
+
+    def text(self):
+        return "".join("%-6s %7d requests, p50 %8.3f ms, p90 %8.3f ms, p99 %8.3f ms, max %8.3f ms\n" %
+                       (Kind, Stats['count'], Stats['p50'], Stats['p90'], Stats['p99'], Stats['max'])
+                       for Kind, Stats in self.stats().items())
+
+
+########################################################################################################################
+#
+# CoilBatcher - Coil requests, calculated together
+#
+# Inputs:   Executor,  Threads to calculate in
+#           Threads,   Number of threads of Executor
+#           BatchWait, (OPTIONAL) Seconds to wait for more coils before calculating the ones waiting
+#           BatchMax,  (OPTIONAL) Most coils calculated together
+#
+# submit() returns a future of the result of a coil (as from calc_coil). While all threads are busy, coils
+#   are kept until one is free, so the busier the server, the larger the batches.
+#
+class CoilBatcher():
+
+    def __init__(self, Executor, Threads, BatchWait=0.002, BatchMax=1000):
+        self.Executor  = Executor
+        self.Threads   = Threads
+        self.BatchWait = BatchWait
+        self.BatchMax  = BatchMax
+
+        self.Items   = []       # Coils waiting, and the futures of their results
+        self.Futures = []
+        self.Timer   = None
+        self.Running = 0        # Batches being calculated
+        self.Tasks   = set()
+
+        self.batches = 0
+        self.coils   = 0
+
+    def submit(self, Item):
+        Loop   = asyncio.get_running_loop()
+        Future = Loop.create_future()
+
+        self.Items.append(Item)
+        self.Futures.append(Future)
+
+        if len(self.Items) >= self.BatchMax:
+            self.flush()
+        elif self.Timer is None:
+            self.Timer = Loop.call_later(self.BatchWait, self.expire)
+
+        return Future
+
+    def expire(self):
+        self.Timer = None
+
+        if self.Running < self.Threads:
+            self.flush()
+
+    def flush(self):
+        if self.Timer is not None:
+            self.Timer.cancel()
+            self.Timer = None
+
+        Items, Futures = self.Items[:self.BatchMax], self.Futures[:self.BatchMax]
+        del self.Items[:self.BatchMax], self.Futures[:self.BatchMax]
+
+        self.Running += 1
+        self.batches += 1
+        self.coils   += len(Items)
+
+        Task = asyncio.get_running_loop().create_task(self.run(Items, Futures))
+        self.Tasks.add(Task)
+        Task.add_done_callback(self.Tasks.discard)
+
+    async def run(self, Items, Futures):
+        try:
+            Results = await asyncio.get_running_loop().run_in_executor(self.Executor, calc_batch, Items)
+
+            for Future, Result in zip(Futures, Results):
+                Future.set_result(Result)
+
+        except Exception as Error:
+            for Future in Futures:
+                Future.set_exception(Error)
+
+        finally:
+            self.Running -= 1
+
+            if self.Items and self.Timer is None:
+                self.flush()
+
+
+########################################################################################################################
+#
+# calc_turns - The coil of a target inductance, for a turns request
+#
+# Output:   The result of the coil (see coil_result in CoilScan.py), and LTarget
+#
+def calc_turns(Item, LTarget, Newton=False, Summary=False):
+
+    for Name in ('D', 'l', 'd', 'f'):
+        if not Item[Name] > 0:
+            raise ValueError(Name + " must be positive")
+
+    TestCoil = Coil(Item['D'], 3, Item['l'], Item['d'], Item['f'], Item['plating'])
+    TestCoil.InterpolateTurns(LTarget, Newton=Newton)
+
+    return dict(coil_result(TestCoil, Summary), LTarget=LTarget)
+
+
+########################################################################################################################
+#
+# calc_scan - The coils of a length scan, for a scan request
+#
+# Output:   List of the records of the coils (see CoilRecord in CoilScan.py) as dicts, with p as pitch
+#
+def calc_scan(Item, ScanMax, Newton=False, Errors=False):
+
+    if not Item['lInc'] > 0 or not Item['D'] > 0:
+        raise ValueError("D and lInc must be positive")
+
+    Lengths = []
+
+    l = Item['lMin']
+    while l <= Item['lMax'] + 1E-9:
+        Lengths.append(l)
+        l += Item['lInc']
+
+        if len(Lengths) > ScanMax:
+            raise ValueError("More than %d coils in the scan" % ScanMax)
+
+    Records = scan_length(Item['D'], Item['d'], Item['f'], Item['plating'], Lengths, Item['LTarget'], Newton=Newton,
+                          Errors=Errors)
+
+    return [{('pitch' if Name == 'p' else Name): Value for Name, Value in Record._asdict().items()} for Record in Records]
+
+
+########################################################################################################################
+#
+# plain - A value as JSON can take it: NaN (and infinity) as None, in lists and dicts too
+#
+def plain(Value):
+
+    if isinstance(Value, float) and (Value != Value or Value in (float('inf'), float('-inf'))):
+        return None
+
+    if isinstance(Value, dict):
+        return {Name: plain(Item) for Name, Item in Value.items()}
+
+    if isinstance(Value, (list, tuple)):
+        return [plain(Item) for Item in Value]
+
+    return Value
+
+
+########################################################################################################################
+#
+# CoilServer - Answer coil requests on a socket
+#
+# Inputs:   Threads,   (OPTIONAL) Number of threads to calculate in (default: 1)
+#           BatchWait, (OPTIONAL) As for CoilBatcher, in seconds
+#           BatchMax,  (OPTIONAL) As for CoilBatcher
+#           ScanMax,   (OPTIONAL) Most coils in a scan request
+#
+# start() listens on Socket (a Unix socket), or on Host and Port, and returns the asyncio server.
+#   handle() answers one request (a dict) and is used by the connections; it can be called directly.
+#
+class CoilServer():
+
+    def __init__(self, Threads=1, BatchWait=0.002, BatchMax=1000, ScanMax=2000):
+        self.Threads  = Threads
+        self.ScanMax  = ScanMax
+        self.Executor = ThreadPoolExecutor(max_workers=Threads)
+        self.Batcher  = CoilBatcher(self.Executor, Threads, BatchWait, BatchMax)
+        self.Latency  = Latency()
+        self.Started  = time.time()
+
+    async def start(self, Socket="", Host="127.0.0.1", Port=0):
+        if Socket != "":
+            return await asyncio.start_unix_server(self.connection, path=Socket)
+
+        return await asyncio.start_server(self.connection, Host, Port)
+
+    async def run(self, Function, *Args):
+        return await asyncio.get_running_loop().run_in_executor(self.Executor, partial(Function, *Args))
+
+    async def handle(self, Request):
+        Op = Request.get('op', 'coil')
+
+        if Op == 'coil':
+            Item = coil_inputs(Request)
+
+            if Request.get('summary'):
+                return await self.run(calc_coil, Item, True)
+
+            return await self.Batcher.submit(Item)
+
+        if Op == 'turns':
+            Item = coil_inputs(Request, Names=('D', 'l', 'd', 'f'))
+            return await self.run(calc_turns, Item, float(Request['LTarget']), bool(Request.get('newton')),
+                                  bool(Request.get('summary')))
+
+        if Op == 'scan':
+            Item = coil_inputs(Request, Names=('LTarget', 'D', 'lMin', 'lMax', 'lInc', 'd', 'f'))
+            return {'records': await self.run(calc_scan, Item, self.ScanMax, bool(Request.get('newton')),
+                                              bool(Request.get('errors')))}
+
+        if Op == 'stats':
+            return self.stats()
+
+        raise ValueError("Unknown op: %s" % Op)
+
+    def stats(self):
+        return {'latency_ms': self.Latency.stats(), 'batches': self.Batcher.batches, 'batched_coils': self.Batcher.coils,
+                'dispersion_cache': dispersion_cache.stats(),
+                'disk_cache': disk_cache.stats() if disk_cache.path is not None else None,
+                'uptime_s': round(time.time() - self.Started, 1)}
+
+    async def respond(self, Line, Writer, Start):
+        Id = None
+        Op = 'error'
+
+        try:
+            Request = json.loads(Line)
+
+            if not isinstance(Request, dict):
+                raise ValueError("A request must be a JSON object")
+
+            Id       = Request.get('id')
+            Op       = str(Request.get('op', 'coil'))
+            Response = {'id': Id, 'result': await self.handle(Request)}
+
+        except KeyError as Error:
+            Response = {'id': Id, 'error': "missing %s" % Error.args[0]}
+
+        except Exception as Error:
+            Response = {'id': Id, 'error': str(Error)}
+
+        try:
+            Writer.write(json.dumps(plain(Response)).encode() + b"\n")
+            await Writer.drain()
+        except ConnectionError:
+            return
+
+        self.Latency.add(Op if 'result' in Response else 'error', time.perf_counter() - Start)
+
+    async def connection(self, Reader, Writer):
+        Tasks = set()
+
+        try:
+            while True:
+                Line = await Reader.readline()
+
+                if not Line:
+                    break
+
+                if Line.strip() == b"":
+                    continue
+
+                Task = asyncio.create_task(self.respond(Line, Writer, time.perf_counter()))
+                Tasks.add(Task)
+                Task.add_done_callback(Tasks.discard)
+
+            await asyncio.gather(*Tasks)
+
+        except (ConnectionError, ValueError):
+            pass    # The client went away, or sent a line longer than the reader's limit
+
+        finally:
+            Writer.close()
+
+
+########################################################################################################################
+#
+# request_many - Send requests to a server and collect the responses (the client side)
+#
+# Inputs:   Requests, list of request dicts; an "id" is added to those without one (their index)
+#           Socket,   Unix socket of the server, or "" to connect to Host and Port
+#           Host,     (OPTIONAL) Host of the server
+#           Port,     (OPTIONAL) Port of the server
+#           Output,   (OPTIONAL) Function called with each response line (text) as it arrives
+#
+# Output:   The responses (dicts) in the order of Requests, and a Latency of them by op, as the client sees
+#             them. All the requests are sent at once, without waiting for responses.
+#
+async def request_many(Requests, Socket="", Host="127.0.0.1", Port=0, Output=None):
+
+    if Socket != "":
+        Reader, Writer = await asyncio.open_unix_connection(Socket, limit=2**26)
+    else:
+        Reader, Writer = await asyncio.open_connection(Host, Port, limit=2**26)
+
+    Requests = [Request if 'id' in Request else dict(Request, id=Index) for Index, Request in enumerate(Requests)]
+    Index    = {json.dumps(Request['id']): Position for Position, Request in enumerate(Requests)}
+
+    Sent      = [0.0] * len(Requests)
+    Responses = [None] * len(Requests)
+    Times     = Latency()
+
+    async def Send():
+        for Position, Request in enumerate(Requests):
+            Sent[Position] = time.perf_counter()
+            Writer.write(json.dumps(Request).encode() + b"\n")
+
+            if Position % 100 == 99:
+                await Writer.drain()
+
+        await Writer.drain()
+
+    async def Receive():
+        for Count in range(len(Requests)):
+            Line = await Reader.readline()
+
+            if not Line:
+                raise ConnectionError("The server closed the connection")
+
+            Response = json.loads(Line)
+            Position = Index.get(json.dumps(Response.get('id')))
+
+            if Position is None:
+                continue
+
+            Responses[Position] = Response
+            Times.add(Requests[Position].get('op', 'coil') if 'result' in Response else 'error',
+                      time.perf_counter() - Sent[Position])
+
+            if Output is not None:
+                Output(Line.decode().rstrip("\n"))
+
+    try:
+        await asyncio.gather(Send(), Receive())
+    finally:
+        Writer.close()
+        await Writer.wait_closed()
+
+    return Responses, Times
@@ -73,6 +73,17 @@ REFERENCES
 
 #from math import nan
 
+try:
+    import numpy as np
+except ImportError:
+    np = None    # fzero_many (vectorized) needs numpy; fzero does not
+
+
+# https://en.wikipedia.org/wiki/Machine_epsilon#Approximation
+epsilon_m = 1
+while 1 + 0.5 * epsilon_m != 1:
+    epsilon_m = 0.5 * epsilon_m
+
 
 error_msg = [''] * 5
 
@@ -84,7 +95,7 @@ error_msg[0] = 'The zero is within the requested tolerance (on the order of Mach
 error_msg[1] = 'A zero has been found, but the interval has not collapsed \
                 \nto the requested tolerance.'
 
-error_msg[2] = 'MAXIT (200) function evaluations. The solution may be meaningless. Check it.'
+error_msg[2] = 'MAXIT function evaluations. The solution may be meaningless. Check it.'
 
 error_msg[3] = 'b and c are the same. Please, try again with a non-zero interval. No further action taken.'
 
@@ -95,16 +106,22 @@ error_msg[4] = 'The function does not change sign over the input interval. Pleas
 sign = lambda x: -1 if x < 0 else (1 if x > 0 else 0)
 
 
-def fzero(f, b, c):    # f is a function and b and c are starting values for x.
+# f is a function and b and c are starting values for x.
+#
+# Optional: rel_tol          relative tolerance of the zero    (default: machine epsilon)
+#           abs_tol          absolute tolerance of the zero    (default: machine epsilon)
+#           max_evaluations  maximum number of calls of f      (default: MAXIT = 200)
+#
+def fzero(f, b, c, rel_tol=None, abs_tol=None, max_evaluations=200):
 
     neg_flag = False
     zero = float('nan')
     count = 0
 
-    # https://en.wikipedia.org/wiki/Machine_epsilon#Approximation
-    epsilon_m = 1
-    while 1 + 0.5 * epsilon_m != 1:
-        epsilon_m = 0.5 * epsilon_m
+    if rel_tol is None:
+        rel_tol = epsilon_m
+    if abs_tol is None:
+        abs_tol = epsilon_m
 
     if b == c:
         # b and c are the same. Please, try again with a non-zero interval. No further action taken.
@@ -179,7 +196,7 @@ def fzero(f, b, c):    # f is a function and b and c are starting values for x.
     fa = fc
     ic = 0
     acbs = abs(c - b)
-    MAXIT = 200
+    MAXIT = max_evaluations
 
     while count < MAXIT:
         if abs(fc) < abs(fb):
@@ -193,7 +210,7 @@ def fzero(f, b, c):    # f is a function and b and c are starting values for x.
 
         cmb = (c - b) / 2
         acmb = abs(cmb)
-        tol = (abs(b) + 1) * epsilon_m
+        tol = abs(b) * rel_tol + abs_tol
 
         # Test stopping criterion
         if acmb <= tol:
@@ -262,4 +279,186 @@ def fzero(f, b, c):    # f is a function and b and c are starting values for x.
     else:
         zero = -b
 
-    return {'zero':zero, 'f_evaluations':count, 'epsilon_m':epsilon_m, 'error_code':error_code, 'error_msg':error_msg[error_code]}
+    message = error_msg[error_code]
+    if error_code == 2:
+        message = message.replace('MAXIT', 'MAXIT (%d)' % MAXIT)
+
+    return {'zero':zero, 'f_evaluations':count, 'epsilon_m':epsilon_m, 'error_code':error_code, 'error_msg':message}
+
+
+# Vectorized fzero: solve many problems at once, running the same iteration as fzero on every lane
+#   in lockstep. Each lane gives exactly the same zero as fzero would for it.
+#
+# f is a function f(x, lanes) of an array x, which returns an array of the same size. lanes holds the
+#   index of the problem each element of x belongs to, so f can look up its parameters. f is only
+#   called for the lanes that are still iterating.
+#
+# b and c are arrays of starting values, one pair per lane (they are broadcast against each other, so
+#   one of them may be a scalar). The options are as for fzero, and the same for all lanes.
+#
+# Returns three arrays of the broadcast shape of b and c:
+#   zero            the zeros (NaN where not found)
+#   error_code      the fzero error code of each lane (0..4, see error_msg)
+#   f_evaluations   the number of function evaluations of each lane
+#
+def fzero_many(f, b, c, rel_tol=None, abs_tol=None, max_evaluations=200):
+
+    if np is None:
+        raise ImportError('fzero_many requires numpy')
+
+    if rel_tol is None:
+        rel_tol = epsilon_m
+    if abs_tol is None:
+        abs_tol = epsilon_m
+
+    b, c = np.broadcast_arrays(np.asarray(b, dtype=float), np.asarray(c, dtype=float))
+    shape = b.shape
+    b = b.ravel().copy()
+    c = c.ravel().copy()
+    n = b.size
+
+    vsign = lambda x: (x > 0).astype(int) - (x < 0)
+
+    zero = np.full(n, np.nan)
+    error_code = np.zeros(n, dtype=int)
+    count = np.zeros(n, dtype=int)
+    done = np.zeros(n, dtype=bool)
+
+    def evaluate(x, lanes):
+        count[lanes] += 1
+        return np.asarray(f(x, lanes), dtype=float)
+
+    def finish(mask, x, code):
+        zero[mask] = np.where(neg_flag[mask], x[mask], -x[mask])
+        error_code[mask] = code
+        done[mask] = True
+
+    with np.errstate(all='ignore'):
+
+        # b and c are the same. No further action taken.
+        same = b == c
+        error_code[same] = 3
+        done[same] = True
+
+        # Swap interval endpoints.
+        swap = b > c
+        b[swap], c[swap] = c[swap], b[swap].copy()
+
+        # Most of the interval is negative: the interval is truncated or reflected, as in fzero.
+        negative = np.abs(b) > np.abs(c)
+        truncate = negative & (c >= 0)
+        reflect = negative & (c < 0)
+        c_new = np.where(truncate, -b, np.where(reflect, -b, c))
+        b_new = np.where(truncate, 0.0000000001, np.where(reflect, -c, b))
+        b, c = b_new, c_new
+
+        neg_flag = ~negative
+        b[neg_flag & (b <= 0)] = 0.0000000001
+
+        lanes = np.flatnonzero(~done)
+        z = (c + b) / 2
+        fz = np.full(n, np.nan)
+        fb = np.full(n, np.nan)
+        fc = np.full(n, np.nan)
+        fz[lanes] = evaluate(z[lanes], lanes)
+        fb[lanes] = evaluate(b[lanes], lanes)
+        fc[:] = fz
+
+        active = ~done
+        finish(active & (fb == 0), b, 1)
+        active = ~done
+        finish(active & (fz == 0), z, 1)
+        active = ~done
+
+        same_sign = active & (vsign(fz) == vsign(fb))
+        lanes = np.flatnonzero(same_sign)
+        fc[lanes] = evaluate(c[lanes], lanes)
+
+        finish(same_sign & (fc == 0), c, 1)
+        same_sign &= ~done
+
+        change = same_sign & (vsign(fz) != vsign(fc))
+        b[change] = z[change]
+        fb[change] = fz[change]
+
+        # The sign is the same on this interval as well: no zero on the input interval.
+        nochange = same_sign & ~change
+        error_code[nochange] = 4
+        done[nochange] = True
+
+        other = active & ~same_sign
+        c[other] = z[other]
+
+        a = c.copy()
+        fa = fc.copy()
+        ic = np.zeros(n, dtype=int)
+        acbs = np.abs(c - b)
+        MAXIT = max_evaluations
+
+        while True:
+            active = ~done & (count < MAXIT)
+            if not active.any():
+                break
+
+            # Perform interchange.
+            interchange = active & (np.abs(fc) < np.abs(fb))
+            a[interchange], fa[interchange] = b[interchange], fb[interchange]
+            b[interchange], fb[interchange] = c[interchange], fc[interchange]
+            c[interchange], fc[interchange] = a[interchange], fa[interchange]
+
+            cmb = (c - b) / 2
+            acmb = np.abs(cmb)
+            tol = np.abs(b) * rel_tol + abs_tol
+
+            # Test stopping criterion
+            finish(active & (acmb <= tol), b, 0)
+            active &= ~done
+            finish(active & (fb == 0), b, 1)
+            active &= ~done
+
+            if not active.any():
+                break
+
+            # New iterate implicitly as b + p/q, where p is arranged to be >= 0.
+            p = (b - a) * fb
+            q = fa - fb
+            flip = p < 0
+            p = np.where(flip, -p, p)
+            q = np.where(flip, -q, q)
+
+            a[active] = b[active]
+            fa[active] = fb[active]
+            ic[active] += 1
+
+            bisect = active & (ic >= 4) & (8 * acmb >= acbs)
+            rest = active & ~bisect
+
+            reset = rest & (ic >= 4)
+            ic[reset] = 0
+            acbs[reset] = acmb[reset]
+
+            small = rest & (p <= tol * np.abs(q))    # Test for too small a change
+            secant = rest & ~small & (p < cmb * q)
+            bisect |= rest & ~small & ~secant
+
+            b_next = b.copy()
+            b_next[bisect] = ((c + b) / 2)[bisect]
+            b_next[small] = (b + tol * vsign(cmb))[small]
+            b_next[secant] = (b + p/q)[secant]
+            b = b_next
+
+            # Have now computed new iterate, b.
+            lanes = np.flatnonzero(active)
+            fb[lanes] = evaluate(b[lanes], lanes)
+
+            finish(active & (fb == 0), b, 1)
+            active &= ~done
+
+            # Decide whether the next step is interpolation or extrapolation.
+            extrapolate = active & (vsign(fb) == vsign(fc))
+            c[extrapolate] = a[extrapolate]
+            fc[extrapolate] = fa[extrapolate]
+
+        finish(~done, b, 2)
+
+    return zero.reshape(shape), error_code.reshape(shape), count.reshape(shape)
@@ -6,17 +6,49 @@ def cot(x):
 
 
 # Bessel functions from http://mhtlab.uwaterloo.ca/old/courses/me3532/js/bessel.html
+#
+# The polynomial approximations are kept in separate functions, so that the scalar, the array and the
+# exponentially scaled versions below all evaluate exactly the same polynomials.
+
+
+def _I0_small(y):    # y = (x / 3.75)**2
+    return 1 + y * (3.5156229 + y * (3.0899424 + y * (1.2067492 + y * (0.2659732 + y * (0.360768E-1 + y * 0.45813e-2)))))
+
+
+def _I0_large(y):    # y = 3.75 / |x|
+    return 0.39894228 + y * (0.1328592E-1 + y * (0.225319E-2 + y * (-0.157565E-2 + y * (0.916281E-2 + y * (-0.2057706E-1 + y * (0.2635537E-1 + y * (-0.1647633E-1 +y * 0.392377E-2)))))))
+
+
+def _I1_small(y):    # y = (x / 3.75)**2
+    return 0.5 + y * (0.87890594 + y * (0.51498869 + y * (0.15084934 + y * (0.2658733E-1 + y * (0.301532E-2 + y * 0.32411E-3)))))
+
+
+def _I1_large(y):    # y = 3.75 / |x|
+    ans  = 0.2282967E-1 + y * (-0.2895312E-1 + y * (0.1787654E-1 - y * 0.420059E-2))
+    return (0.39894228 + y * (-0.3988024E-1 + y * (-0.362018E-2 + y * (0.163801E-2 + y * (-0.1031555E-1 + y * ans)))))
+
+
+def _K1_small(y):    # y = x**2 / 4
+    return 1 + y * (0.15443144 + y * (-0.67278579 + y * (-0.18156897 + y * (-0.1919402E-1 + y * (-0.110404E-2 + y * (-0.4686E-4))))))
+
+
+def _K0_large(y):    # y = 2 / x
+    return 1.25331414 + y * (-0.7832358E-1 + y * (0.2189568E-1 + y * (-0.1062446E-1 + y * (0.587872E-2 + y * (-0.251540E-2 + y * 0.53208E-3)))))
+
+
+def _K1_large(y):    # y = 2 / x
+    return 1.25331414 + y * (0.23498619 + y * (-0.3655620E-1 + y * (0.1504268E-1 + y * (-0.780353E-2 + y * (0.325614E-2 + y * (-0.68245E-3))))))
 
 
 def I0(x):
     ax = abs(x)
     if ax < 3.75:
         y  = (x / 3.75)**2
-        ans = 1 + y * (3.5156229 + y * (3.0899424 + y * (1.2067492 + y * (0.2659732 + y * (0.360768E-1 + y * 0.45813e-2)))))
+        ans = _I0_small(y)
     else:
         try:
             y = 3.75 / ax
-            ans  = 0.39894228 + y * (0.1328592E-1 + y * (0.225319E-2 + y * (-0.157565E-2 + y * (0.916281E-2 + y * (-0.2057706E-1 + y * (0.2635537E-1 + y * (-0.1647633E-1 +y * 0.392377E-2)))))))
+            ans  = _I0_large(y)
             ans *= exp(ax) / sqrt(ax)
         except OverflowError:
             ans = float('inf')
@@ -27,12 +59,11 @@ def I1(x):
     ax = abs(x)
     if ax < 3.75:
         y  = (x / 3.75)**2
-        ans = ax * (0.5 + y * (0.87890594 + y * (0.51498869 + y * (0.15084934 + y * (0.2658733E-1 + y * (0.301532E-2 + y * 0.32411E-3))))))
+        ans = ax * _I1_small(y)
     else:
         try:
             y = 3.75 / ax
-            ans  = 0.2282967E-1 + y * (-0.2895312E-1 + y * (0.1787654E-1 - y * 0.420059E-2))
-            ans  = (0.39894228 + y * (-0.3988024E-1 + y * (-0.362018E-2 + y * (0.163801E-2 + y * (-0.1031555E-1 + y * ans)))))
+            ans  = _I1_large(y)
             ans *= exp(ax) / sqrt(ax)
         except OverflowError:
             ans = float('inf')
@@ -46,7 +77,7 @@ def K0(x):
     else:
         try:
             y = 2 / x
-            ans  = 1.25331414 + y * (-0.7832358E-1 + y * (0.2189568E-1 + y * (-0.1062446E-1 + y * (0.587872E-2 + y * (-0.251540E-2 + y * 0.53208E-3)))))
+            ans  = _K0_large(y)
             ans *= exp(-x) / sqrt(x)
         except OverflowError:
             ans = float('inf')
@@ -56,12 +87,291 @@ def K0(x):
 def K1(x):
     if x <= 2:
         y = x**2 / 4
-        ans = log(x/2) * I1(x) + 1/x * (1 + y * (0.15443144 + y * (-0.67278579 + y * (-0.18156897 + y * (-0.1919402E-1 + y * (-0.110404E-2 + y * (-0.4686E-4)))))))
+        ans = log(x/2) * I1(x) + 1/x * _K1_small(y)
     else:
         try:
             y = 2 / x
-            ans  = 1.25331414 + y * (0.23498619 + y * (-0.3655620E-1 + y * (0.1504268E-1 + y * (-0.780353E-2 + y * (0.325614E-2 + y * (-0.68245E-3))))))
+            ans  = _K1_large(y)
             ans *= exp(-x) / sqrt(x)
         except OverflowError:
             ans = float('inf')
     return ans
+
+
+# Exponentially scaled Bessel functions: I0e(x) = I0(x) * exp(-|x|) and K0e(x) = K0(x) * exp(x), et al.
+#
+# For large arguments I grows as exp(x) and K decays as exp(-x), so I0(x) overflows to inf near x = 710 and K0(x)
+# underflows to 0 near x = 745. The scaled versions drop the exponential from the large-argument approximation
+# instead of calculating it, and stay finite.
+
+
+def I0e(x):
+    ax = abs(x)
+    if ax < 3.75:
+        return I0(x) * exp(-ax)
+    return _I0_large(3.75 / ax) / sqrt(ax)
+
+
+def I1e(x):
+    ax = abs(x)
+    if ax < 3.75:
+        return I1(x) * exp(-ax)
+    ans = _I1_large(3.75 / ax) / sqrt(ax)
+    return -ans if x < 0 else ans
+
+
+def K0e(x):
+    if x <= 2:
+        return K0(x) * exp(x)
+    return _K0_large(2 / x) / sqrt(x)
+
+
+def K1e(x):
+    if x <= 2:
+        return K1(x) * exp(x)
+    return _K1_large(2 / x) / sqrt(x)
+
+
+# Products of the modified Bessel functions, as needed by the sheath helix dispersion function and impedance.
+#
+# In the product the exp(x) of I and the exp(-x) of K cancel, so for large arguments the products are formed
+# from the scaled functions without calculating either exponential.
+
+
+def I0K0(x):
+    if x < 3.75:
+        return I0(x) * K0(x)
+    return I0e(x) * K0e(x)
+
+
+def I1K1(x):
+    if x < 3.75:
+        return I1(x) * K1(x)
+    return I1e(x) * K1e(x)
+
+
+def I1K1_I0K0(x):    # I1(x) * K1(x) / (I0(x) * K0(x))
+    if x < 3.75:
+        return I1(x) * K1(x) / (I0(x) * K0(x))
+    return I1e(x) * K1e(x) / (I0e(x) * K0e(x))
+
+
+# Array versions of the Bessel functions above, for numpy arrays.
+#
+# Each one gives exactly the same result as the scalar version, element by element: the same polynomials are
+# evaluated with the same operations, and exp(), log() and integer powers are taken from the same math library.
+# Instead of raising, overflow gives inf (as the scalar versions do) and arguments outside the domain give nan.
+#
+# With exact=False numpy's own exp(), log() and power() are used instead. These are several times faster, but
+# may differ from the math library in the last bit.
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+def _exp1(x):
+    try:
+        return exp(x)
+    except OverflowError:
+        return float('inf')
+
+
+def _log1(x):
+    try:
+        return log(x)
+    except ValueError:
+        return float('nan')
+
+
+def _math(exact):
+    if not exact:
+        return np.exp, np.log, np.power
+
+    _exp = lambda x: np.frompyfunc(_exp1, 1, 1)(x).astype(float)
+    _log = lambda x: np.frompyfunc(_log1, 1, 1)(x).astype(float)
+    _pow = lambda x, n: np.frompyfunc(pow, 2, 1)(x, float(n)).astype(float)
+    return _exp, _log, _pow
+
+
+def I0v(x, exact=True):
+    _exp, _log, _pow = _math(exact)
+    x = np.asarray(x, dtype=float)
+    ax = np.abs(x)
+    ans = np.empty_like(ax)
+
+    with np.errstate(all='ignore'):
+        small = ax < 3.75
+        y = _pow(x[small] / 3.75, 2)
+        ans[small] = _I0_small(y)
+
+        large = ~small
+        ax = ax[large]
+        y = 3.75 / ax
+        ans_l  = _I0_large(y)
+        ans_l *= _exp(ax) / np.sqrt(ax)
+        ans[large] = ans_l
+    return ans if ans.ndim else ans[()]
+
+
+def I1v(x, exact=True):
+    _exp, _log, _pow = _math(exact)
+    x = np.asarray(x, dtype=float)
+    ax = np.abs(x)
+    ans = np.empty_like(ax)
+
+    with np.errstate(all='ignore'):
+        small = ax < 3.75
+        y = _pow(x[small] / 3.75, 2)
+        ans[small] = ax[small] * _I1_small(y)
+
+        large = ~small
+        ax = ax[large]
+        y = 3.75 / ax
+        ans_l  = _I1_large(y)
+        ans_l *= _exp(ax) / np.sqrt(ax)
+        ans[large] = ans_l
+
+    ans = np.where(x < 0, -ans, ans)
+    return ans if ans.ndim else ans[()]
+
+
+def K0v(x, exact=True):
+    _exp, _log, _pow = _math(exact)
+    x = np.asarray(x, dtype=float)
+    ans = np.empty_like(x)
+
+    with np.errstate(all='ignore'):
+        small = x <= 2
+        xs = x[small]
+        y = _pow(xs, 2) / 4
+        ans[small] = -_log(xs/2) * I0v(xs, exact) - 0.57721566 + 0.42278420 * y + 0.23069756 * _pow(y, 2) + 0.03488590 * _pow(y, 3) + 0.00262698 * _pow(y, 4) + 0.00010750 * _pow(y, 5) + 0.00000740 * _pow(y, 6)
+
+        large = ~small
+        xl = x[large]
+        y = 2 / xl
+        ans_l  = _K0_large(y)
+        ans_l *= _exp(-xl) / np.sqrt(xl)
+        ans[large] = ans_l
+    return ans if ans.ndim else ans[()]
+
+
+def K1v(x, exact=True):
+    _exp, _log, _pow = _math(exact)
+    x = np.asarray(x, dtype=float)
+    ans = np.empty_like(x)
+
+    with np.errstate(all='ignore'):
+        small = x <= 2
+        xs = x[small]
+        y = _pow(xs, 2) / 4
+        ans[small] = _log(xs/2) * I1v(xs, exact) + 1/xs * _K1_small(y)
+
+        large = ~small
+        xl = x[large]
+        y = 2 / xl
+        ans_l  = _K1_large(y)
+        ans_l *= _exp(-xl) / np.sqrt(xl)
+        ans[large] = ans_l
+    return ans if ans.ndim else ans[()]
+
+
+def I0ev(x, exact=True):
+    _exp, _log, _pow = _math(exact)
+    x = np.asarray(x, dtype=float)
+    ax = np.abs(x)
+    ans = np.empty_like(ax)
+
+    with np.errstate(all='ignore'):
+        small = ax < 3.75
+        ans[small] = I0v(x[small], exact) * _exp(-ax[small])
+
+        large = ~small
+        ans[large] = _I0_large(3.75 / ax[large]) / np.sqrt(ax[large])
+    return ans if ans.ndim else ans[()]
+
+
+def I1ev(x, exact=True):
+    _exp, _log, _pow = _math(exact)
+    x = np.asarray(x, dtype=float)
+    ax = np.abs(x)
+    ans = np.empty_like(ax)
+
+    with np.errstate(all='ignore'):
+        small = ax < 3.75
+        ans[small] = I1v(x[small], exact) * _exp(-ax[small])
+
+        large = ~small
+        ans[large] = _I1_large(3.75 / ax[large]) / np.sqrt(ax[large])
+        ans[large & (x < 0)] *= -1
+    return ans if ans.ndim else ans[()]
+
+
+def K0ev(x, exact=True):
+    _exp, _log, _pow = _math(exact)
+    x = np.asarray(x, dtype=float)
+    ans = np.empty_like(x)
+
+    with np.errstate(all='ignore'):
+        small = x <= 2
+        ans[small] = K0v(x[small], exact) * _exp(x[small])
+
+        large = ~small
+        ans[large] = _K0_large(2 / x[large]) / np.sqrt(x[large])
+    return ans if ans.ndim else ans[()]
+
+
+def K1ev(x, exact=True):
+    _exp, _log, _pow = _math(exact)
+    x = np.asarray(x, dtype=float)
+    ans = np.empty_like(x)
+
+    with np.errstate(all='ignore'):
+        small = x <= 2
+        ans[small] = K1v(x[small], exact) * _exp(x[small])
+
+        large = ~small
+        ans[large] = _K1_large(2 / x[large]) / np.sqrt(x[large])
+    return ans if ans.ndim else ans[()]
+
+
+def I0K0v(x, exact=True):
+    x = np.asarray(x, dtype=float)
+    ans = np.empty_like(x)
+
+    with np.errstate(all='ignore'):
+        small = x < 3.75
+        ans[small] = I0v(x[small], exact) * K0v(x[small], exact)
+
+        large = ~small
+        ans[large] = I0ev(x[large], exact) * K0ev(x[large], exact)
+    return ans if ans.ndim else ans[()]
+
+
+def I1K1v(x, exact=True):
+    x = np.asarray(x, dtype=float)
+    ans = np.empty_like(x)
+
+    with np.errstate(all='ignore'):
+        small = x < 3.75
+        ans[small] = I1v(x[small], exact) * K1v(x[small], exact)
+
+        large = ~small
+        ans[large] = I1ev(x[large], exact) * K1ev(x[large], exact)
+    return ans if ans.ndim else ans[()]
+
+
+def I1K1_I0K0v(x, exact=True):
+    x = np.asarray(x, dtype=float)
+    ans = np.empty_like(x)
+
+    with np.errstate(all='ignore'):
+        small = x < 3.75
+        xs = x[small]
+        ans[small] = I1v(xs, exact) * K1v(xs, exact) / (I0v(xs, exact) * K0v(xs, exact))
+
+        large = ~small
+        xl = x[large]
+        ans[large] = I1ev(xl, exact) * K1ev(xl, exact) / (I0ev(xl, exact) * K0ev(xl, exact))
+    return ans if ans.ndim else ans[()]
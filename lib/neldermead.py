@@ -0,0 +1,146 @@
+'''
+PURPOSE
+    Search for a minimum of a function f(x) of a few variables,
+    within bounds on each variable, without derivatives.
+
+
+KEYWORDS
+    Nelder-Mead, downhill simplex, minimization, optimization
+
+
+DESCRIPTION
+    neldermead() keeps a simplex of n+1 points in n dimensions and
+    replaces its worst point by reflecting it through the centroid of
+    the others, expanding or contracting the step as the function
+    values allow, or shrinks the simplex towards its best point.
+
+    Points outside the bounds are moved onto them before f is
+    evaluated, so f is only ever called within the bounds. f may
+    return float('inf') for points that are not feasible; the simplex
+    then moves away from them, as long as the starting point is
+    feasible.
+
+    The search stops when every point of the simplex is within
+    rel_tol * (upper - lower) of the best point in every variable,
+    and the function values differ by no more than
+    rel_tol * abs(best value).
+
+
+REFERENCES
+    Nelder, J. A. and Mead, R.,
+        A Simplex Method for Function Minimization,
+        The Computer Journal, 7 (4), 308-313,
+        1965
+
+    Lagarias, J. C., Reeds, J. A., Wright, M. H. and Wright, P. E.,
+        Convergence Properties of the Nelder-Mead Simplex Method in Low Dimensions,
+        SIAM Journal on Optimization, 9 (1), 112-147,
+        1998
+'''
+
+
+error_msg = [''] * 3
+
+error_msg[0] = 'The simplex has collapsed to the requested tolerance.'
+
+error_msg[1] = 'No feasible point was found: f is infinite at all points of the simplex.'
+
+error_msg[2] = 'Maximum number of function evaluations. The solution may be meaningless. Check it.'
+
+
+# f is a function of a list of n values, x0 the starting point, and lower and upper the bounds
+#   of each value.
+#
+# Optional: step             initial size of the simplex, per value   (default: 10% of upper - lower)
+#           rel_tol          relative tolerance, see above            (default: 1E-3)
+#           max_evaluations  maximum number of calls of f             (default: 200)
+#
+# Returns a dict like fzero: 'x' (the best point), 'value' (f there), 'f_evaluations',
+#   'error_code' and 'error_msg'.
+#
+def neldermead(f, x0, lower, upper, step=None, rel_tol=1E-3, max_evaluations=200):
+
+    n = len(x0)
+    count = 0
+
+    if step is None:
+        step = [0.1 * (upper[i] - lower[i]) for i in range(n)]
+
+    def clamp(x):
+        return [min(max(x[i], lower[i]), upper[i]) for i in range(n)]
+
+    def evaluate(x):
+        nonlocal count
+        count += 1
+        return f(x)
+
+    #
+    # Starting simplex: x0, and one step along each axis (backwards if forwards is out of bounds)
+    #
+    x0 = clamp(x0)
+    simplex = [x0]
+    for i in range(n):
+        x = list(x0)
+        x[i] = x0[i] + step[i] if x0[i] + step[i] <= upper[i] else x0[i] - step[i]
+        simplex.append(clamp(x))
+
+    values = [evaluate(x) for x in simplex]
+
+    error_code = 2
+
+    while count < max_evaluations:
+
+        order = sorted(range(n + 1), key=lambda j: values[j])
+        simplex = [simplex[j] for j in order]
+        values  = [values[j]  for j in order]
+
+        best, worst = values[0], values[-1]
+
+        if best == float('inf'):
+            error_code = 1
+            break
+
+        if worst != float('inf') and abs(worst - best) <= rel_tol * abs(best):
+            if all(abs(x[i] - simplex[0][i]) <= rel_tol * (upper[i] - lower[i]) for x in simplex[1:] for i in range(n)):
+                error_code = 0
+                break
+
+        centroid = [sum(x[i] for x in simplex[:-1]) / n for i in range(n)]
+        toward   = lambda a: clamp([centroid[i] + a * (simplex[-1][i] - centroid[i]) for i in range(n)])
+
+        # Reflection
+        x_r = toward(-1.0)
+        f_r = evaluate(x_r)
+
+        if best <= f_r < values[-2]:
+            simplex[-1], values[-1] = x_r, f_r
+            continue
+
+        # Expansion
+        if f_r < best:
+            x_e = toward(-2.0)
+            f_e = evaluate(x_e)
+            simplex[-1], values[-1] = (x_e, f_e) if f_e < f_r else (x_r, f_r)
+            continue
+
+        # Contraction, outside or inside the simplex
+        if f_r < worst:
+            x_c = toward(-0.5)
+            f_c = evaluate(x_c)
+            if f_c <= f_r:
+                simplex[-1], values[-1] = x_c, f_c
+                continue
+        else:
+            x_c = toward(0.5)
+            f_c = evaluate(x_c)
+            if f_c < worst:
+                simplex[-1], values[-1] = x_c, f_c
+                continue
+
+        # Shrink towards the best point
+        for j in range(1, n + 1):
+            simplex[j] = clamp([simplex[0][i] + 0.5 * (simplex[j][i] - simplex[0][i]) for i in range(n)])
+            values[j]  = evaluate(simplex[j])
+
+    j = min(range(n + 1), key=lambda j: values[j])
+    return {'x':simplex[j], 'value':values[j], 'f_evaluations':count, 'error_code':error_code, 'error_msg':error_msg[error_code]}
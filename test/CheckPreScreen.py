@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+#
+########################################################################################################################
+########################################################################################################################
+##
+##      Copyright (C) 2020 Peter Walsh, Milford, NH 03055
+##      All Rights Reserved under the MIT license as outlined below.
+##
+##  FILE
+##      CheckPreScreen.py
+##
+##  DESCRIPTION
+##      Check that Coil.PreScreen never rejects a coil that the full calculation accepts.
+##
+##      Draws random coils (d 0.1-15 mm, D to 1000 mm, l to 2500 mm, f 0.03-500 MHz, LTarget
+##        0.01-3000 uH, all log uniform, and a random SelfResMin for half of them), and for each one
+##        that PreScreen rejects, interpolates the turns with InterpolateTurns as CoilScanDL does. A
+##        rejected coil for which that gives error_code 0 and f_res >= SelfResMin is a false reject.
+##
+##      Prints the rejections per error code, the false rejects, and exits with status 1 if there are any.
+##
+##  USAGE
+##      cd test
+##      python3 CheckPreScreen.py [Coils [Seed]]
+##
+##          Coils       Number of random coils (default: 96000)
+##          Seed        Seed of the random numbers (default: 1)
+##
+##  MIT LICENSE
+##
+##      Permission is hereby granted, free of charge, to any person obtaining a copy of this software and
+##        associated documentation files (the "Software"), to deal in the Software without restriction,
+##        including without limitation the rights to use, copy, modify, merge, publish, distribute,
+##        sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is
+##        furnished to do so, subject to the following conditions:
+##
+##      The above copyright notice and this permission notice shall be included in all copies or
+##        substantial portions of the Software.
+##
+##      THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT
+##        NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+##        NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+##        DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+##        OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+##
+########################################################################################################################
+########################################################################################################################
+
+import sys
+import time
+import random
+
+from math import log, exp
+
+sys.path.append('../lib')       # Use the library from this repository
+
+from Coil import Coil
+
+########################################################################################################################
+#
+# A random number, log uniform from Low to High
+#
+def LogUniform(Random, Low, High):
+    return exp(Random.uniform(log(Low), log(High)))
+
+#
+# A random point of a scan: D, l, d, f, plating, LTarget and SelfResMin
+#
+def RandomPoint(Random):
+    d = LogUniform(Random, 0.1, 15)
+    D = LogUniform(Random, 2*d, 1000)
+    l = LogUniform(Random, d, 2500)
+    f = LogUniform(Random, 0.03, 500)
+    L = LogUniform(Random, 0.01, 3000)
+
+    SelfResMin = LogUniform(Random, f, 20*f) if Random.random() < 0.5 else 0
+
+    return D, l, d, f, Random.randrange(4), L, SelfResMin
+
+########################################################################################################################
+########################################################################################################################
+#
+# Start here
+#
+Coils = int(sys.argv[1]) if len(sys.argv) > 1 else 96000
+Seed  = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+
+Random = random.Random(Seed)
+Start  = time.time()
+
+Rejects      = {}
+FalseRejects = []
+
+for Index in range(Coils):
+    D, l, d, f, plating, LTarget, SelfResMin = Point = RandomPoint(Random)
+
+    ScreenCoil = Coil(D,3,l,d,f,plating)
+    if not ScreenCoil.PreScreen(LTarget,SelfResMin):
+        continue
+
+    Rejects[ScreenCoil.error_code] = Rejects.get(ScreenCoil.error_code, 0) + 1
+
+    #
+    # The full calculation, as in CoilScanDL (with its UserFilter for SelfResMin)
+    #
+    TestCoil = Coil(D,3,l,d,f,plating)
+    TestCoil.InterpolateTurns(LTarget)
+
+    if TestCoil.error_code == 0 and TestCoil.f_res >= SelfResMin:
+        FalseRejects.append((Point, ScreenCoil.error_code, TestCoil.N, TestCoil.L_eff_s, TestCoil.f_res))
+
+print("%d coils in %.0f s, %d rejected by PreScreen" % (Coils, time.time() - Start, sum(Rejects.values())))
+for Code in sorted(Rejects):
+    print("    error_code %2d: %d" % (Code, Rejects[Code]))
+
+print("%d false rejects" % len(FalseRejects))
+for Point, Code, N, L_eff_s, f_res in FalseRejects[:20]:
+    print("    D=%g l=%g d=%g f=%g p=%d LTarget=%g SelfResMin=%g: rejected with %d, but N=%g L_eff_s=%g f_res=%g" %
+          (Point + (Code, N, L_eff_s, f_res)))
+
+sys.exit(1 if FalseRejects else 0)
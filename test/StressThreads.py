@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+#
+########################################################################################################################
+########################################################################################################################
+##
+##      Copyright (C) 2020 Peter Walsh, Milford, NH 03055
+##      All Rights Reserved under the MIT license as outlined below.
+##
+##  FILE
+##      StressThreads.py
+##
+##  DESCRIPTION
+##      Stress test of concurrent coil calculations.
+##
+##      Computes thousands of random coils in a thread pool, and interpolates lists of lengths with
+##        InterpolateLengths() in several threads, and checks every result against the same calculation
+##        done serially. The thread switch interval is made very short so that the threads interleave
+##        inside the calculations, and the memo of dispersion roots is cleared before each run so the
+##        threads share it while it fills.
+##
+##      Exits with status 1 (and lists the differences) if any result differs.
+##
+##  USAGE
+##      cd test
+##      python3 StressThreads.py [Coils [Threads]]
+##
+##          Coils       Number of random coils (default: 3000)
+##          Threads     Number of threads (default: 16)
+##
+##  MIT LICENSE
+##
+##      Permission is hereby granted, free of charge, to any person obtaining a copy of this software and
+##        associated documentation files (the "Software"), to deal in the Software without restriction,
+##        including without limitation the rights to use, copy, modify, merge, publish, distribute,
+##        sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is
+##        furnished to do so, subject to the following conditions:
+##
+##      The above copyright notice and this permission notice shall be included in all copies or
+##        substantial portions of the Software.
+##
+##      THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT
+##        NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+##        NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+##        DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+##        OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+##
+########################################################################################################################
+########################################################################################################################
+
+import sys
+import random
+
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append('../lib')       # Use the library from this repository
+
+from Coil import Coil, InterpolateLengths, dispersion_cache
+
+Members = ('D', 'N', 'l', 'd', 'f', 'plating', 'p', 'L_eff_s', 'X_eff_s', 'R_eff_s', 'Q_eff', 'L_s', 'R_s', 'C_p',
+           'f_res', 'l_w_phys', 'error_code', 'error_msg')
+
+########################################################################################################################
+#
+# Coil results as text, so NaN compares equal to NaN and every digit counts
+#
+def Results(TestCoil):
+    return tuple(repr(getattr(TestCoil, Member)) for Member in Members)
+
+#
+# A random coil: D, N, l, d, f and plating, with room for the turns in the length
+#
+def RandomCoil(Random):
+    d = Random.uniform(0.2, 6.0)
+    N = Random.uniform(2, 60)
+    l = N*d*Random.uniform(1.1, 5.0)
+    D = Random.uniform(2*d, 300)
+    f = Random.choice((0.1, 0.5, 1.8, 3.5, 7.0, 13.56, 28, 50, 144))
+    return D, N, l, d, f, Random.randrange(4)
+
+def CalcCoil(Inputs):
+    return Results(Coil(*Inputs))
+
+#
+# Length scans: D, d, f, plating, lengths and target inductance
+#
+def RandomScan(Random):
+    d = Random.uniform(0.5, 5.0)
+    D = Random.uniform(20, 150) + d
+    l = Random.uniform(5, 30)*d
+    return D, d, Random.choice((1.8, 3.5, 7.0, 13.56)), Random.randrange(4), \
+           [l + 2*d*Index for Index in range(40)], Random.uniform(0.5, 30)
+
+def CalcScan(Scan, Threads, Continuation):
+    D, d, f, plating, Lengths, LTarget = Scan
+    return [Results(TestCoil) for TestCoil in InterpolateLengths(D, d, f, plating, Lengths, LTarget, Threads, Continuation)]
+
+#
+# The same scan in the calling thread. With Continuation, InterpolateLengths starts one run (without a guess)
+#   per thread, so the serial results are of the same runs, one after the other.
+#
+def CalcScanSerial(Scan, Threads, Continuation):
+    D, d, f, plating, Lengths, LTarget = Scan
+    Size = -(-len(Lengths) // Threads) if Continuation else len(Lengths)
+    return [Result for i in range(0, len(Lengths), Size)
+                   for Result in CalcScan((D, d, f, plating, Lengths[i:i+Size], LTarget), 1, Continuation)]
+
+#
+# Compare the serial and concurrent results, and print the differences
+#
+def Compare(What, Serial, Concurrent):
+    Diffs = [Index for Index, (One, Two) in enumerate(zip(Serial, Concurrent)) if One != Two]
+    Diffs += list(range(min(len(Serial), len(Concurrent)), max(len(Serial), len(Concurrent))))
+
+    print("%-48s %6d results, %d different" % (What, len(Serial), len(Diffs)))
+    for Index in Diffs[:10]:
+        print("    %d: %s" % (Index, Serial[Index] if Index < len(Serial) else None))
+        print("    %d: %s" % (Index, Concurrent[Index] if Index < len(Concurrent) else None))
+
+    return len(Diffs)
+
+########################################################################################################################
+########################################################################################################################
+#
+# Start here
+#
+Coils   = int(sys.argv[1]) if len(sys.argv) > 1 else 3000
+Threads = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+
+sys.setswitchinterval(1e-6)     # Switch threads as often as possible
+
+Random = random.Random(1)
+Inputs = [RandomCoil(Random) for Index in range(Coils)]
+Scans  = [RandomScan(Random) for Index in range(max(1, Coils//300))]
+
+Diffs = 0
+
+dispersion_cache.clear()
+Serial = [CalcCoil(Coil) for Coil in Inputs]
+
+dispersion_cache.clear()
+with ThreadPoolExecutor(Threads) as Pool:
+    Concurrent = list(Pool.map(CalcCoil, Inputs))
+
+Diffs += Compare("Coil() in %d threads" % Threads, Serial, Concurrent)
+
+for Continuation in (False, True):
+    dispersion_cache.clear()
+    Serial = [Result for Scan in Scans for Result in CalcScanSerial(Scan, Threads, Continuation)]
+
+    dispersion_cache.clear()
+    Concurrent = [Result for Scan in Scans for Result in CalcScan(Scan, Threads, Continuation)]
+
+    Diffs += Compare("InterpolateLengths(Threads=%d%s)" % (Threads, ", Continuation" if Continuation else ""),
+                     Serial, Concurrent)
+
+sys.exit(1 if Diffs else 0)